@@ -1,140 +1,85 @@
 import streamlit as st
-from groq import Groq
-import PyPDF2
-from docx import Document
-import re
-import xml.etree.ElementTree as ET
+import uuid
+from extraction import detect_kind, iter_bytes
+from labs import LabTable, extract_labs
+from ocr import OCREngine
+from prompts import AGENT_REPORT_PROMPT
+from redaction import default_redactor
+import metrics
+import pipeline
 
-# Load Groq API key from Streamlit secrets
-client = Groq(api_key=st.secrets["GROQ_API_KEY"])
+# Reports longer than this are condensed section by section before analysis
+LONG_REPORT_TOKENS = 12000
 
-def read_file(file_path):
-    """Read medical report from different file formats"""
-    if file_path.endswith('.pdf'):
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ''.join([page.extract_text() for page in reader.pages])
-            return text
-        
-    elif file_path.endswith('.docx'):
-        doc = Document(file_path)
-        return '\n'.join([para.text for para in doc.paragraphs])
-    
-    elif file_path.endswith('.txt'):
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    
-    elif file_path.endswith('.xml'):
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            return xml_to_text(root)
-        except ET.ParseError as e:
-            raise ValueError(f"Invalid XML file: {str(e)}")
-    
-    else:
-        raise ValueError("Unsupported file format. Use PDF, DOCX, TXT, or XML")
+# Sampling parameters for report analysis, whichever backend serves it
+SAMPLING = {"max_tokens": 2048, "temperature": 0.5, "top_p": 0.9}
 
-def xml_to_text(element):
-    """Convert XML elements to readable text"""
-    text_parts = []
-    if element.tag.endswith('ClinicalDocument'):
-        for section in element.findall('.//section'):
-            title = section.find('title')
-            text = section.find('text')
-            if title is not None:
-                text_parts.append(title.text.strip())
-            if text is not None:
-                text_parts.append(text.text.strip())
-    else:
-        for child in element:
-            if child.text and child.text.strip():
-                text_parts.append(child.text.strip())
-            text_parts.extend(xml_to_text(child))
-    return '\n'.join(filter(None, text_parts))
+@st.cache_resource
+def get_router():
+    """Return the process-wide router over every configured model backend (Groq, Azure OpenAI)"""
+    return pipeline.build_router(st.secrets)
 
-def preprocess_text(text):
-    """Clean and preprocess medical report text"""
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'Patient ID:\s*\d+', '[REDACTED]', text)
-    return text.strip()
+def session_client():
+    """Return this session's handle on the shared router"""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return get_router().client_for(st.session_state.session_id)
 
-def analyze_report(report_text):
-    """Analyze medical report using Groq API"""
-    system_prompt = """You are an AI medical assistant. Your role is to help users understand their medical reports by answering their questions based on the provided report text.
-    Guidelines:
-    
-    Disclaimer: Always start your response with:"I am an AI medical assistant, not a doctor. For personalized medical advice, please consult a healthcare professional."
-    
-    Tone: Maintain a supportive and empathetic tone, acknowledging that medical reports can be concerning.
-    
-    Analysis: Analyze the report text to identify key information relevant to the user's question.  
-    
-    If the question is about:  
-    Potential illnesses: List possible conditions mentioned or suggested by the report.  
-    Critical values: Highlight any abnormal results and explain their significance.  
-    Medications: Mention any prescribed or recommended medications, including generic names.  
-    Lifestyle changes: Suggest any lifestyle modifications indicated in the report.  
-    Follow-up tests: Note any recommended future tests or check-ups.
-    
-    
-    For general questions, provide a summary of the report's main findings.
-    
-    
-    Clarity: Use clear, non-technical language. Define medical terms when necessary.
-    
-    Urgent Concerns: If the report indicates a serious condition, urge the user to seek immediate medical attention.
-    
-    Limitations:  
-    
-    If the report text is unclear or seems incomplete, inform the user that the analysis might be limited and suggest they provide a clearer version or consult their doctor.  
-    If you cannot answer the question based on the report, say:"I'm sorry, but I cannot provide an answer to that question based on the information in the report. Please consult your doctor for further assistance."  
-    If you are unsure about any information, state that clearly and suggest the user verify with their doctor.
-    
-    
-    Privacy: Do not discuss or emphasize any personal identifiers that may be present in the report.
-    
-    
-    Your responses should be informative, accurate, and always prioritize the user's health and safety.
-    """
+@st.cache_resource
+def get_metrics():
+    """Configure the process-wide pipeline metrics: [metrics] JSONL_PATH and PROMETHEUS_PORT"""
+    settings = st.secrets.get("metrics", {})
+    metrics.registry.configure(jsonl_path=settings.get("JSONL_PATH"))
+    if settings.get("PROMETHEUS_PORT"):
+        metrics.serve(int(settings["PROMETHEUS_PORT"]))
+    return metrics.registry
 
-    try:
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": report_text}
-            ],
-            temperature=0.5,
-            max_completion_tokens=2048,
-            top_p=0.9,
-            stream=True,
-        )
+@st.cache_resource
+def get_ocr_engine():
+    """Return the process-wide OCR engine used for scanned reports"""
+    return OCREngine()
 
-        st.markdown("### Medical Report Analysis")
-        analysis_output = ""
-        for chunk in completion:
-            content = chunk.choices[0].delta.content or ""
-            analysis_output += content
-        st.markdown(analysis_output)
-            
-    except Exception as e:
-        st.error(f"Error analyzing report: {e}")
+def analyze_report(report_text, lab_summary=""):
+    """Analyze medical report with the fastest healthy backend, streaming the result"""
+    st.markdown("### Medical Report Analysis")
+    st.write_stream(pipeline.analyze_report(
+        session_client(),
+        report_text,
+        AGENT_REPORT_PROMPT,
+        sampling=SAMPLING,
+        long_report_tokens=LONG_REPORT_TOKENS,
+        section_tokens=6000,
+        lab_summary=lab_summary,
+    ))
 
 def main():
+    get_metrics()
     st.title("Medical Report Analyzer")
-    uploaded_file = st.file_uploader("Upload a medical report", type=["pdf", "docx", "txt", "xml"])
+    uploaded_file = st.file_uploader("Upload a medical report", type=["pdf", "docx", "txt", "xml", "png", "jpg", "jpeg", "tiff"])
     
     if uploaded_file is not None:
         try:
-            # Save uploaded file temporarily
-            with open(uploaded_file.name, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            raw_text = read_file(uploaded_file.name)
-            cleaned_text = preprocess_text(raw_text)
+            # Pages are redacted as the extractor yields them, so the raw text is never held whole;
+            # lab rows are parsed from each raw page on the way through
+            tables = []
+            data = uploaded_file.getbuffer()
+
+            def pages():
+                for page in iter_bytes(data, ocr=get_ocr_engine()):
+                    tables.append(extract_labs(page))
+                    yield page
+
+            # Parsing, lab extraction and redaction interleave page by page, so they are timed as one stage
+            with metrics.span("extract_redact", kind=detect_kind(data), bytes=len(data)) as span:
+                cleaned_text = ''.join(default_redactor().iter_redact(pages()))
+                labs = LabTable.concat(tables)
+                span.set(pages=len(tables), chars=len(cleaned_text), rows=len(labs))
             st.subheader("Sample of Extracted Text")
             st.write(cleaned_text[:200] + "...")
-            analyze_report(cleaned_text)
+            if len(labs):
+                with st.expander(f"Lab Results ({int(labs.abnormal().sum())} flagged)"):
+                    st.dataframe(labs.records(), hide_index=True)
+            analyze_report(cleaned_text, labs.summary())
         except Exception as e:
             st.error(f"Error processing file: {e}")
 
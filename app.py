@@ -1,290 +1,374 @@
 import streamlit as st
-from openai import AzureOpenAI
+import hashlib
 import os
 import uuid
-import io
-from PIL import Image
-import PyPDF2
-from docx import Document
-import re
-import xml.etree.ElementTree as ET
-import base64
-
-# Initialize Azure OpenAI client with Streamlit secrets
-client = AzureOpenAI(
-    azure_endpoint=st.secrets["azure_openai"]["ENDPOINT_URL"],
-    api_key=st.secrets["azure_openai"]["AZURE_OPENAI_API_KEY"],
-    api_version=st.secrets["azure_openai"]["API_VERSION"],
-)
+from artifacts import ArtifactStore, approximate_size
+from cache import ExtractionCache, LRUCache, ResponseCache, content_hash
+from extraction import PARSER_VERSION, detect_kind, iter_bytes, preprocess_text
+from images import image_message_part, prepare_image, thumbnail
+from lab_store import LabStore, patient_path
+from labs import collection_date, extract_labs
+from memory import ConversationMemory
+from ocr import OCREngine
+from redaction import PlaceholderMap, Redactor, default_redactor
+from prompts import CHAT_PROMPT, IMAGE_ANALYSIS_PROMPT, REPORT_ANALYSIS_PROMPT
+from retrieval import ChunkIndex
+import llm
+import metrics
+import pipeline
 
 # Streamlit page configuration
 st.set_page_config(page_title="HealthInsight", page_icon="🏥", layout="wide")
 
 # Session state initialization
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
-if 'report_text' not in st.session_state:
-    st.session_state.report_text = None
+if 'memory' not in st.session_state:
+    settings = st.secrets.get("memory", {})
+    st.session_state.memory = ConversationMemory(
+        recent_tokens=int(settings.get("RECENT_TOKENS", 1500)),
+        summary_tokens=int(settings.get("SUMMARY_TOKENS", 300)),
+    )
+if 'history_window' not in st.session_state:
+    st.session_state.history_window = int(st.secrets.get("memory", {}).get("HISTORY_WINDOW", 30))
+if 'report' not in st.session_state:
+    # Handles into the artifact store (text and index keys plus a short preview), not the report itself
+    st.session_state.report = None
+if 'lab_table' not in st.session_state:
+    st.session_state.lab_table = None
 if 'uploaded_file_name' not in st.session_state:
     st.session_state.uploaded_file_name = None
 if 'uploaded_image' not in st.session_state:
+    # The prepared payload's metadata and a thumbnail; the encoded image lives in the artifact store
     st.session_state.uploaded_image = None
-
-def read_file(file_path):
-    """Read medical report from different file formats"""
-    if file_path.endswith('.pdf'):
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ''.join([page.extract_text() for page in reader.pages])
-            return text
-        
-    elif file_path.endswith('.docx'):
-        doc = Document(file_path)
-        return '\n'.join([para.text for para in doc.paragraphs])
-    
-    elif file_path.endswith('.txt'):
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    
-    elif file_path.endswith('.xml'):
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            return xml_to_text(root)
-        except ET.ParseError as e:
-            raise ValueError(f"Invalid XML file: {str(e)}")
-    
-    else:
-        raise ValueError("Unsupported file format. Use PDF, DOCX, TXT, or XML")
-
-def xml_to_text(element):
-    """Convert XML elements to readable text"""
-    text_parts = []
-    
-    if element.tag.endswith('ClinicalDocument'):
-        for section in element.findall('.//section'):
-            title = section.find('title')
-            text = section.find('text')
-            if title is not None:
-                text_parts.append(title.text.strip())
-            if text is not None:
-                text_parts.append(text.text.strip())
-    else:
-        for child in element:
-            if child.text and child.text.strip():
-                text_parts.append(child.text.strip())
-            text_parts.extend(xml_to_text(child))
-    
-    return '\n'.join(filter(None, text_parts))
-
-def preprocess_text(text):
-    """Clean and preprocess medical report text"""
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'Patient ID:\s*\d+', '[REDACTED]', text)
-    return text.strip()
+if 'uploaded_image_id' not in st.session_state:
+    st.session_state.uploaded_image_id = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'placeholders' not in st.session_state:
+    # Redacted values stay in this session; replies show them again in place of their placeholders
+    st.session_state.placeholders = PlaceholderMap()
+
+@st.cache_resource
+def get_extraction_cache():
+    """Return the process-wide extraction cache shared by all sessions and reruns"""
+    settings = st.secrets.get("cache", {})
+    return ExtractionCache(
+        version=PARSER_VERSION,
+        max_bytes=int(settings.get("MEMORY_MAX_MB", 64)) * 1024 * 1024,
+        path=settings.get("DISK_PATH"),
+        disk_max_bytes=int(settings.get("DISK_MAX_MB", 512)) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_response_cache():
+    """Return the process-wide cache of model replies shared by every session"""
+    settings = st.secrets.get("response_cache", {})
+    return ResponseCache(
+        ttl=float(settings.get("TTL_HOURS", 24)) * 3600,
+        max_bytes=int(settings.get("MEMORY_MAX_MB", 32)) * 1024 * 1024,
+        path=settings.get("DISK_PATH"),
+        disk_max_bytes=int(settings.get("DISK_MAX_MB", 256)) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_image_cache():
+    """Return the process-wide cache of prepared image payloads keyed by image hash"""
+    return LRUCache(int(st.secrets.get("images", {}).get("CACHE_MAX_MB", 64)) * 1024 * 1024)
+
+@st.cache_resource
+def get_artifacts():
+    """Return the process-wide store of report text, report indexes and encoded images shared by sessions"""
+    settings = st.secrets.get("artifacts", {})
+    return ArtifactStore(
+        max_bytes=int(settings.get("MEMORY_MAX_MB", 256)) * 1024 * 1024,
+        spill_dir=settings.get("SPILL_PATH"),
+        session_ttl=float(settings.get("SESSION_TTL_HOURS", 2)) * 3600,
+    )
+
+def report_artifacts():
+    """Return (report_text, report_index) for this session's report, or (None, None)"""
+    report = st.session_state.report
+    if report is None:
+        return None, None
+    artifacts = get_artifacts()
+    return artifacts.get(report["text"]), artifacts.get(report["index"])
+
+def image_payload():
+    """Return this session's prepared image payload with its encoded data, or None"""
+    image = st.session_state.uploaded_image
+    if image is None:
+        return None
+    data_url = get_artifacts().get(image["hash"])
+    return dict(image, data_url=data_url) if data_url is not None else None
+
+@st.cache_resource
+def get_ocr_engine():
+    """Return the process-wide OCR engine, caching page results alongside extracted text"""
+    workers = int(st.secrets.get("extraction", {}).get("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+    return OCREngine(cache=get_extraction_cache(), workers=workers)
+
+@st.cache_resource
+def get_redactor():
+    """Return the process-wide PHI redactor, with the optional name dictionary from secrets compiled in"""
+    settings = st.secrets.get("redaction", {})
+    names = list(settings.get("NAMES", []))
+    if settings.get("NAMES_FILE"):
+        with open(settings["NAMES_FILE"], encoding="utf-8") as f:
+            names += f.read().splitlines()
+    return Redactor(names=names) if names else default_redactor()
+
+@st.cache_resource
+def get_lab_store(patient_id):
+    """Return the shared lab history for one patient, or None when no [labs] STORE_PATH is configured"""
+    root = st.secrets.get("labs", {}).get("STORE_PATH")
+    if not root or not patient_id.strip():
+        return None
+    return LabStore(patient_path(root, patient_id))
+
+def lab_history_enabled():
+    """Whether this browser opened the app with ?labs=<[labs] ACCESS_TOKEN> and a STORE_PATH is set
+
+    The Patient ID is not checked against any login: whoever types an ID reads that patient's stored
+    results in chat, so the history is only offered to browsers holding the token.
+    """
+    settings = st.secrets.get("labs", {})
+    token = settings.get("ACCESS_TOKEN")
+    return bool(settings.get("STORE_PATH")) and bool(token) and st.query_params.get("labs") == token
+
+def lab_store():
+    """Return the lab history for the patient entered in the sidebar, if any"""
+    if not lab_history_enabled():
+        return None
+    return get_lab_store(st.session_state.get("patient_id", ""))
+
+@st.cache_resource
+def get_metrics():
+    """Configure the process-wide pipeline metrics from the [metrics] secrets section
+
+    JSONL_PATH appends every finished span to a file, PROMETHEUS_PORT serves /metrics, PROFILE
+    profiles every request (PROFILE_DIR keeps the .prof files) and ADMIN_TOKEN unlocks the admin
+    panel at ?admin=<token>.
+    """
+    settings = st.secrets.get("metrics", {})
+    metrics.registry.configure(jsonl_path=settings.get("JSONL_PATH"))
+    if settings.get("PROMETHEUS_PORT"):
+        metrics.serve(int(settings["PROMETHEUS_PORT"]))
+
+    def cache_counters():
+        # The extraction cache reports its memory and disk tiers separately
+        tiers = {("extraction", tier): stats for tier, stats in get_extraction_cache().stats().items()}
+        tiers[("response", "all")] = get_response_cache().stats()
+        tiers[("image", "memory")] = get_image_cache().stats()
+        for (name, tier), stats in tiers.items():
+            yield "cache_hits_total", {"cache": name, "tier": tier}, stats["hits"], "counter"
+            yield "cache_misses_total", {"cache": name, "tier": tier}, stats["misses"], "counter"
+        artifacts = get_artifacts().stats()
+        yield "artifact_resident_bytes", {}, artifacts["bytes"], "gauge"
+        yield "artifact_spilled_bytes", {}, artifacts["spilled_bytes"], "gauge"
+        yield "artifact_sessions", {}, artifacts["sessions"], "gauge"
+
+    metrics.registry.add_collector(cache_counters)
+    return metrics.registry
+
+def profiling():
+    """Whether to profile this session's requests: always when configured, else when toggled in the admin panel"""
+    return bool(st.secrets.get("metrics", {}).get("PROFILE")) or st.session_state.get("profile_requests", False)
+
+def profile(label):
+    """Profile one request of this session with cProfile when profiling is on"""
+    return metrics.profile(label, enabled=profiling(), directory=st.secrets.get("metrics", {}).get("PROFILE_DIR"))
+
+@st.cache_resource
+def get_router():
+    """Return the process-wide router over every configured model backend"""
+    return pipeline.build_router(st.secrets)
+
+def session_client():
+    """Return this session's handle on the shared router, building it on the first model request"""
+    st.session_state.router_ready = True
+    return get_router().client_for(st.session_state.session_id)
+
+# Sampling parameters shared by every request, whichever backend serves it
+SAMPLING = {"max_tokens": 800, "temperature": 0.7, "top_p": 0.95, "frequency_penalty": 0, "presence_penalty": 0}
+
+def stream_chat(messages, label, error_message):
+    """Stream a reply from the fastest healthy backend chunk by chunk, queued behind other sessions' requests"""
+    return llm.stream_chat(
+        session_client(),
+        label=label,
+        error_message=error_message,
+        cache=get_response_cache(),
+        bypass=st.session_state.get("bypass_response_cache", False),
+        messages=messages,
+        **SAMPLING,
+    )
 
 def analyze_report(report_text):
-    """Analyze medical report using Azure OpenAI"""
-    system_prompt = """
-You are a doctor. Your role is to help users understand their medical reports by answering their questions based on the provided report text.
-Guidelines:
-
-Tone: Maintain a supportive and empathetic tone, acknowledging that medical reports can be concerning.
-
-Analysis: Analyze the report text to identify key information relevant to the user's question.  
-If the question is about or indicates:  
-Potential illnesses: List possible conditions mentioned or suggested by the report.  
-Critical values: Highlight any abnormal results and explain their significance.  
-Medications: Suggest recommended medications, including generic names, based on the report's findings.  
-Home Remedies: Provide steps for home remedies where applicable and safe, emphasizing they are supplementary and not a substitute for professional care.  
-Follow-up Tests: Recommend necessary follow-up tests or diagnostics based on the condition.  
-Severe Conditions: If the condition appears serious or life-threatening, suggest urgent medical attention, additional specialist consultations, and any critical tests or interventions that might be needed.
-
-For general questions, provide a summary of the report's main findings.
-
-Clarity: Use clear, non-technical language. Define medical terms when necessary.
-
-Urgent Concerns: If the report indicates a serious condition (e.g., heart attack, cancer, severe infection), urge the user to seek immediate medical attention and suggest emergency steps if applicable.
-
-Limitations:  
-If the report text is unclear or incomplete, inform the user that the analysis might be limited and suggest they provide a clearer version or consult their doctor.  
-If you cannot answer the question based on the report, say: 'I'm sorry, but I cannot provide an answer to that question based on the information in the report. Please consult your doctor for further assistance.'
-
-Privacy: Do not discuss or emphasize any personal identifiers that may be present in the report.
-
-Your responses should be informative, accurate, and always prioritize the user's health.
-"""
-
-    try:
-        completion = client.chat.completions.create(
-            model=st.secrets["azure_openai"]["DEPLOYMENT_NAME"],
-            messages=[
-                {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
-                {"role": "user", "content": [{"type": "text", "text": "Please analyze this medical report and provide a comprehensive summary: " + report_text}]}
-            ],
-            max_tokens=800,
-            temperature=0.7,
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0,
-            stream=False,
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        return f"Error analyzing report: {e}"
+    """Analyze medical report, yielding the analysis as it streams
+
+    Reports over the long-report budget are condensed section by section first (map), and the
+    analysis prompt then runs over the section notes (reduce).
+    """
+    settings = st.secrets.get("summarize", {})
+    return pipeline.analyze_report(
+        session_client(),
+        report_text,
+        REPORT_ANALYSIS_PROMPT,
+        instruction="Please analyze this medical report and provide a comprehensive summary: ",
+        sampling=SAMPLING,
+        cache=get_response_cache(),
+        bypass=st.session_state.get("bypass_response_cache", False),
+        long_report_tokens=int(settings.get("LONG_REPORT_TOKENS", 6000)),
+        section_tokens=int(settings.get("SECTION_TOKENS", 3000)),
+        max_workers=int(settings.get("MAX_WORKERS", 4)),
+        lab_summary=st.session_state.lab_table.summary() if st.session_state.lab_table is not None else "",
+    )
 
 def process_image(image):
-    """Process and analyze medical image using Azure OpenAI with vision"""
-    # Convert image to base64
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode('ascii')
-
-    # System prompt for image analysis
-    system_prompt = """
-You are a doctor specialized in analyzing medical images (e.g., X-rays, MRIs, CT scans, ultrasounds). Your role is to provide expert insights based on the visual data from the uploaded medical images.
-Guidelines:
-
-Tone: Maintain a professional, supportive, and empathetic tone, acknowledging that medical imaging results can be concerning.
-
-Analysis: Analyze the provided medical image to identify key visual findings relevant to the user's query or the image's context.  
-If the image suggests:  
-Potential conditions: Identify possible abnormalities or diseases (e.g., fractures, tumors, infections) based on visible patterns or structures.  
-Critical findings: Highlight any urgent or abnormal features (e.g., signs of bleeding, organ enlargement) and explain their potential significance.  
-Medications: Suggest recommended medications (including generic names) if a condition is identifiable and treatment is implied, noting these are preliminary suggestions.  
-Home Remedies: Provide steps for home remedies where applicable and safe (e.g., rest for minor injuries), emphasizing they are supplementary and not a substitute for professional care.  
-Follow-up Tests: Recommend additional imaging or diagnostic tests (e.g., MRI for unclear X-ray findings) to confirm or expand on the analysis.  
-Severe Conditions: If the image indicates a serious or life-threatening condition (e.g., massive stroke, advanced cancer), urge the user to seek immediate medical attention, suggest specialist referrals, and recommend critical tests or interventions.
-
-For general queries, provide a summary of observed findings and their potential implications.
-
-Clarity: Use clear, non-technical language. Define medical imaging terms (e.g., "opacity" or "lesion") when necessary.
-
-Urgent Concerns: If the image shows signs of a serious condition (e.g., acute hemorrhage, large mass), urge the user to seek immediate medical attention and suggest emergency steps if applicable.
-
-Limitations:  
-If the image quality is poor or incomplete, inform the user that the analysis may be limited and suggest they provide a higher-quality image or consult a radiologist.  
-If you cannot identify a condition or answer the question based on the image, say: 'I'm sorry, but I cannot provide a definitive analysis or answer based on this image. Please consult a radiologist or doctor for further evaluation.'  
-If you are unsure about any findings (e.g., rare conditions, treatment options), state that clearly and suggest the user verify with a medical professional.
-
-Privacy: Do not discuss or emphasize any personal identifiers that may be present in the image or associated data.
-
-Your responses should be informative, accurate, and always prioritize the user's health and safety. Provide your analysis based solely on the visual content of the medical image.
-"""
-
-    try:
-        completion = client.chat.completions.create(
-            model=st.secrets["azure_openai"]["DEPLOYMENT_NAME"],
-            messages=[
-                {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": "Please analyze this medical image:"},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{img_str}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=800,
-            temperature=0.7,
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0,
-            stream=False,
+    """Process and analyze medical image with a vision-capable backend, yielding the reply as it streams
+
+    `image` is the payload from images.prepare_image, encoded once per upload.
+    """
+    yield from stream_chat(
+        [
+            {"role": "system", "content": [{"type": "text", "text": IMAGE_ANALYSIS_PROMPT}]},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "Please analyze this medical image:"},
+                    image_message_part(image)
+                ]
+            }
+        ],
+        label="process_image",
+        error_message="Error analyzing image (ensure a vision-capable model is configured)",
+    )
+
+def chat_with_context(message, report_text=None, image=None, report_index=None, lab_history=None, history=None):
+    """Generate a response based on the message and any medical context, yielding it as it streams
+
+    The request is built by pipeline.chat_messages, with report excerpts limited by the [retrieval]
+    TOP_K and CONTEXT_TOKENS settings.
+    """
+    settings = st.secrets.get("retrieval", {})
+    messages = pipeline.chat_messages(
+        message,
+        CHAT_PROMPT,
+        report_text=report_text,
+        image=image,
+        report_index=report_index,
+        lab_history=lab_history,
+        history=history,
+        top_k=int(settings.get("TOP_K", 8)),
+        context_tokens=int(settings.get("CONTEXT_TOKENS", 1500)),
+    )
+    return stream_chat(messages, label="chat_with_context", error_message="Error generating response")
+
+def summarize_history():
+    """Fold turns that have left the memory's recent window into its summary, in the background"""
+    # Bind the session's client here: the summary runs on a worker thread without session state
+    client = session_client()
+
+    def complete(messages, max_tokens):
+        return llm.complete_chat(
+            client, label="summarize_history", messages=messages, **dict(SAMPLING, max_tokens=max_tokens)
         )
-        return completion.choices[0].message.content
-    except Exception as e:
-        return f"Error analyzing image: {e}. Ensure your gpt-4o deployment supports vision."
-
-def chat_with_context(message, report_text=None, image=None):
-    """Generate a response based on the message and any medical context"""
-    system_prompt = """
-You are a doctor. Your role is to help users understand their medical reports by answering their questions based on the provided report text or image analysis.
-Guidelines:
-
-Tone: Maintain a supportive and empathetic tone, acknowledging that medical reports can be concerning.
-
-Analysis: Analyze the report text or image-derived data to identify key information relevant to the user's question.  
-If the question is about or indicates:  
-Potential illnesses: List possible conditions mentioned or suggested by the report or image.  
-Critical values: Highlight any abnormal results and explain their significance.  
-Medications: Suggest recommended medications, including generic names, based on the findings.  
-Home Remedies: Provide steps for home remedies where applicable and safe, emphasizing they are supplementary and not a substitute for professional care.  
-Follow-up Tests: Recommend necessary follow-up tests or diagnostics based on the condition.  
-Severe Conditions: If the condition appears serious or life-threatening, suggest urgent medical attention, additional specialist consultations, and any critical tests or interventions that might be needed.
-
-For general questions, provide a summary of the report's or image's main findings.
-
-Clarity: Use clear, non-technical language. Define medical terms when necessary.
-
-Urgent Concerns: If the report or image indicates a serious condition (e.g., heart attack, cancer, severe infection), urge the user to seek immediate medical attention and suggest emergency steps if applicable.
-
-Limitations:  
-If the report text or image data is unclear or incomplete, inform the user that the analysis might be limited and suggest they provide a clearer version or consult their doctor.  
-If you cannot answer the question based on the report or image, say: 'I'm sorry, but I cannot provide an answer to that question based on the information in the report or image. Please consult your doctor for further assistance.'
 
-Privacy: Do not discuss or emphasize any personal identifiers that may be present in the report or image.
-
-Your responses should be informative, accurate, and always prioritize the user's health.
-"""
-    
-    messages = [
-        {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
-        {"role": "user", "content": [{"type": "text", "text": f"User query: {message}"}]}
-    ]
-    
-    if report_text:
-        messages.append({"role": "user", "content": [{"type": "text", "text": f"Medical report content: {report_text}"}]})
-    if image:
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode('ascii')
-        messages.append({
-            "role": "user",
-            "content": [
-                {"type": "text", "text": "Please consider this medical image:"},
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{img_str}",
-                        "detail": "high"
-                    }
-                }
-            ]
-        })
-    
-    try:
-        completion = client.chat.completions.create(
-            model=st.secrets["azure_openai"]["DEPLOYMENT_NAME"],
-            messages=messages,
-            max_tokens=800,
-            temperature=0.7,
-            top_p=0.95,
-            frequency_penalty=0,
-            presence_penalty=0,
-            stream=False,
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        return f"Error generating response: {e}"
-
-def save_uploaded_file(uploaded_file):
-    """Save an uploaded file temporarily and return the path"""
-    file_extension = uploaded_file.name.split('.')[-1].lower()
-    temp_file_path = f"temp_{uuid.uuid4()}.{file_extension}"
+    st.session_state.memory.refresh(complete)
+
+def render_stream(stream, heading=None):
+    """Render an assistant reply in the chat as it streams, then add it to the conversation memory"""
+    raw = []
+
+    def tee():
+        for chunk in stream:
+            raw.append(chunk)
+            yield chunk
+
+    with st.chat_message("assistant"):
+        if heading:
+            st.markdown(heading)
+        waiting, _ = pipeline.queue_stats(get_router())
+        notice = st.empty()
+        if waiting:
+            notice.caption(f"⏳ {waiting} request(s) ahead in the queue...")
+        reply = st.write_stream(st.session_state.placeholders.iter_restore(tee()))
+        notice.empty()
+    content = f"{heading}\n\n{reply}" if heading else reply
+    # The model sees its own reply with placeholders, not the values restored for display
+    text = ''.join(raw)
+    st.session_state.memory.append("assistant", content, f"{heading}\n\n{text}" if heading else text)
+    summarize_history()
+
+def extract_report_text(uploaded_file, preview=None, key=None):
+    """Return the raw text of an uploaded report, parsing it only on a cache miss
+
+    key is the upload's extraction cache key when the caller has already computed it.
+    """
+    cache = get_extraction_cache()
+    data = uploaded_file.getbuffer()
+    with metrics.span("extract", kind=detect_kind(data), bytes=len(data)) as span:
+        if key is None:
+            key = cache.key(data)
+        raw_text = cache.get(key)
+        if raw_text is not None:
+            span.set(cache="hit", chars=len(raw_text))
+            return raw_text
+
+        workers = int(st.secrets.get("extraction", {}).get("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+        parts = []
+        head = ''
+        with profile("extract_report"):
+            for part in iter_bytes(data, workers=workers, ocr=get_ocr_engine()):
+                parts.append(part)
+                if preview is not None:
+                    # Fill the preview in as pages arrive instead of waiting for the whole document
+                    head = (head + part[:300])[:300]
+                    preview.text(f"Extracting... {len(parts)} page(s) read\n\n{head}")
+        if preview is not None:
+            preview.empty()
+        raw_text = ''.join(parts)
+        span.set(cache="miss", pages=len(parts), chars=len(raw_text))
+        cache.put(key, raw_text)
+    return raw_text
+
+def is_admin():
+    """Whether this browser opened the app with ?admin=<[metrics] ADMIN_TOKEN>"""
+    token = st.secrets.get("metrics", {}).get("ADMIN_TOKEN")
+    return bool(token) and st.query_params.get("admin") == token
+
+def admin_panel():
+    """Recent latency percentiles per stage, counters, profiles and metric exports for operators"""
+    registry = get_metrics()
+    st.header("🔧 Pipeline Metrics")
+    rows = registry.summary()
+    if rows:
+        st.subheader("Stage latency (recent requests, all sessions)")
+        st.dataframe(rows, hide_index=True)
+    else:
+        st.caption("No requests recorded in this process yet.")
+    counters = registry.counters()
+    if counters:
+        with st.expander("Counters"):
+            st.dataframe(counters, hide_index=True)
+    if st.session_state.get("router_ready"):
+        with st.expander("Backends and queue"):
+            st.json(get_router().snapshot())
     
-    with open(temp_file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    st.checkbox("Profile my requests", key="profile_requests", help="Run this session's requests under cProfile")
+    for entry in metrics.recent_profiles():
+        with st.expander(f"Profile: {entry['label']} ({entry['seconds'] * 1000:,.0f} ms)"):
+            if entry["path"]:
+                st.caption(entry["path"])
+            st.code(entry["text"])
     
-    return temp_file_path
+    left, right = st.columns(2)
+    left.download_button("Prometheus metrics", registry.prometheus(), file_name="metrics.prom", mime="text/plain")
+    right.download_button("Recent spans (JSONL)", registry.jsonl(), file_name="spans.jsonl", mime="application/x-ndjson")
 
 def main():
+    # Keeps this session's uploads alive in the shared artifact store
+    get_artifacts().touch(st.session_state.session_id)
+    get_metrics()
     st.title("🏥 HealthInsight")
     st.markdown("Chat with or without medical reports and images. Get insights about your health information.")
     
@@ -294,40 +378,103 @@ def main():
         report_tab, image_tab = st.tabs(["Medical Report", "Medical Image"])
         
         with report_tab:
+            if lab_history_enabled():
+                st.text_input(
+                    "Patient ID",
+                    key="patient_id",
+                    help="Lab results from every report uploaded under this ID are kept for trend questions. "
+                         "The ID is not verified: anyone with this link can read the history of any ID.",
+                )
+                store = lab_store()
+                if store is not None and store.reports:
+                    st.caption(f"Lab history: {len(store.reports)} report(s)")
             report_file = st.file_uploader(
                 "Upload a medical report",
-                type=['pdf', 'docx', 'txt', 'xml'],
+                type=['pdf', 'docx', 'txt', 'xml', 'png', 'jpg', 'jpeg', 'tiff'],
                 key="report_uploader"
             )
             
             if report_file:
-                temp_file_path = save_uploaded_file(report_file)
-                
                 try:
-                    raw_text = read_file(temp_file_path)
-                    st.session_state.report_text = preprocess_text(raw_text)
+                    artifacts = get_artifacts()
+                    session = st.session_state.session_id
+                    report = st.session_state.report
+                    source = get_extraction_cache().key(report_file.getbuffer())
+                    # Reruns with the same upload skip extraction and redaction. After an idle expiry
+                    # this session's references are gone, even when another session still keeps the
+                    # artifacts alive, so the upload is processed and put again
+                    if (report is None or report["source"] != source
+                            or not artifacts.holds(session, report["text"])
+                            or not artifacts.holds(session, report["index"])):
+                        raw_text = extract_report_text(report_file, preview=st.empty(), key=source)
+                        with metrics.span("redact", chars=len(raw_text)):
+                            report_text = preprocess_text(raw_text, st.session_state.placeholders, get_redactor())
+                        text_key = content_hash(report_text.encode('utf-8'), "report")
+                        if report is not None:
+                            artifacts.release(session, report["text"], report["index"])
+                        # Index once per upload, or share the index of another session with the same
+                        # report; reruns reuse it for every chat turn
+                        index_key = content_hash(report_text.encode('utf-8'), "report-index")
+                        artifacts.put(session, report_text, key=text_key)
+                        if not artifacts.acquire(session, index_key):
+                            with metrics.span("index", chars=len(report_text)):
+                                artifacts.put(session, ChunkIndex(report_text), key=index_key)
+                        st.session_state.report = {
+                            "source": source,
+                            "text": text_key,
+                            "index": index_key,
+                            "chars": len(report_text),
+                            "preview": report_text[:300],
+                            # Keyed by content, so re-uploads do not duplicate a report's results
+                            "lab_report": hashlib.sha256(raw_text.encode('utf-8')).hexdigest(),
+                            # Path of the lab history this upload was added to, set once
+                            "lab_store": None,
+                            "collected": collection_date(raw_text),
+                        }
+                        # Lab rows are parsed from the raw text: values and ranges carry no identifiers
+                        with metrics.span("labs") as span:
+                            st.session_state.lab_table = extract_labs(raw_text)
+                            span.set(rows=len(st.session_state.lab_table))
+                    # Each upload goes into the history of the Patient ID it was first seen with;
+                    # editing the ID afterwards does not copy it into another patient's history
+                    store, report = lab_store(), st.session_state.report
+                    if store is not None and report["lab_store"] is None:
+                        # Undated reports wait for the user's date rather than being filed under today
+                        day = report["collected"]
+                        if day is None:
+                            day = st.date_input(
+                                "Collection date",
+                                value=None,
+                                key=f"collected_{report['lab_report'][:16]}",
+                                help="No collection date was found in this report; its lab results are "
+                                     "added to the history once a date is entered",
+                            )
+                        if day is not None:
+                            with metrics.span("lab_store_ingest") as span:
+                                span.set(rows=store.add_report(report["lab_report"], st.session_state.lab_table, day))
+                            report["lab_store"] = store.path
+                    elif report["lab_store"] is not None and (store is None or store.path != report["lab_store"]):
+                        st.caption("This report's lab results were saved under the Patient ID entered when it was loaded")
                     st.session_state.uploaded_file_name = report_file.name
                     
                     st.success(f"✅ Report loaded: {report_file.name}")
                     
                     with st.expander("Report Preview"):
-                        preview_text = st.session_state.report_text[:300] + "..." if len(st.session_state.report_text) > 300 else st.session_state.report_text
+                        report = st.session_state.report
+                        preview_text = report["preview"] + "..." if report["chars"] > 300 else report["preview"]
                         st.text_area("Content", preview_text, height=150, disabled=True)
                     
+                    labs = st.session_state.lab_table
+                    if labs is not None and len(labs):
+                        with st.expander(f"Lab Results ({int(labs.abnormal().sum())} flagged)"):
+                            st.dataframe(labs.records(), hide_index=True)
+                    
                     if st.button("Analyze Report"):
-                        with st.spinner("Analyzing report..."):
-                            analysis = analyze_report(st.session_state.report_text)
-                            st.session_state.chat_history.append({
-                                "role": "assistant", 
-                                "content": f"📋 **Report Analysis**\n\n{analysis}"
-                            })
-                            st.success("Analysis complete! Check the chat area.")
+                        # Streamed into the chat area below, where the reply renders as it arrives
+                        st.session_state.pending_analysis = "report"
                 
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
-                finally:
-                    if os.path.exists(temp_file_path):
-                        os.remove(temp_file_path)
         
         with image_tab:
             image_file = st.file_uploader(
@@ -338,56 +485,126 @@ def main():
             
             if image_file:
                 try:
-                    image = Image.open(image_file)
-                    st.session_state.uploaded_image = image
-                    st.image(image, caption="Uploaded image", use_column_width=True)
+                    artifacts = get_artifacts()
+                    image = st.session_state.uploaded_image
+                    if (st.session_state.uploaded_image_id != image_file.file_id
+                            or image is None or not artifacts.holds(st.session_state.session_id, image["hash"])):
+                        settings = st.secrets.get("images", {})
+                        data = image_file.getvalue()
+                        with profile("prepare_image"), metrics.span("image_prepare", bytes=len(data)) as span:
+                            payload = prepare_image(
+                                data,
+                                detail=settings.get("DETAIL", "high"),
+                                quality=int(settings.get("QUALITY", 85)),
+                                cache=get_image_cache(),
+                            )
+                            if image is not None:
+                                artifacts.release(st.session_state.session_id, image["hash"])
+                            data_url = payload.pop("data_url")
+                            artifacts.put(st.session_state.session_id, data_url, key=payload["hash"])
+                            payload["thumbnail"] = thumbnail(data_url)
+                            span.set(encoded_bytes=len(data_url), thumbnail_bytes=len(payload["thumbnail"]))
+                        st.session_state.uploaded_image = payload
+                        st.session_state.uploaded_image_id = image_file.file_id
+                    # A small preview, rather than the full-resolution upload, is what this session renders
+                    st.image(st.session_state.uploaded_image["thumbnail"], caption="Uploaded image")
                     
                     if st.button("Analyze Image"):
-                        with st.spinner("Analyzing image..."):
-                            analysis = process_image(image)
-                            st.session_state.chat_history.append({
-                                "role": "assistant", 
-                                "content": f"🖼️ **Image Analysis**\n\n{analysis}"
-                            })
-                            st.success("Analysis complete! Check the chat area.")
+                        st.session_state.pending_analysis = "image"
                 
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
         
+        st.checkbox(
+            "Skip response cache",
+            key="bypass_response_cache",
+            help="Always ask the model again instead of replaying an identical earlier answer",
+        )
+        cache_stats = get_response_cache().stats()
+        if cache_stats["hits"] + cache_stats["misses"]:
+            st.caption(
+                f"Response cache hit rate: {cache_stats['hit_rate']:.0%} "
+                f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})"
+            )
+        
+        # Before this session's first request the sidebar must not be what builds the provider clients
+        queued, in_flight = pipeline.queue_stats(get_router()) if st.session_state.get("router_ready") else (0, 0)
+        if queued:
+            st.caption(f"Model queue: {queued} waiting, {in_flight} in progress")
+        
+        session = st.session_state.session_id
+        usage = get_artifacts().session_report(session)
+        state_bytes = approximate_size(st.session_state.to_dict())
+        st.caption(
+            f"Session memory: {state_bytes / 1024:,.0f} KB in session state, "
+            f"{usage['bytes'] / 1024:,.0f} KB of uploads ({usage['exclusive_bytes'] / 1024:,.0f} KB not shared)"
+        )
+        
         if st.button("Clear All Uploads"):
-            st.session_state.report_text = None
+            report, image = st.session_state.report, st.session_state.uploaded_image
+            get_artifacts().release(
+                session,
+                *(report["text"], report["index"]) if report is not None else (),
+                *(image["hash"],) if image is not None else (),
+            )
+            st.session_state.report = None
+            st.session_state.lab_table = None
             st.session_state.uploaded_file_name = None
             st.session_state.uploaded_image = None
+            st.session_state.uploaded_image_id = None
             st.success("All uploads cleared!")
     
     st.header("💬 Chat")
     
-    for message in st.session_state.chat_history:
+    memory = st.session_state.memory
+    hidden = len(memory) - st.session_state.history_window
+    if hidden > 0 and st.button(f"Show earlier messages ({hidden} hidden)"):
+        st.session_state.history_window += int(st.secrets.get("memory", {}).get("HISTORY_WINDOW", 30))
+        st.rerun()
+    # Only the latest turns are rendered, so a long session does not slow down every rerun
+    for message in memory.window(st.session_state.history_window):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
     
+    pending = st.session_state.pop("pending_analysis", None)
+    report_text, report_index = report_artifacts()
+    if pending == "report" and report_text:
+        with profile("analyze_report"):
+            render_stream(analyze_report(report_text), "📋 **Report Analysis**")
+    elif pending == "image" and st.session_state.uploaded_image is not None:
+        with profile("process_image"):
+            render_stream(process_image(image_payload()), "🖼️ **Image Analysis**")
+    
     prompt = "Ask about your health or uploaded medical information..."
     user_message = st.chat_input(prompt)
     
     if user_message:
         with st.chat_message("user"):
             st.markdown(user_message)
-        st.session_state.chat_history.append({"role": "user", "content": user_message})
+        # Taken before the new turn is recorded, since the query is sent separately
+        history = memory.messages()
+        memory.append("user", user_message)
         
-        with st.spinner("Generating response..."):
-            response = chat_with_context(
+        with profile("chat_with_context"):
+            lab_history = None
+            if lab_store() is not None:
+                with metrics.span("lab_history"):
+                    lab_history = lab_store().context_table(user_message)
+            render_stream(chat_with_context(
                 user_message,
-                report_text=st.session_state.report_text,
-                image=st.session_state.uploaded_image
-            )
-        
-        with st.chat_message("assistant"):
-            st.markdown(response)
-        st.session_state.chat_history.append({"role": "assistant", "content": response})
+                report_text=report_text,
+                image=image_payload(),
+                report_index=report_index,
+                lab_history=lab_history,
+                history=history,
+            ))
     
-    if st.session_state.chat_history and st.button("Clear Chat History"):
-        st.session_state.chat_history = []
+    if len(memory) and st.button("Clear Chat History"):
+        memory.clear()
         st.success("Chat history cleared!")
+    
+    if is_admin():
+        admin_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
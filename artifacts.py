@@ -0,0 +1,215 @@
+"""Shared store for large per-session artifacts: report text, report indexes, encoded images
+
+Sessions keep only compact handles (content hashes, a thumbnail, a preview) in session state and
+look the blobs up here. One copy of each artifact is held however many sessions uploaded the same
+file; each artifact counts the sessions referencing it and is deleted when the last one releases
+it. Resident artifacts are bounded by max_bytes: the least recently used are spilled to a disk
+directory and loaded back on their next use.
+
+Streamlit gives no signal when a browser session goes away, so every rerun touches its session
+and sessions idle for longer than session_ttl have their references dropped on the next put.
+"""
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache import content_hash
+
+
+def approximate_size(value, _seen=None):
+    """Approximate the memory held by a value, following containers, object attributes and arrays"""
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        size = sys.getsizeof(value)
+        if value.dtype == object:
+            size += sum(approximate_size(item, seen) for item in value.ravel().tolist())
+        return size
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, memoryview, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        return size + sum(approximate_size(k, seen) + approximate_size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(approximate_size(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return size + approximate_size(vars(value), seen)
+    return size
+
+
+class ArtifactStore:
+    """Size-capped, reference-counted LRU of session artifacts with a disk spill directory
+
+    Thread-safe and shared by every session. Artifacts are immutable and keyed by content, so a
+    spilled copy written once stays valid until the artifact is deleted.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, session_ttl=2 * 3600):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="healthinsight-artifacts-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.session_ttl = session_ttl
+        self.current_bytes = 0
+        self.spills = 0
+        self.loads = 0
+        self._resident = OrderedDict()  # key -> value, least recently used first
+        self._sizes = {}  # key -> size, for every live artifact whether resident or spilled
+        self._refs = {}  # key -> sessions referencing it
+        self._sessions = {}  # session -> [keys, last seen]
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pkl")
+
+    def _touch(self, session):
+        entry = self._sessions.setdefault(session, [set(), 0.0])
+        entry[1] = time.monotonic()
+        return entry[0]
+
+    def touch(self, session):
+        """Mark a session as alive; call once per rerun"""
+        with self._lock:
+            self._touch(session)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._sizes
+
+    def holds(self, session, key):
+        """Return True if the session references the artifact
+
+        An artifact can outlive a session's reference when another session shares it, so a
+        session checks this, not `key in store`, before relying on an artifact it put earlier.
+        """
+        with self._lock:
+            return key in self._sessions.get(session, [set()])[0]
+
+    def _admit(self, key, value):
+        self._resident[key] = value
+        self.current_bytes += self._sizes[key]
+        # Spill least recently used artifacts until the rest fit, but never the one just admitted
+        while self.current_bytes > self.max_bytes and len(self._resident) > 1:
+            evicted, evicted_value = self._resident.popitem(last=False)
+            self.current_bytes -= self._sizes[evicted]
+            path = self._path(evicted)
+            if not os.path.exists(path):
+                with open(path + ".tmp", 'wb') as f:
+                    pickle.dump(evicted_value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(path + ".tmp", path)
+            self.spills += 1
+
+    def put(self, session, value, key=None, size=None):
+        """Store value for a session and return its handle; an existing artifact with the key is shared
+
+        Without a key, str and bytes values are keyed by their content hash. size defaults to
+        approximate_size(value).
+        """
+        if key is None:
+            data = value.encode('utf-8') if isinstance(value, str) else bytes(value)
+            key = content_hash(data, "artifact")
+        with self._lock:
+            self._expire()
+            self._touch(session).add(key)
+            self._refs.setdefault(key, set()).add(session)
+            if key in self._sizes:
+                if key in self._resident:
+                    self._resident.move_to_end(key)
+                return key
+            self._sizes[key] = approximate_size(value) if size is None else size
+            self._admit(key, value)
+            return key
+
+    def acquire(self, session, key):
+        """Add a session's reference to an existing artifact; returns False if there is none"""
+        with self._lock:
+            if key not in self._sizes:
+                return False
+            self._touch(session).add(key)
+            self._refs[key].add(session)
+            return True
+
+    def get(self, key):
+        """Return an artifact, loading it back from the spill directory if needed, or None if it is gone"""
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return self._resident[key]
+            if key not in self._sizes:
+                return None
+            with open(self._path(key), 'rb') as f:
+                value = pickle.load(f)
+            self.loads += 1
+            self._admit(key, value)
+            return value
+
+    def _drop_ref(self, session, key):
+        sessions = self._refs.get(key)
+        if sessions is None:
+            return
+        sessions.discard(session)
+        if sessions:
+            return
+        del self._refs[key]
+        size = self._sizes.pop(key)
+        if self._resident.pop(key, None) is not None:
+            self.current_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def release(self, session, *keys):
+        """Drop a session's references; artifacts no session references any more are deleted"""
+        with self._lock:
+            held = self._sessions.get(session, [set()])[0]
+            for key in keys:
+                if key is not None and key in held:
+                    held.discard(key)
+                    self._drop_ref(session, key)
+
+    def release_session(self, session):
+        """Drop every reference a session holds"""
+        with self._lock:
+            self._release_session(session)
+
+    def _release_session(self, session):
+        keys, _ = self._sessions.pop(session, [set(), 0.0])
+        for key in keys:
+            self._drop_ref(session, key)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for session in [session for session, (_, seen) in self._sessions.items() if seen < cutoff]:
+            self._release_session(session)
+
+    def session_report(self, session):
+        """Bytes of artifacts a session references: in total, held only by it, and currently in memory"""
+        with self._lock:
+            keys = self._sessions.get(session, [set()])[0]
+            return {
+                "artifacts": len(keys),
+                "bytes": sum(self._sizes[key] for key in keys),
+                "exclusive_bytes": sum(self._sizes[key] for key in keys if len(self._refs[key]) == 1),
+                "resident_bytes": sum(self._sizes[key] for key in keys if key in self._resident),
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "artifacts": len(self._sizes),
+                "sessions": len(self._sessions),
+                "resident": len(self._resident),
+                "bytes": self.current_bytes,
+                "spilled_bytes": sum(size for key, size in self._sizes.items() if key not in self._resident),
+                "max_bytes": self.max_bytes,
+                "spills": self.spills,
+                "loads": self.loads,
+            }
@@ -0,0 +1,223 @@
+"""Headless batch analysis of medical reports
+
+Walks a directory (or reads a manifest listing one report path per line), runs every report through
+read_file -> preprocess_text (plus local lab-value flags) -> report analysis, and appends one JSON line per report to the output
+file as soon as it finishes. Extraction runs in a process pool while model calls run concurrently
+under asyncio, bounded by --concurrency, with exponential backoff on 429s and transient errors.
+Reports already recorded with status "ok" in the output file are skipped, so an interrupted run
+resumes where it stopped.
+
+Credentials come from the environment (or a .env file): AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY
+and OPENAI_API_VERSION for --provider azure; OPENAI_API_KEY and OPENAI_BASE_URL for any
+OpenAI-compatible endpoint (Groq, a local stub server) with --provider openai.
+
+    python batch.py reports/ --output results.jsonl --model gpt-4o --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from extraction import preprocess_text, read_file
+from labs import extract_labs
+from llm import is_retryable, retry_delay
+from pipeline import analysis_messages
+from prompts import REPORT_ANALYSIS_PROMPT
+from summarize import condense_report_async, needs_condensing
+
+REPORT_EXTENSIONS = {'.pdf', '.docx', '.txt', '.xml'}
+
+
+def discover(source):
+    """List report paths from a directory tree or a manifest file with one path per line"""
+    path = Path(source)
+    if path.is_dir():
+        return sorted(str(p) for p in path.rglob('*') if p.is_file() and p.suffix.lower() in REPORT_EXTENSIONS)
+
+    paths = []
+    for line in path.read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            # Relative manifest entries are resolved against the manifest's own directory
+            paths.append(line if os.path.isabs(line) else str(path.parent / line))
+    return paths
+
+
+def load_checkpoint(output):
+    """Return the paths already analyzed successfully according to an existing output file"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line can be cut short if a previous run was killed mid-write
+                continue
+            if record.get("status") == "ok":
+                done.add(record["path"])
+    return done
+
+
+def extract(path):
+    """Process-pool job: read and clean one report and parse its lab rows, returning (text, labs, seconds)"""
+    start = time.perf_counter()
+    raw_text = read_file(path)
+    labs = extract_labs(raw_text)
+    return preprocess_text(raw_text), labs, time.perf_counter() - start
+
+
+class BatchAnalyzer:
+    """Runs report analyses against an async OpenAI-compatible client with bounded concurrency"""
+
+    def __init__(self, client, model, concurrency=8, max_retries=6, max_tokens=800, temperature=0.7,
+                 long_report_tokens=6000, section_tokens=3000):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.long_report_tokens = long_report_tokens
+        self.section_tokens = section_tokens
+        self.requests = 0
+        self.retries = 0
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def complete(self, messages, max_tokens):
+        """Send one request, retrying retryable failures; the concurrency slot is released while backing off"""
+        for attempt in range(self.max_retries + 1):
+            async with self._slots:
+                try:
+                    self.requests += 1
+                    completion = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=self.temperature,
+                    )
+                    return completion.choices[0].message.content or ""
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        raise
+                    delay = retry_delay(e, attempt)
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def analyze(self, report_text, lab_summary=""):
+        """Analyze one cleaned report, condensing it section by section first if it is too long"""
+        condensed = needs_condensing(report_text, self.long_report_tokens)
+        if condensed:
+            report_text, _ = await condense_report_async(
+                report_text,
+                self.complete,
+                section_tokens=self.section_tokens,
+                budget_tokens=self.long_report_tokens,
+                max_workers=self.concurrency,
+            )
+        messages = analysis_messages(
+            report_text,
+            REPORT_ANALYSIS_PROMPT,
+            "Please analyze this medical report and provide a comprehensive summary: ",
+            lab_summary,
+            condensed=condensed,
+        )
+        return await self.complete(messages, self.max_tokens)
+
+
+async def run_batch(paths, output, analyzer, workers=None, log=None):
+    """Analyze every path, appending one JSON record per report to output; returns status counts"""
+    workers = workers or os.cpu_count() or 1
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    loop = asyncio.get_running_loop()
+    counts = {"ok": 0, "error": 0}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output, 'a', encoding='utf-8') as out:
+        async def pipeline():
+            while not queue.empty():
+                path = queue.get_nowait()
+                record = {"path": path}
+                try:
+                    text, labs, record["extract_seconds"] = await loop.run_in_executor(pool, extract, path)
+                    record["chars"] = len(text)
+                    record["lab_values"] = len(labs)
+                    record["flagged_labs"] = int(labs.abnormal().sum())
+                    start = time.perf_counter()
+                    record["analysis"] = await analyzer.analyze(text, labs.summary())
+                    record["model_seconds"] = time.perf_counter() - start
+                    record["status"] = "ok"
+                except Exception as e:
+                    record["status"] = "error"
+                    record["error"] = f"{type(e).__name__}: {e}"
+                counts[record["status"]] += 1
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if log is not None:
+                    log(f"[{record['status']}] {path}")
+
+        # One pipeline per model slot plus one per extraction worker, so the next reports are being
+        # parsed while earlier ones wait on the model
+        await asyncio.gather(*(pipeline() for _ in range(analyzer.concurrency + workers)))
+    return counts
+
+
+def make_client(provider, base_url=None):
+    """Build an async client with SDK retries off, since BatchAnalyzer handles backoff itself"""
+    import openai
+    if provider == "azure":
+        return openai.AsyncAzureOpenAI(max_retries=0)
+    return openai.AsyncOpenAI(base_url=base_url, max_retries=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="directory of reports, or a manifest file listing report paths")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--model", required=True, help="model name, or the deployment name on Azure")
+    parser.add_argument("--provider", choices=["azure", "openai"], default="openai")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint, e.g. https://api.groq.com/openai/v1")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum model requests in flight")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--max-tokens", type=int, default=800)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    paths = discover(args.source)
+    done = load_checkpoint(args.output)
+    pending = [path for path in paths if path not in done]
+    print(f"{len(paths)} reports found, {len(done)} already done, {len(pending)} to analyze", file=sys.stderr)
+
+    async def run():
+        analyzer = BatchAnalyzer(
+            make_client(args.provider, args.base_url),
+            args.model,
+            concurrency=args.concurrency,
+            max_retries=args.max_retries,
+            max_tokens=args.max_tokens,
+        )
+        start = time.perf_counter()
+        counts = await run_batch(pending, args.output, analyzer, args.workers, log=lambda line: print(line, file=sys.stderr))
+        elapsed = time.perf_counter() - start
+        print(
+            f"{counts['ok']} ok, {counts['error']} failed in {elapsed:.1f}s "
+            f"({analyzer.requests} requests, {analyzer.retries} retries)",
+            file=sys.stderr,
+        )
+        return counts
+
+    counts = asyncio.run(run())
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
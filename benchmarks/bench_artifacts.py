@@ -0,0 +1,97 @@
+"""Per-session memory with the shared artifact store versus whole artifacts in session state
+
+Simulates --sessions sessions, each uploading one of --distinct reports and one of --distinct
+images (popular files are uploaded by many sessions). The baseline keeps each session's own
+report text, report index and encoded image, as session state used to; the store keeps one
+shared copy of each within --memory-mb and spills the rest to disk.
+
+Run from the repository root: python -m benchmarks.bench_artifacts
+"""
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+
+from artifacts import ArtifactStore, approximate_size
+from benchmarks.corpus import make_radiograph, report_lines
+from cache import content_hash
+from images import prepare_image, thumbnail
+from retrieval import ChunkIndex
+
+
+def uploads(distinct, report_lines_count):
+    reports = ['\n'.join(report_lines(report_lines_count, seed=number)) for number in range(distinct)]
+    images = [make_radiograph(1600, 1800, seed=number) for number in range(distinct)]
+    return reports, images
+
+
+def baseline_session(report, image):
+    """What one session held before: its own text, its own index and its own encoded image"""
+    # Each session decodes its own upload, so nothing is shared even for identical files
+    text = ''.join(list(report))
+    return {"report_text": text, "report_index": ChunkIndex(text), "uploaded_image": prepare_image(image)}
+
+
+def store_session(store, session, report, image):
+    """What one session holds now: handles and a thumbnail, with blobs in the shared store"""
+    text_key = content_hash(report.encode('utf-8'), "report")
+    index_key = content_hash(report.encode('utf-8'), "report-index")
+    if not store.acquire(session, text_key):
+        store.put(session, ''.join(list(report)), key=text_key)
+    if not store.acquire(session, index_key):
+        store.put(session, ChunkIndex(report), key=index_key)
+    payload = prepare_image(image)
+    data_url = payload.pop("data_url")
+    if not store.acquire(session, payload["hash"]):
+        store.put(session, data_url, key=payload["hash"])
+    payload["thumbnail"] = thumbnail(data_url)
+    return {"report": {"text": text_key, "index": index_key, "chars": len(report), "preview": report[:300]},
+            "uploaded_image": payload}
+
+
+def run(label, build, sessions):
+    tracemalloc.start()
+    start = time.perf_counter()
+    states = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_session = sum(approximate_size(state) for state in states) / len(states)
+    print(f"{label:>10} {current / 1e6:>10.1f} {per_session / 1024:>14.1f} {elapsed:>8.1f}s")
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20, help="distinct reports and images in circulation")
+    parser.add_argument("--report-lines", type=int, default=4000)
+    parser.add_argument("--memory-mb", type=int, default=16, help="resident budget of the artifact store")
+    args = parser.parse_args()
+
+    reports, images = uploads(args.distinct, args.report_lines)
+    rng = random.Random(0)
+    # Popular files are uploaded far more often than the rest
+    picks = [(rng.paretovariate(1.2), rng.paretovariate(1.2)) for _ in range(args.sessions)]
+    picks = [(int(a) % args.distinct, int(b) % args.distinct) for a, b in picks]
+
+    print(f"{'mode':>10} {'live MB':>10} {'KB / session':>14} {'time':>9}")
+    run("baseline", lambda: [baseline_session(reports[r], images[i]) for r, i in picks], args.sessions)
+    with tempfile.TemporaryDirectory() as spill:
+        store = ArtifactStore(args.memory_mb * 1024 * 1024, spill_dir=spill)
+        run("store", lambda: [store_session(store, f"s{n}", reports[r], images[i]) for n, (r, i) in enumerate(picks)],
+            args.sessions)
+        stats = store.stats()
+        print(f"\nstore: {stats['artifacts']} artifacts, {stats['bytes'] / 1e6:.1f} MB resident, "
+              f"{stats['spilled_bytes'] / 1e6:.1f} MB spilled, {stats['spills']} spills")
+        report = store.session_report("s0")
+        print(f"session s0 references {report['bytes'] / 1e6:.1f} MB of uploads, "
+              f"{report['exclusive_bytes'] / 1e6:.1f} MB not shared with other sessions")
+        for number in range(args.sessions):
+            store.release_session(f"s{number}")
+        print(f"after every session ends: {store.stats()['artifacts']} artifacts left")
+
+
+if __name__ == "__main__":
+    main()
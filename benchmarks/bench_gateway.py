@@ -0,0 +1,103 @@
+"""Load test: one bursty session plus several light ones, with and without the shared gateway
+
+Starts the mock LLM server with a concurrency quota (requests above it get 429s) and latency, then
+replays the same traffic twice: every request straight from its own thread to the provider, and
+every request through gateway.Gateway. Reports latency for the light sessions, 429s seen by the
+server and failures surfaced to users.
+
+Run from the repository root: python -m benchmarks.bench_gateway
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from openai import AsyncOpenAI, OpenAI
+
+import llm
+from benchmarks.mock_llm_server import start_server
+from gateway import Gateway, pooled_http_client
+
+MESSAGES = [{"role": "user", "content": "Explain my HbA1c result of 6.1% in plain language."}]
+
+
+def run_traffic(client_for, burst, light_sessions, light_requests):
+    """Fire the burst session's requests at once, then the light sessions; returns per-request records"""
+    records = []
+    lock = threading.Lock()
+
+    def request(session):
+        start = time.perf_counter()
+        try:
+            llm.complete_chat(client_for(session), label="bench", model="mock", messages=MESSAGES, max_tokens=60)
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            records.append({"session": session, "seconds": time.perf_counter() - start, "ok": ok})
+
+    def light(session):
+        for _ in range(light_requests):
+            request(session)
+
+    threads = [threading.Thread(target=request, args=("burst",)) for _ in range(burst)]
+    for thread in threads:
+        thread.start()
+    # Light users arrive just after the burst has filled the queue
+    time.sleep(0.05)
+    light_threads = [threading.Thread(target=light, args=(f"light-{n}",)) for n in range(light_sessions)]
+    for thread in light_threads:
+        thread.start()
+    for thread in threads + light_threads:
+        thread.join()
+    return records
+
+
+def report(label, records, elapsed, server_stats):
+    light = sorted(record["seconds"] for record in records if record["session"] != "burst" and record["ok"])
+    failed = sum(not record["ok"] for record in records)
+    p95 = light[int(len(light) * 0.95)] if light else float("nan")
+    print(
+        f"{label:>11} {elapsed:>7.2f}s {statistics.median(light) if light else float('nan'):>9.2f}s {p95:>9.2f}s "
+        f"{server_stats['rate_limited']:>6} {failed:>7} {server_stats['max_in_flight']:>9}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=40, help="requests fired at once by the bursty session")
+    parser.add_argument("--light-sessions", type=int, default=5)
+    parser.add_argument("--light-requests", type=int, default=3, help="sequential requests per light session")
+    parser.add_argument("--quota", type=int, default=6, help="concurrent requests the mock provider accepts")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tpm", type=int, default=None, help="also run the gateway with this tokens-per-minute budget")
+    args = parser.parse_args()
+
+    print(f"{'mode':>11} {'total':>8} {'light p50':>10} {'light p95':>10} {'429s':>6} {'failed':>7} {'in flight':>9}")
+    traffic = (args.burst, args.light_sessions, args.light_requests)
+    settings = {"latency": args.latency, "max_concurrent": args.quota, "retry_after": 0.2}
+
+    server, base_url, mock = start_server(**settings)
+    direct = OpenAI(base_url=base_url, api_key="mock")
+    start = time.perf_counter()
+    records = run_traffic(lambda session: direct, *traffic)
+    report("direct", records, time.perf_counter() - start, mock.stats())
+    server.shutdown()
+
+    modes = [("gateway", None)] + ([("gateway+tpm", args.tpm)] if args.tpm else [])
+    for label, tpm in modes:
+        server, base_url, mock = start_server(**settings)
+        gateway = Gateway(
+            AsyncOpenAI(base_url=base_url, api_key="mock", max_retries=0, http_client=pooled_http_client(args.quota)),
+            max_concurrency=args.quota,
+            tokens_per_minute=tpm,
+        )
+        start = time.perf_counter()
+        records = run_traffic(gateway.client_for, *traffic)
+        report(label, records, time.perf_counter() - start, mock.stats())
+        gateway.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare per-turn image encoding before and after the one-time preparation stage
+
+Run from the repository root: python -m benchmarks.bench_image
+"""
+import argparse
+import base64
+import io
+import time
+
+from PIL import Image
+
+from benchmarks.corpus import make_radiograph
+from cache import LRUCache
+from images import prepare_image
+
+
+def legacy_encode(data):
+    """What every chat turn used to do: full-resolution JPEG plus base64 of the decoded image"""
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in ("RGB", "L"):
+        # The old code crashed here on RGBA PNGs; convert so the baseline can still be timed
+        image = image.convert("RGB")
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffered.getvalue()).decode('ascii')
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [
+        ("3000x3600 L PNG", make_radiograph(3000, 3600)),
+        ("4000x5000 RGBA PNG", make_radiograph(4000, 5000, mode="RGBA")),
+        ("3000x3600 16-bit PNG", make_radiograph(3000, 3600, mode="I;16")),
+        ("4000x5000 RGB JPEG", make_radiograph(4000, 5000, mode="RGB", fmt="JPEG")),
+    ]
+    print(f"{'image':>22} {'legacy':>9} {'payload':>9} {'prepared':>9} {'payload':>9} {'cached':>9}")
+    for label, data in cases:
+        legacy_seconds, legacy_url = timed(lambda: legacy_encode(data), args.repeat)
+        prepared_seconds, payload = timed(lambda: prepare_image(data), args.repeat)
+        cache = LRUCache(64 * 1024 * 1024)
+        prepare_image(data, cache=cache)
+        cached_seconds, _ = timed(lambda: prepare_image(data, cache=cache), args.repeat)
+        print(
+            f"{label:>22} {legacy_seconds * 1000:>7.0f}ms {len(legacy_url) / 1e6:>7.2f}MB "
+            f"{prepared_seconds * 1000:>7.0f}ms {payload['bytes'] / 1e6:>7.2f}MB {cached_seconds * 1000:>7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
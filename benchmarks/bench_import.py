@@ -0,0 +1,113 @@
+"""Cold import time of the app entry points and which heavy packages they load at startup
+
+Each target is imported in a fresh interpreter under `python -X importtime`, so nothing is shared
+between measurements. app.py and agent.py run as Streamlit scripts and cannot be imported outside
+a server, so for them the benchmark imports their top-level imports (read from the source).
+
+Format parsers and provider SDKs must load on first use of their format or backend, never at
+import: with --check the run fails if any target loads one of LAZY_PACKAGES, or if its cumulative
+import time exceeds the baseline file by more than --tolerance.
+
+Run from the repository root: python -m benchmarks.bench_import [--check] [--update]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "import_baseline.json")
+
+TARGETS = ("app.py", "agent.py", "batch.py", "pipeline", "extraction", "ocr", "images", "gateway")
+
+# Packages that only some sessions need; importing any of them at startup is a regression
+LAZY_PACKAGES = ("PyPDF2", "docx", "lxml", "PIL", "openai", "groq", "httpx", "pytesseract")
+
+# Other packages worth naming in the breakdown when they are loaded
+REPORTED_PACKAGES = LAZY_PACKAGES + ("streamlit", "numpy", "pandas", "dotenv")
+
+
+def script_imports(path):
+    """Source of the module-level import statements of a script"""
+    with open(os.path.join(ROOT, path), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(target):
+    """Import a target in a fresh interpreter; return total microseconds and per-package cumulative times"""
+    source = script_imports(target) if target.endswith(".py") else f"import {target}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", source],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"importing {target} failed:\n{result.stderr}")
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[1].strip().isdigit():
+            continue  # the column header
+        cumulative, name = int(fields[1]), fields[2]
+        # Only top-level entries (no leading indentation) add up to the total
+        if not name.startswith("  "):
+            total += cumulative
+        # A package's cost is that of its slowest module, e.g. PIL.Image rather than the tiny PIL
+        package = name.strip().split(".")[0]
+        if package in REPORTED_PACKAGES:
+            packages[package] = max(packages.get(package, 0), cumulative)
+    return total, packages
+
+
+def median_of(target, repeat):
+    runs = [measure(target) for _ in range(repeat)]
+    runs.sort(key=lambda run: run[0])
+    return runs[len(runs) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per target; the median is kept")
+    parser.add_argument("--check", action="store_true", help="fail on eagerly loaded lazy packages or regressions")
+    parser.add_argument("--update", action="store_true", help="write the measured times as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    failures = []
+    measured = {}
+    print(f"{'target':>12} {'import ms':>10} {'baseline':>9}  heavy packages loaded (cumulative ms)")
+    for target in TARGETS:
+        total, packages = median_of(target, args.repeat)
+        measured[target] = round(total / 1000, 1)
+        loaded = ", ".join(f"{name} {us / 1000:.0f}" for name, us in sorted(packages.items(), key=lambda item: -item[1]))
+        previous = baseline.get(target)
+        print(f"{target:>12} {total / 1000:>10.1f} {previous if previous is not None else '-':>9}  {loaded or '-'}")
+        eager = [name for name in packages if name in LAZY_PACKAGES]
+        if eager:
+            failures.append(f"{target} loads {', '.join(sorted(eager))} at import")
+        if previous is not None and total / 1000 > previous * (1 + args.tolerance):
+            failures.append(f"{target} imports in {total / 1000:.0f}ms, baseline {previous:.0f}ms")
+
+    if args.update:
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump(measured, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written to {os.path.relpath(BASELINE, ROOT)}")
+    if failures:
+        print("\n" + "\n".join(failures))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Ingest and query latency of the per-patient lab store at longitudinal scale
+
+Builds one patient's history of --reports reports (each a panel of every corpus analyte, one
+report a day with a slow drift) in a temporary directory, then times trend/delta/range queries
+on a cold store (index build included) and warm ones, and the chat context table.
+
+Run from the repository root: python -m benchmarks.bench_lab_store
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.corpus import ANALYTES
+from lab_store import LabStore
+from labs import LabTable
+
+
+def synthetic_panels(reports, panels_per_report, seed=0):
+    """Yield (report_id, LabTable, day) with each analyte drifting slowly across the years"""
+    rng = np.random.default_rng(seed)
+    names = [name for name, _, _, _ in ANALYTES] * panels_per_report
+    units = [unit for _, unit, _, _ in ANALYTES] * panels_per_report
+    low = np.array([low for _, _, low, _ in ANALYTES] * panels_per_report, dtype=np.float64)
+    high = np.array([high for _, _, _, high in ANALYTES] * panels_per_report, dtype=np.float64)
+    start = np.datetime64('2000-01-01', 'D')
+    for number in range(reports):
+        drift = 1 + 0.3 * number / reports
+        values = rng.uniform(low * 0.8, high * 1.1) * drift
+        yield f"report-{number}", LabTable(names, values, units, low, high), start + np.timedelta64(number, 'D')
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2] * 1000, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--panels", type=int, default=3, help="copies of the analyte panel per report")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        store = LabStore(root)
+        start = time.perf_counter()
+        for report_id, labs, day in synthetic_panels(args.reports, args.panels):
+            store.add_report(report_id, labs, day)
+        ingest = time.perf_counter() - start
+        print(f"ingested {args.reports} reports in {ingest:.2f}s ({ingest / args.reports * 1e6:.0f}us per report)")
+
+        # A fresh instance over the same files: the first query maps the columns and builds the index
+        store = LabStore(root)
+        start = time.perf_counter()
+        store.stats("HbA1c")
+        print(f"cold query (map + index {len(store):,} observations): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        rng = np.random.default_rng(1)
+        names = [name for name, _, _, _ in ANALYTES]
+        cases = {
+            "stats (all time)": lambda name: store.stats(name),
+            "stats (last 5 years)": lambda name: store.stats(name, since=np.datetime64('2022-01-01')),
+            "series window": lambda name: store.series(name, '2005-01-01', '2010-12-31'),
+            "context table": lambda name: store.context_table(
+                f"How has my {name} changed over the last 5 years?", today='2027-05-18'),
+        }
+        print(f"{'query':>22} {'p50':>9} {'p95':>9}")
+        for label, query in cases.items():
+            samples = []
+            for _ in range(args.queries):
+                name = names[rng.integers(len(names))]
+                begin = time.perf_counter()
+                query(name)
+                samples.append(time.perf_counter() - begin)
+            p50, p95 = percentiles(samples)
+            print(f"{label:>22} {p50:>7.2f}ms {p95:>7.2f}ms")
+        print()
+        print(store.context_table("How has my HbA1c and glucose changed over the last 5 years?", today='2027-05-18'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Lab-value extraction speed across sample report formats, and vectorized vs per-row flagging
+
+Each report is extracted to text first (outside the timing, as the app does once per upload);
+the timed part is extract_labs() on that text plus the summary sent to the model.
+
+Run from the repository root: python -m benchmarks.bench_labs
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.corpus import make_ccd, make_docx, make_pdf, report_lines
+from extraction import read_bytes
+from labs import extract_labs, flag_results
+
+
+def per_row_flags(values, low, high, reported):
+    """The obvious Python loop over rows that flag_results replaces"""
+    flags = []
+    for value, lo, hi, flag in zip(values.tolist(), low.tolist(), high.tolist(), reported.tolist()):
+        if lo != lo and hi != hi:
+            flags.append(flag)
+        elif value < lo:
+            flags.append('L')
+        elif value > hi:
+            flags.append('H')
+        else:
+            flags.append('')
+    return flags
+
+
+def corpus(scale):
+    """Sample reports as (label, text) pairs, roughly `scale` lab rows each"""
+    return [
+        ("txt", '\n'.join(report_lines(scale * 3 // 2, seed=1))),
+        ("pdf", read_bytes(make_pdf(max(1, scale // 27), seed=2))),
+        ("docx", read_bytes(make_docx(max(5, scale // 6), seed=3))),
+        ("ccd", read_bytes(make_ccd(max(1, scale // 50), seed=4))),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000], help="lab rows per report")
+    parser.add_argument("--flag-rows", type=int, default=1_000_000, help="table size for the flagging comparison")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'format':>7} {'rows':>8} {'KB':>8} {'extract':>10} {'summary':>10} {'MB/s':>8} {'flagged':>8}")
+    for scale in args.rows:
+        for label, text in corpus(scale):
+            best_extract = best_summary = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                table = extract_labs(text)
+                middle = time.perf_counter()
+                table.summary()
+                best_extract = min(best_extract, middle - start)
+                best_summary = min(best_summary, time.perf_counter() - middle)
+            size = len(text.encode('utf-8'))
+            print(
+                f"{label:>7} {len(table):>8} {size / 1e3:>8.0f} {best_extract * 1000:>8.2f}ms "
+                f"{best_summary * 1000:>8.2f}ms {size / 1e6 / best_extract:>8.1f} {int(table.abnormal().sum()):>8}"
+            )
+
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 200, args.flag_rows)
+    low = np.where(rng.random(args.flag_rows) < 0.1, np.nan, 50.0)
+    high = np.where(rng.random(args.flag_rows) < 0.1, np.nan, 150.0)
+    reported = np.where(rng.random(args.flag_rows) < 0.5, 'H', '').astype('<U1')
+    start = time.perf_counter()
+    per_row_flags(values, low, high, reported)
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    flag_results(values, low, high, reported)
+    vectorized = time.perf_counter() - start
+    print(f"\nflagging {args.flag_rows:,} rows: per-row loop {loop * 1000:.0f}ms, "
+          f"vectorized {vectorized * 1000:.1f}ms ({loop / vectorized:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
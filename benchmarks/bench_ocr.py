@@ -0,0 +1,39 @@
+"""Measure OCR fallback throughput on synthetic scanned PDFs, cold and from cache
+
+Needs the tesseract binary on PATH. Run from the repository root: python -m benchmarks.bench_ocr
+"""
+import argparse
+import os
+import time
+
+from benchmarks.corpus import make_scanned_pdf
+from cache import LRUCache
+from extraction import read_bytes
+from ocr import OCREngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    if not OCREngine().available:
+        raise SystemExit("tesseract is not installed; see https://github.com/tesseract-ocr/tesseract")
+
+    print(f"{'pages':>6} {'workers':>8} {'cold':>9} {'cached':>9} {'chars':>7}")
+    for page_count in args.pages:
+        data = make_scanned_pdf(page_count)
+        for workers in sorted({1, args.workers}):
+            engine = OCREngine(cache=LRUCache(64 * 1024 * 1024), workers=workers)
+            start = time.perf_counter()
+            text = read_bytes(data, ocr=engine)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            read_bytes(data, ocr=engine)
+            cached = time.perf_counter() - start
+            print(f"{page_count:>6} {workers:>8} {cold:>8.2f}s {cached * 1000:>7.1f}ms {len(text):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compare serial and pooled PDF page extraction on synthetic reports
+
+The shared page pool starts once per process; that start-up is timed on its own first, so the
+table shows the steady state every later upload sees.
+
+Run from the repository root: python -m benchmarks.bench_pdf
+"""
+import argparse
+import os
+import time
+
+from benchmarks.corpus import make_pdf
+from extraction import PDF_BATCH_PAGES, iter_pdf_pages
+
+
+def measure(data, workers):
+    start = time.perf_counter()
+    first_page = None
+    pages = 0
+    for _ in iter_pdf_pages(data, workers):
+        pages += 1
+        if first_page is None:
+            first_page = time.perf_counter() - start
+    return pages, first_page, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        _, _, startup = measure(make_pdf(PDF_BATCH_PAGES * 2), args.workers)
+        print(f"pool start-up with a {PDF_BATCH_PAGES * 2}-page report: {startup:.2f}s\n")
+    print(f"{'pages':>6} {'mode':>8} {'first page':>11} {'total':>9} {'pages/s':>9}")
+    for page_count in args.pages:
+        data = make_pdf(page_count)
+        for label, workers in (("serial", None), (f"pool x{args.workers}", args.workers)):
+            pages, first_page, total = measure(data, workers)
+            print(f"{pages:>6} {label:>8} {first_page * 1000:>9.1f}ms {total:>8.2f}s {pages / total:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
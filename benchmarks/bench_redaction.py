@@ -0,0 +1,63 @@
+"""Throughput of the single-pass redaction engine against the previous preprocess_text
+
+Run from the repository root: python -m benchmarks.bench_redaction
+"""
+import argparse
+import re
+import time
+
+from benchmarks.corpus import FIRST_NAMES, LAST_NAMES, phi_report
+from redaction import PlaceholderMap, Redactor
+
+
+def legacy_preprocess(text):
+    """The two uncompiled re.sub passes preprocess_text used to run"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'Patient ID:\s*\d+', '[REDACTED]', text)
+    return text.strip()
+
+
+def name_dictionary(size):
+    """Build `size` distinct full names, as a hospital roster would supply"""
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    return names + [f"Name{number} Surname{number}" for number in range(max(0, size - len(names)))]
+
+
+def timed(function, text):
+    start = time.perf_counter()
+    output = function(text)
+    return time.perf_counter() - start, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, nargs="+", default=[1, 10, 50], help="report sizes in MB")
+    parser.add_argument("--names", type=int, default=5000, help="size of the optional name dictionary")
+    parser.add_argument("--chunk-kb", type=int, default=64, help="chunk size for the streaming pass")
+    args = parser.parse_args()
+
+    redactor = Redactor()
+    start = time.perf_counter()
+    with_names = Redactor(names=name_dictionary(args.names))
+    compile_seconds = time.perf_counter() - start
+    print(f"compiled {args.names}-name dictionary in {compile_seconds * 1000:.0f}ms")
+
+    chunk = args.chunk_kb * 1024
+    cases = [
+        ("legacy", legacy_preprocess),
+        ("redact", lambda text: redactor.redact(text, PlaceholderMap())),
+        ("stream", lambda text: ''.join(redactor.iter_redact(
+            (text[i:i + chunk] for i in range(0, len(text), chunk)), PlaceholderMap()))),
+        ("names", lambda text: with_names.redact(text, PlaceholderMap())),
+    ]
+    print(f"{'MB':>6} " + " ".join(f"{label:>12}" for label, _ in cases) + "   (MB/s)")
+    for size in args.mb:
+        # phi_report lines average about 45 characters
+        text = phi_report(int(size * 1e6 / 45), seed=int(size))
+        megabytes = len(text.encode('utf-8')) / 1e6
+        rates = [megabytes / timed(function, text)[0] for _, function in cases]
+        print(f"{megabytes:>6.1f} " + " ".join(f"{rate:>12.1f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Routing, failover and hedging against in-process fake backends
+
+Three fake backends: a fast one with a heavy latency tail, a slower steady one, and a flaky one
+that fails half its requests. Compares time to first token for a single fixed backend, the
+latency-aware router, and the router with hedging. Everything runs in-process, so the numbers
+isolate the routing policy from network noise.
+
+Run from the repository root: python -m benchmarks.bench_router
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+from benchmarks.fake_backend import FakeClient
+from router import Backend, Router
+
+MESSAGES = [{"role": "user", "content": "Summarize my lipid panel."}]
+
+
+def make_backends():
+    return [
+        Backend("fast-tail", FakeClient(latency=0.05, tail=1.0, tail_rate=0.1, seed=1), "fast"),
+        Backend("steady", FakeClient(latency=0.12, seed=2), "steady"),
+        Backend("flaky", FakeClient(latency=0.03, error_rate=0.5, seed=3), "flaky"),
+    ]
+
+
+def measure(client, requests, concurrency):
+    """Stream `requests` replies and return (sorted TTFTs, failures)"""
+    def one(_):
+        start = time.perf_counter()
+        chunks = llm.stream_chat(client, label="bench_router", error_message="failed", messages=MESSAGES)
+        first = next(chunks)
+        ttft = time.perf_counter() - start
+        for _ in chunks:
+            pass
+        return ttft, first.startswith("failed")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    return sorted(ttft for ttft, failed in results if not failed), sum(failed for _, failed in results)
+
+
+def report(label, ttfts, failures):
+    p50 = ttfts[len(ttfts) // 2]
+    p95 = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))]
+    print(f"{label:>22} {p50 * 1000:>8.0f}ms {p95 * 1000:>8.0f}ms {failures:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--hedge-after", type=float, default=0.15, help="seconds before sending a hedged duplicate")
+    args = parser.parse_args()
+
+    print(f"{'mode':>22} {'p50 TTFT':>10} {'p95 TTFT':>10} {'failures':>8}")
+    for backend in make_backends():
+        report(f"only {backend.name}", *measure(backend.client, args.requests, args.concurrency))
+
+    router = Router(make_backends())
+    report("router", *measure(router.client_for("bench"), args.requests, args.concurrency))
+    print(f"{'':>22} {router.snapshot()['failovers']} failovers")
+
+    router = Router(make_backends(), hedge_after=args.hedge_after)
+    report(f"router + hedge {args.hedge_after:.2f}s", *measure(router.client_for("bench"), args.requests, args.concurrency))
+    snapshot = router.snapshot()
+    print(f"{'':>22} {snapshot['hedges']} hedges, {snapshot['hedge_wins']} won by the hedge, {snapshot['failovers']} failovers")
+    for name, stats in snapshot["backends"].items():
+        p50 = f"{stats['p50'] * 1000:.0f}ms" if stats["p50"] is not None else "-"
+        print(f"{'':>22} {name}: {stats['requests']} requests, p50 {p50}, errors {stats['error_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""End-to-end benchmark suite checked against a committed baseline
+
+Scenarios, each over the synthetic corpus from benchmarks.corpus:
+
+- read_file_<kind>: read_file on PDF, DOCX, TXT and CDA-XML reports written to a temp directory
+- xml_to_text: CDA narrative flattening on the report bytes
+- preprocess_text: PHI redaction with placeholders on report text full of identifiers
+- prepare_image: decode, resize and JPEG-encode an uploaded radiograph, as process_image sends it
+- chat_round_trip: a follow-up chat turn built by pipeline.chat_messages (retrieval over an indexed
+  report plus conversation memory) and streamed through the router and gateway from the mock server
+- app_chat_turn: the same turn through app.py itself under Streamlit's AppTest, rerun included
+
+Every scenario runs once to warm up and then --repeat timed times for p50/p95 latency and throughput.
+One more run under tracemalloc gives the allocation peak; it is separate because tracing slows Python
+code severalfold. tracemalloc does not see memory that C extensions allocate outside Python.
+
+Results are compared with benchmarks/baseline.json. A scenario fails when any of these regress
+beyond their tolerance:
+- p95 latency or throughput, by more than --tolerance
+- peak memory, by more than --memory-tolerance
+- errors, by any increase
+
+Failures exit with status 1. The baseline records the settings it was measured with, and it is
+only compared under the same settings. Re-record it on the machine that runs the suite with
+--update.
+
+Run from the repository root: python -m benchmarks.bench_suite [--only read_file chat] [--update]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import llm
+import pipeline
+from benchmarks.corpus import make_report, phi_report
+from benchmarks.mock_llm_server import start_server
+from extraction import preprocess_text, read_file, xml_to_text
+from images import prepare_image
+from memory import ConversationMemory
+from prompts import CHAT_PROMPT
+from redaction import PlaceholderMap
+from retrieval import ChunkIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+QUESTIONS = [
+    "What does my HbA1c result mean?",
+    "Is my glucose level something to worry about?",
+    "Explain the chest radiograph findings in plain language.",
+    "Which of my results are outside the reference range?",
+    "What follow-up did the doctor recommend?",
+    "Are my kidney function results normal?",
+]
+
+# Sampling as the app sends it
+SAMPLING = {"max_tokens": 800, "temperature": 0.7, "top_p": 0.95}
+
+
+def mock_backend(stack, args):
+    """Start the mock server for this run and return a router session client pointed at it"""
+    server, base_url, settings = start_server(
+        latency=args.latency, token_delay=args.token_delay, rate_limit=args.rate_limit,
+        error_rate=args.error_rate, disconnect_rate=args.disconnect_rate,
+    )
+    stack.callback(server.shutdown)
+    router = pipeline.build_router({"GROQ_API_KEY": "bench", "groq": {"BASE_URL": base_url}})
+    for backend in router.backends:
+        stack.callback(backend.client.close)
+    return router, base_url
+
+
+def read_file_scenario(kind):
+    def setup(stack, args):
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, f"report.{kind}")
+        with open(path, 'wb') as f:
+            f.write(make_report(kind, args.size_kb))
+        return lambda: read_file(path), os.path.getsize(path)
+    return setup
+
+
+def xml_scenario(stack, args):
+    data = make_report("xml", args.size_kb)
+    return lambda: xml_to_text(data), len(data)
+
+
+def preprocess_scenario(stack, args):
+    # phi_report lines average about 45 characters
+    text = phi_report(args.size_kb * 1024 // 45)
+    return lambda: preprocess_text(text, PlaceholderMap()), len(text.encode('utf-8'))
+
+
+def image_scenario(stack, args):
+    data = make_report("png", args.image_kb)
+    return lambda: prepare_image(data), len(data)
+
+
+def chat_scenario(stack, args):
+    router, _ = mock_backend(stack, args)
+    client = router.client_for("bench")
+    text = preprocess_text(phi_report(args.size_kb * 1024 // 45))
+    index = ChunkIndex(text)
+    memory = ConversationMemory()
+    turns = iter(range(10**9))
+
+    def turn():
+        question = QUESTIONS[next(turns) % len(QUESTIONS)]
+        messages = pipeline.chat_messages(question, CHAT_PROMPT, report_index=index, history=memory.messages())
+        memory.append("user", question)
+        reply = ''.join(llm.stream_chat(client, label="bench", messages=messages, **SAMPLING))
+        memory.append("assistant", reply)
+        # stream_chat reports failures as a final error chunk rather than raising
+        if "Error generating response:" in reply:
+            raise RuntimeError(reply)
+
+    return turn, None
+
+
+def app_scenario(stack, args):
+    from streamlit.testing.v1 import AppTest
+
+    _, base_url = mock_backend(stack, args)
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    app.secrets["GROQ_API_KEY"] = "bench"
+    app.secrets["groq"] = {"BASE_URL": base_url}
+    app.run()
+    turns = iter(range(10**9))
+
+    def turn():
+        app.chat_input[0].set_value(QUESTIONS[next(turns) % len(QUESTIONS)]).run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        reply = app.chat_message[-1].markdown[0].value
+        if "Error generating response:" in reply:
+            raise RuntimeError(reply)
+
+    return turn, None
+
+
+SCENARIOS = {
+    "read_file_pdf": read_file_scenario("pdf"),
+    "read_file_docx": read_file_scenario("docx"),
+    "read_file_txt": read_file_scenario("txt"),
+    "read_file_xml": read_file_scenario("xml"),
+    "xml_to_text": xml_scenario,
+    "preprocess_text": preprocess_scenario,
+    "prepare_image": image_scenario,
+    "chat_round_trip": chat_scenario,
+    "app_chat_turn": app_scenario,
+}
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_scenario(name, args):
+    """Run one scenario and return its measurements"""
+    with contextlib.ExitStack() as stack:
+        operation, size = SCENARIOS[name](stack, args)
+        errors = 0
+        samples = []
+        for iteration in range(args.repeat + 1):
+            start = time.perf_counter()
+            try:
+                operation()
+            except Exception as e:
+                errors += 1
+                if args.verbose:
+                    print(f"  {name}: {type(e).__name__}: {str(e)[:200]}", file=sys.stderr)
+            # The first run warms caches, pools and connections and is not timed
+            if iteration:
+                samples.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            operation()
+        except Exception:
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    samples.sort()
+    total = sum(samples)
+    return {
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        # MB of input per second for parsers and encoders, operations per second for chat turns
+        "throughput": round(size * len(samples) / total / 1e6 if size else len(samples) / total, 3),
+        "unit": "MB/s" if size else "ops/s",
+        "peak_mb": round(peak / 1e6, 3),
+        "errors": errors,
+    }
+
+
+def regressions(result, baseline, args):
+    """Reasons a scenario's result is worse than its baseline beyond the tolerances"""
+    found = []
+    if (result["p95_ms"] > baseline["p95_ms"] * (1 + args.tolerance)
+            and result["p95_ms"] - baseline["p95_ms"] > args.min_ms):
+        found.append(f"p95 {result['p95_ms']:.1f}ms vs {baseline['p95_ms']:.1f}ms")
+    if result["throughput"] < baseline["throughput"] / (1 + args.tolerance):
+        found.append(f"throughput {result['throughput']:.2f} vs {baseline['throughput']:.2f} {result['unit']}")
+    if (result["peak_mb"] > baseline["peak_mb"] * (1 + args.memory_tolerance)
+            and result["peak_mb"] - baseline["peak_mb"] > 1.0):
+        found.append(f"peak {result['peak_mb']:.1f}MB vs {baseline['peak_mb']:.1f}MB")
+    if result["errors"] > baseline["errors"]:
+        found.append(f"{result['errors']} errors vs {baseline['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="run scenarios whose names start with these")
+    parser.add_argument("--repeat", type=int, default=15, help="timed runs per scenario")
+    parser.add_argument("--size-kb", type=int, default=128, help="report text per document")
+    parser.add_argument("--image-kb", type=int, default=2048, help="encoded size of the uploaded image")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock server seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.001, help="mock server seconds between chunks")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of mock requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests answered 500")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="fraction of mock streams cut off")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p95 and throughput regression")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed peak memory regression")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="ignore p95 increases smaller than this")
+    parser.add_argument("--update", action="store_true", help="record this run as the baseline")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    parser.add_argument("--verbose", action="store_true", help="print each failed operation")
+    args = parser.parse_args()
+
+    names = [name for name in SCENARIOS if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    settings = {
+        key: getattr(args, key)
+        for key in ("repeat", "size_kb", "image_kb", "latency", "token_delay", "rate_limit", "error_rate",
+                    "disconnect_rate")
+    }
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding='utf-8') as f:
+            recorded = json.load(f)
+        if recorded.get("settings") == settings:
+            baseline = recorded["scenarios"]
+        elif not args.update:
+            print("baseline was recorded with other settings; comparing nothing\n")
+
+    print(f"{'scenario':>16} {'p50 ms':>9} {'p95 ms':>9} {'throughput':>13} {'peak MB':>8} {'errors':>6}  status")
+    results = {}
+    failures = []
+    for name in names:
+        result = results[name] = run_scenario(name, args)
+        found = regressions(result, baseline[name], args) if name in baseline else []
+        status = "REGRESSED: " + "; ".join(found) if found else ("ok" if name in baseline else "new")
+        if found:
+            failures.append(name)
+        throughput = f"{result['throughput']:.2f} {result['unit']}"
+        print(f"{name:>16} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {throughput:>13} "
+              f"{result['peak_mb']:>8.1f} {result['errors']:>6}  {status}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"settings": settings, "scenarios": results}, f, indent=2)
+            f.write("\n")
+    if args.update:
+        scenarios = dict(baseline)
+        scenarios.update(results)
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump({"settings": settings, "scenarios": scenarios}, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written to {os.path.relpath(BASELINE, ROOT)}")
+    elif failures:
+        print(f"\n{len(failures)} scenario(s) regressed: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
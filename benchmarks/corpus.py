@@ -0,0 +1,258 @@
+"""Synthetic medical report generators used by the benchmarks
+
+Also writes a corpus to disk, e.g. for batch.py runs:
+
+    python -m benchmarks.corpus reports/ --kinds pdf docx txt xml png --size-kb 256 --count 10
+"""
+import argparse
+import io
+import math
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+ANALYTES = [
+    ("Hemoglobin", "g/dL", 13.5, 17.5),
+    ("WBC", "10^3/uL", 4.5, 11.0),
+    ("Platelets", "10^3/uL", 150, 400),
+    ("Glucose", "mg/dL", 70, 99),
+    ("Creatinine", "mg/dL", 0.7, 1.3),
+    ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.1),
+    ("HbA1c", "%", 4.0, 5.6),
+    ("ALT", "U/L", 7, 56),
+    ("TSH", "mIU/L", 0.4, 4.0),
+]
+
+NARRATIVE = [
+    "Patient presented with intermittent chest discomfort and shortness of breath.",
+    "No acute distress noted on examination. Vital signs within normal limits.",
+    "Chest radiograph shows no focal consolidation or pleural effusion.",
+    "Continue current medications and follow up with primary care in two weeks.",
+    "Echocardiogram demonstrates preserved ejection fraction without wall motion abnormality.",
+    "Patient advised on low sodium diet and regular aerobic exercise.",
+]
+
+
+def report_lines(count, seed=0):
+    """Return `count` lines of plausible report text mixing narrative and lab rows"""
+    rng = random.Random(seed)
+    lines = []
+    for number in range(count):
+        if number % 3 == 0:
+            lines.append(rng.choice(NARRATIVE))
+        else:
+            name, unit, low, high = rng.choice(ANALYTES)
+            value = round(rng.uniform(low * 0.7, high * 1.3), 1)
+            lines.append(f"{name} {value} {unit} ({low}-{high})")
+    return lines
+
+
+def _escape_pdf_text(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages, lines_per_page=40, seed=0):
+    """Build a text PDF with the given number of pages without any PDF-writing dependency"""
+    lines = report_lines(pages * lines_per_page, seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        chunk = lines[page * lines_per_page:(page + 1) * lines_per_page]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td", f"(Page {page + 1}) Tj T*"]
+        ops += [f"({_escape_pdf_text(line)}) Tj T*" for line in chunk]
+        ops.append("ET")
+        stream = "\n".join(ops).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+
+def scanned_page(lines, resolution=150):
+    """Render text lines onto a greyscale letter-size page image, as a flatbed scanner would"""
+    width, height = int(8.5 * resolution), int(11 * resolution)
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=max(12, resolution // 7))
+    line_height = int(font.size * 1.6)
+    for number, line in enumerate(lines):
+        draw.text((resolution // 2, resolution // 2 + number * line_height), line, fill=0, font=font)
+    return page
+
+
+def make_scanned_pdf(pages, lines_per_page=25, seed=0, resolution=150):
+    """Build an image-only PDF whose text can only be recovered by OCR"""
+    images = [scanned_page(report_lines(lines_per_page, seed + page), resolution) for page in range(pages)]
+    out = io.BytesIO()
+    images[0].save(out, "PDF", save_all=True, append_images=images[1:], resolution=resolution)
+    return out.getvalue()
+
+
+def make_ccd(sections, rows_per_section=50, seed=0):
+    """Build an HL7 CDA/CCD document with narrative paragraphs and result tables in each section"""
+    from xml.sax.saxutils import escape
+
+    rng = random.Random(seed)
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<ClinicalDocument xmlns="urn:hl7-org:v3">',
+        '<recordTarget><patientRole><patient><name><given>Jane</given><family>Doe</family></name>'
+        '</patient></patientRole></recordTarget>',
+        '<component><structuredBody>',
+    ]
+    for section in range(sections):
+        parts.append(f'<component><section><title>Results panel {section + 1}</title><text>')
+        parts.append(f'<paragraph>{escape(rng.choice(NARRATIVE))} <content>Reviewed.</content></paragraph>')
+        parts.append('<table><thead><tr><th>Test</th><th>Value</th><th>Unit</th><th>Range</th></tr></thead><tbody>')
+        for _ in range(rows_per_section):
+            name, unit, low, high = rng.choice(ANALYTES)
+            value = round(rng.uniform(low * 0.7, high * 1.3), 1)
+            parts.append(
+                f'<tr><td>{escape(name)}</td><td>{value}</td><td>{escape(unit)}</td><td>{low}-{high}</td></tr>'
+            )
+        parts.append('</tbody></table></text></section></component>')
+    parts.append('</structuredBody></component></ClinicalDocument>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def make_docx(paragraphs, rows_per_table=30, seed=0):
+    """Build a DOCX report alternating narrative paragraphs with Test/Value/Unit/Range tables"""
+    from docx import Document
+
+    rng = random.Random(seed)
+    document = Document()
+    for number in range(paragraphs):
+        document.add_paragraph(rng.choice(NARRATIVE))
+        if number % 5 == 4:
+            table = document.add_table(rows=1, cols=4)
+            for cell, heading in zip(table.rows[0].cells, ("Test", "Value", "Unit", "Range")):
+                cell.text = heading
+            for _ in range(rows_per_table):
+                name, unit, low, high = rng.choice(ANALYTES)
+                value = round(rng.uniform(low * 0.7, high * 1.3), 1)
+                for cell, text in zip(table.add_row().cells, (name, str(value), unit, f"{low}-{high}")):
+                    cell.text = text
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_radiograph(width=3000, height=3600, mode="L", fmt="PNG", seed=0):
+    """Render a synthetic radiograph-like image (soft gradients plus noise) and encode it"""
+    rng = random.Random(seed)
+    gradient = Image.radial_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40 + rng.randint(0, 20))
+    image = Image.blend(gradient, noise, 0.35)
+    if mode == "I;16":
+        image = image.convert("I").point(lambda value: value * 256)
+    elif mode != "L":
+        image = image.convert(mode)
+    out = io.BytesIO()
+    image.save(out, fmt)
+    return out.getvalue()
+
+
+FIRST_NAMES = ["John", "Mary", "Aisha", "Carlos", "Wei", "Priya", "Olga", "James", "Fatima", "Liam"]
+LAST_NAMES = ["Smith", "Garcia", "Okafor", "Nguyen", "Kowalski", "Patel", "Haddad", "Johnson", "Silva", "Brown"]
+STREETS = ["Maple Grove Ave", "Oak Street", "Harbor View Rd", "Elm Ct", "Sunset Blvd"]
+
+
+def phi_header(rng):
+    """Return a demographics block full of identifiers, as found at the top of real reports"""
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return [
+        f"Patient Name: {first} {last}",
+        f"DOB: {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(1930, 2010)}   MRN: {rng.randint(10**7, 10**8 - 1)}",
+        f"Address: {rng.randint(1, 9999)} {rng.choice(STREETS)}, Springfield, IL {rng.randint(60000, 62999)}",
+        f"Phone: ({rng.randint(200, 999)}) 555-{rng.randint(0, 9999):04d}  Email: {first.lower()}.{last.lower()}@example.com",
+    ]
+
+
+def phi_report(lines, seed=0, header_every=40):
+    """Return report text of about `lines` lines with a demographics block every header_every lines"""
+    rng = random.Random(seed)
+    out = []
+    for start in range(0, lines, header_every):
+        out += phi_header(rng)
+        out += report_lines(header_every, seed + start)
+    return '\n'.join(out)
+
+
+def make_txt(lines, seed=0):
+    """Build a plain-text report, identifiers included, as exported from an EHR"""
+    return phi_report(lines, seed).encode('utf-8')
+
+
+# One size unit per kind and the report text it holds: a 40-line page, a paragraph with its share of
+# a 30-row table, 40 lines of text, or a CDA section with a 50-row table
+_DOCUMENT_BUILDERS = {
+    "pdf": (lambda units, seed: make_pdf(units, seed=seed), 1700),
+    "docx": (lambda units, seed: make_docx(units, seed=seed), 320),
+    "txt": (lambda units, seed: make_txt(units * 40, seed=seed), 1900),
+    "xml": (lambda units, seed: make_ccd(units, seed=seed), 1750),
+}
+_IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "tiff": "TIFF"}
+EXTENSIONS = {"pdf": ".pdf", "docx": ".docx", "txt": ".txt", "xml": ".xml", "png": ".png", "jpeg": ".jpg", "tiff": ".tiff"}
+KINDS = tuple(EXTENSIONS)
+
+
+def make_report(kind, size_kb, seed=0):
+    """Build a report of one kind (see KINDS) of roughly size_kb
+
+    Documents are sized by the report text they hold, since a DOCX compresses this repetitive
+    text several-fold; images by their encoded size.
+    """
+    if kind in _DOCUMENT_BUILDERS:
+        build, chars_per_unit = _DOCUMENT_BUILDERS[kind]
+        return build(max(1, round(size_kb * 1024 / chars_per_unit)), seed)
+    if kind in _IMAGE_FORMATS:
+        # Noisy images compress poorly, so encoded size grows with pixel area
+        probe = len(make_radiograph(300, 360, fmt=_IMAGE_FORMATS[kind], seed=seed))
+        scale = math.sqrt(size_kb * 1024 / probe)
+        return make_radiograph(max(16, round(300 * scale)), max(16, round(360 * scale)),
+                               fmt=_IMAGE_FORMATS[kind], seed=seed)
+    raise ValueError(f"Unknown report kind {kind!r}; expected one of {', '.join(KINDS)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic report corpus to a directory")
+    parser.add_argument("directory")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=["pdf", "docx", "txt", "xml"])
+    parser.add_argument("--size-kb", type=int, default=256, help="approximate report text (or image bytes) per file")
+    parser.add_argument("--count", type=int, default=5, help="files per kind")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for kind in args.kinds:
+        for number in range(args.count):
+            path = os.path.join(args.directory, f"report-{number:04d}{EXTENSIONS[kind]}")
+            with open(path, 'wb') as f:
+                f.write(make_report(kind, args.size_kb, seed=number))
+    print(f"wrote {len(args.kinds) * args.count} reports to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""In-process stand-in for an OpenAI-compatible client with configurable latency, tail and failures
+
+Lets the router be exercised without sockets: `FakeClient(latency=0.2, tail=2.0, tail_rate=0.05,
+error_rate=0.1)` answers chat.completions.create like the SDK, streaming or not.
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from benchmarks.mock_llm_server import REPLY_WORDS
+
+
+class FakeError(Exception):
+    """Injected backend failure, shaped like an SDK 5xx error"""
+
+    status_code = 503
+
+
+class FakeClient:
+    """Synchronous fake client; time to first token is latency, or tail with probability tail_rate"""
+
+    def __init__(self, latency=0.1, tail=None, tail_rate=0.0, error_rate=0.0, token_delay=0.0, reply_tokens=20, seed=0):
+        self.latency = latency
+        self.tail = tail
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.reply_tokens = reply_tokens
+        self.base_url = "fake"
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            slow = self.tail is not None and self._random.random() < self.tail_rate
+            failed = self._random.random() < self.error_rate
+        return (self.tail if slow else self.latency), failed
+
+    def _create(self, stream=False, **request):
+        delay, failed = self._draw()
+        words = [REPLY_WORDS[index % len(REPLY_WORDS)] for index in range(self.reply_tokens)]
+        if not stream:
+            time.sleep(delay)
+            if failed:
+                raise FakeError("injected failure")
+            message = SimpleNamespace(role="assistant", content=" ".join(words))
+            return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)], usage=None)
+        return self._stream(delay, failed, words)
+
+    def _stream(self, delay, failed, words):
+        time.sleep(delay)
+        if failed:
+            raise FakeError("injected failure")
+        for index, word in enumerate(words):
+            delta = SimpleNamespace(content=word if index == 0 else " " + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)])
+            time.sleep(self.token_delay)
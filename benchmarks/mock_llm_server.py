@@ -0,0 +1,222 @@
+"""Local OpenAI-compatible chat completions server for load tests and benchmarks
+
+Serves POST .../chat/completions for the OpenAI, Groq (/openai/v1) and Azure
+(/openai/deployments/<name>/chat/completions) URL layouts, streaming or not, with configurable
+latency, injected 429/500 errors, streams dropped halfway through, and an optional concurrency limit
+above which requests get 429s, like a provider enforcing its quota. Run standalone:
+
+    python -m benchmarks.mock_llm_server --port 8765 --latency 0.2 --rate-limit 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = (
+    "The report shows mildly elevated glucose and HbA1c consistent with prediabetes. "
+    "Hemoglobin and platelets are within normal limits. Consider a repeat fasting glucose "
+    "and lifestyle changes, and discuss the results with your doctor."
+).split()
+
+
+class MockSettings:
+    """Behaviour knobs shared by all request handlers; safe to change while the server runs"""
+
+    def __init__(self, latency=0.05, token_delay=0.005, reply_tokens=40, rate_limit=0.0, error_rate=0.0,
+                 retry_after=0.1, max_concurrent=None, seed=0, disconnect_rate=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply_tokens = reply_tokens
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.retry_after = retry_after
+        self.max_concurrent = max_concurrent
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.disconnects = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def roll(self):
+        """Decide the fate of one request: 'ok', 'rate_limited', 'error' or 'disconnect'"""
+        with self.lock:
+            self.requests += 1
+            draw = self.random.random()
+            over_quota = self.max_concurrent is not None and self.in_flight > self.max_concurrent
+            if over_quota or draw < self.rate_limit:
+                self.rate_limited += 1
+                return 'rate_limited'
+            if draw < self.rate_limit + self.error_rate:
+                self.errors += 1
+                return 'error'
+            if draw < self.rate_limit + self.error_rate + self.disconnect_rate:
+                self.disconnects += 1
+                return 'disconnect'
+            return 'ok'
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "errors": self.errors,
+                "disconnects": self.disconnects,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+def _reply_text(settings, messages):
+    prompt_chars = sum(len(json.dumps(message.get("content", ""))) for message in messages)
+    words = [REPLY_WORDS[index % len(REPLY_WORDS)] for index in range(settings.reply_tokens)]
+    return " ".join(words), max(1, prompt_chars // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        settings = self.settings
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.split('?')[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        with settings.lock:
+            settings.in_flight += 1
+            settings.max_in_flight = max(settings.max_in_flight, settings.in_flight)
+        try:
+            fate = settings.roll()
+            time.sleep(settings.latency)
+            if fate == 'rate_limited':
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                    headers=[("Retry-After", str(settings.retry_after))],
+                )
+                return
+            if fate == 'error':
+                self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                return
+
+            text, prompt_tokens = _reply_text(settings, request.get("messages", []))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "mock")
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": settings.reply_tokens,
+                     "total_tokens": prompt_tokens + settings.reply_tokens}
+            if fate == 'disconnect' and not request.get("stream"):
+                # Drop the connection without a response, as a crashed upstream would
+                self.close_connection = True
+                return
+            if request.get("stream"):
+                try:
+                    self._stream(completion_id, model, text, usage, drop=fate == 'disconnect')
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading mid-stream, as a cancelled chat turn does
+                    self.close_connection = True
+            else:
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+        finally:
+            with settings.lock:
+                settings.in_flight -= 1
+
+    def _stream(self, completion_id, model, text, usage, drop=False):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode('utf-8')
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        words = text.split(" ")
+        for index, word in enumerate(words):
+            if drop and index == len(words) // 2:
+                # Cut the stream off mid-reply without the terminating chunk
+                self.close_connection = True
+                return
+            delta = {"content": word if index == 0 else " " + word}
+            if index == 0:
+                delta["role"] = "assistant"
+            send(json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }))
+            time.sleep(self.settings.token_delay)
+        send(json.dumps({
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+        }))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_server(host="127.0.0.1", port=0, **settings):
+    """Start the mock server on a background thread; returns (server, base_url, settings)"""
+    mock_settings = MockSettings(**settings)
+    handler = type("MockHandler", (_Handler,), {"settings": mock_settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1", mock_settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between streamed chunks")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0,
+                        help="fraction of requests whose connection drops (streams halfway through the reply)")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="answer 429 above this many requests in flight")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_server(
+        args.host, args.port, latency=args.latency, token_delay=args.token_delay,
+        reply_tokens=args.reply_tokens, rate_limit=args.rate_limit, error_rate=args.error_rate,
+        max_concurrent=args.max_concurrent, disconnect_rate=args.disconnect_rate,
+    )
+    print(f"Mock LLM server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
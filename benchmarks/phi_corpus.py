@@ -0,0 +1,89 @@
+"""Correctness corpus for redaction: identifiers that must disappear and clinical text that must survive
+
+Run from the repository root: python -m benchmarks.phi_corpus
+"""
+import sys
+
+from redaction import PlaceholderMap, Redactor
+
+# (text, identifiers that must not appear in the output, substrings that must be kept)
+CASES = [
+    ("Patient Name: John A. Smith", ["John A. Smith"], ["Patient Name:"]),
+    ("Name: Garcia, Carlos\nDOB: 03/14/1962", ["Garcia, Carlos", "03/14/1962"], ["DOB:"]),
+    ("Date of Birth: March 4, 1950", ["March 4, 1950"], ["Date of Birth:"]),
+    ("D.O.B. 1962-03-14", ["1962-03-14"], []),
+    ("MRN: 00482913", ["00482913"], ["MRN:"]),
+    ("Medical Record Number # A-0098812", ["A-0098812"], []),
+    ("Patient ID: 55555", ["55555"], ["Patient ID:"]),
+    ("Patient ID: 123, Acct # 7", ["123", "7"], ["Patient ID:", "Acct #"]),
+    ("Member ID: XJQ44810022 Policy No. 7781-22", ["XJQ44810022", "7781-22"], []),
+    ("SSN 123-45-6789", ["123-45-6789"], ["SSN"]),
+    ("Phone (217) 555-0182", ["(217) 555-0182", "555-0182"], []),
+    ("Call 217-555-0199 or +1 312.555.0100", ["217-555-0199", "312.555.0100"], []),
+    ("Contact j.smith@example.com for records", ["j.smith@example.com"], ["for records"]),
+    ("Address: 1423 Maple Grove Ave, Apt 4B", ["1423 Maple Grove Ave", "Apt 4B"], ["Address:"]),
+    ("Springfield, IL 62704", ["Springfield", "62704"], []),
+    ("Emergency Contact: Mary Smith", ["Mary Smith"], []),
+    ("Next of Kin: Olga Kowalski (sister)", ["Olga Kowalski"], ["(sister)"]),
+    # Several fields on one header line: a name must stop at the next field's label
+    ("Name: John Smith DOB: 01/02/1980", ["John Smith", "01/02/1980"], ["Name:", "DOB:"]),
+    ("Patient: John Smith MRN: 12345678", ["John Smith", "12345678"], ["Patient:", "MRN:"]),
+    ("Patient Name: John Smith Date of Birth: March 4, 1950", ["John Smith", "March 4, 1950"],
+     ["Patient Name:", "Date of Birth:"]),
+    ("Pt Name: Ana Ruiz Acct. 88120034 D.O.B. 1971-07-09", ["Ana Ruiz", "88120034", "1971-07-09"], ["Acct."]),
+    ("Name: John Smith Age: 45 Sex: M", ["John Smith"], ["Name:", "Age: 45 Sex: M"]),
+    ("Patient: Jane Doe, Age 45", ["Jane Doe"], ["Age 45"]),
+    ("Patient: John Smith Gender Male", ["John Smith"], ["Gender Male"]),
+    ("Name: Wei Chen Attending Physician: Dr. Patel Ward 4B", ["Wei Chen"], ["Attending Physician:", "Ward 4B"]),
+    # Clinical content that must survive untouched
+    ("Hemoglobin 13.2 g/dL (13.5-17.5)", [], ["Hemoglobin 13.2 g/dL (13.5-17.5)"]),
+    ("Platelets 250 10^3/uL (150-400)", [], ["Platelets 250 10^3/uL (150-400)"]),
+    ("HbA1c 6.1 % (4.0-5.6) collected 2024-01-05", [], ["HbA1c 6.1 % (4.0-5.6)", "2024-01-05"]),
+    ("Patient presented with chest pain.", [], ["Patient presented with chest pain."]),
+    ("Patient: stable overnight.", [], ["stable overnight."]),
+    ("Lisinopril 10 mg daily, follow up in 2 weeks", [], ["Lisinopril 10 mg daily"]),
+    ("ICD-10 E11.9; CPT 83036", [], ["E11.9", "83036"]),
+    ("BP 128/82 mmHg, HR 72", [], ["128/82", "HR 72"]),
+]
+
+# Cases that need the optional dictionary of known names
+NAME_CASES = [
+    ("Seen with her husband Wei Nguyen today.", ["Wei Nguyen"], ["Seen with her husband", "today."]),
+    ("Dr. Patel reviewed the results with Fatima.", ["Fatima"], ["reviewed the results"]),
+]
+NAMES = ["Wei Nguyen", "Fatima", "Priya"]
+
+
+def check(redactor, cases):
+    """Return a list of failure messages for the cases; empty when everything passes"""
+    failures = []
+    for text, removed, kept in cases:
+        placeholders = PlaceholderMap()
+        output = redactor.redact(text, placeholders)
+        for value in removed:
+            if value in output:
+                failures.append(f"leaked {value!r}: {output!r}")
+        for value in kept:
+            if value not in output:
+                failures.append(f"dropped {value!r}: {output!r}")
+        if placeholders.restore(output) != ' '.join(text.split()):
+            failures.append(f"restore mismatch: {placeholders.restore(output)!r}")
+        # Repeat the case so matches straddle chunk boundaries beyond the streaming look-back
+        repeated = (text + "\n") * 40
+        streamed = ''.join(redactor.iter_redact([repeated[i:i + 7] for i in range(0, len(repeated), 7)]))
+        if streamed != redactor.redact(repeated):
+            failures.append(f"streamed output differs: {streamed!r}")
+    return failures
+
+
+def main():
+    failures = check(Redactor(), CASES) + check(Redactor(names=NAMES), NAME_CASES)
+    for failure in failures:
+        print(failure)
+    total = len(CASES) + len(NAME_CASES)
+    print(f"{total} cases, {len(failures)} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
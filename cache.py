@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(data, *salt):
+    """Return a hex SHA-256 digest of the given bytes, salted with extra key parts"""
+    digest = hashlib.sha256()
+    for part in salt:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _size_of(value):
+    """Approximate the memory footprint of a cached value in bytes"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return len(value)
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache bounded by the total size of its values in bytes
+
+    With ttl (seconds), entries older than that are treated as misses and dropped on access.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.time():
+                del self._items[key]
+                self.current_bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            expires = time.time() + self.ttl if self.ttl else None
+            self._items[key] = (value, size, expires)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._items),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class SQLiteStore:
+    """On-disk cache tier that survives restarts, evicting least recently used rows by total size
+
+    With ttl (seconds), rows older than that are treated as misses and pruned.
+    """
+
+    def __init__(self, path, max_bytes, ttl=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL, expires REAL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if "expires" not in columns:
+            # Stores created before TTL support
+            self._conn.execute("ALTER TABLE entries ADD COLUMN expires REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now + self.ttl if self.ttl else None),
+            )
+            self._conn.execute("DELETE FROM entries WHERE expires < ?", (now,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # Walk rows oldest-first and drop them until the store fits again
+                excess = total - self.max_bytes
+                doomed = []
+                for row_key, row_size in self._conn.execute(
+                    "SELECT key, size FROM entries WHERE key != ? ORDER BY accessed", (key,)
+                ):
+                    doomed.append((row_key,))
+                    excess -= row_size
+                    if excess <= 0:
+                        break
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+                self.evictions += len(doomed)
+            self._conn.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+        }
+
+
+class ExtractionCache:
+    """Two-tier cache of extracted report text keyed by upload content and parser version"""
+
+    def __init__(self, version, max_bytes=64 * 1024 * 1024, path=None, disk_max_bytes=512 * 1024 * 1024):
+        self.version = version
+        self.memory = LRUCache(max_bytes)
+        self.disk = SQLiteStore(path, disk_max_bytes) if path else None
+
+    def key(self, data):
+        """Build the cache key for raw upload bytes"""
+        return content_hash(data, "extract", self.version)
+
+    def get(self, key):
+        text = self.memory.get(key)
+        if text is None and self.disk is not None:
+            text = self.disk.get(key)
+            if text is not None:
+                self.memory.put(key, text)
+        return text
+
+    def put(self, key, text):
+        self.memory.put(key, text)
+        if self.disk is not None:
+            self.disk.put(key, text)
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class ResponseCache:
+    """Two-tier cache of model replies keyed by the full request, with a TTL and size-based eviction"""
+
+    def __init__(self, ttl=24 * 3600, max_bytes=32 * 1024 * 1024, path=None, disk_max_bytes=256 * 1024 * 1024):
+        self.memory = LRUCache(max_bytes, ttl=ttl)
+        self.disk = SQLiteStore(path, disk_max_bytes, ttl=ttl) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._lock = threading.Lock()
+
+    def key(self, endpoint, request):
+        """Hash the endpoint plus everything that shapes the reply: model, messages and sampling params"""
+        canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+        return content_hash(canonical.encode('utf-8'), "response", endpoint)
+
+    def get(self, key):
+        text = self.memory.get(key)
+        if text is None and self.disk is not None:
+            text = self.disk.get(key)
+            if text is not None:
+                self.memory.put(key, text)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def put(self, key, text):
+        self.memory.put(key, text)
+        if self.disk is not None:
+            self.disk.put(key, text)
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory": self.memory.stats(),
+        }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
@@ -0,0 +1,57 @@
+import re
+
+# Rough characters-per-token ratio for English clinical text with GPT/Llama-style tokenizers
+CHARS_PER_TOKEN = 4
+
+# Rough token charge for an image part; its real cost depends on size and detail level
+IMAGE_TOKENS = 1000
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+|\n+')
+
+
+def estimate_tokens(text):
+    """Estimate the token count of a string without loading a tokenizer"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(messages):
+    """Estimate the prompt tokens of chat messages, text parts by length and image parts at IMAGE_TOKENS"""
+    tokens = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                tokens += estimate_tokens(part["text"])
+            else:
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+def chunk_text(text, max_tokens=200):
+    """Split text into chunks of whole sentences, each at most max_tokens long"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        pieces = [sentence]
+        if estimate_tokens(sentence) > max_tokens:
+            # Run-on text (tables, flattened lists) has no sentence breaks, so fall back to word windows
+            words = sentence.split()
+            step = max(1, max_tokens * CHARS_PER_TOKEN // 6)
+            pieces = [' '.join(words[start:start + step]) for start in range(0, len(words), step)]
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
@@ -0,0 +1,380 @@
+import io
+import multiprocessing
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from redaction import default_redactor
+
+# Bump whenever the extractors change their output so stale cache entries are ignored
+PARSER_VERSION = "6"
+
+SUPPORTED_KINDS = ('pdf', 'docx', 'txt', 'xml', 'png', 'jpeg', 'tiff')
+
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+)
+
+# An XML document opens with a declaration, comment, doctype or start tag; plain text such as
+# "<5 mg daily" only starts with '<'
+_XML_START = re.compile(rb'<(?:\?xml|!--|!DOCTYPE|[A-Za-z_][\w.:-]*[\s/>])')
+
+# Parser used for XML uploads: 'etree' (stdlib) or 'lxml'
+XML_PARSER = 'etree'
+
+# Memo of namespaced tag -> local name; documents reuse a small vocabulary of tags
+_LOCAL_NAMES = {}
+
+# Inline CDA narrative elements that start a new line when flattened
+NARRATIVE_BLOCKS = {'paragraph', 'item', 'list', 'table', 'thead', 'tbody', 'tfoot', 'caption', 'br', 'renderMultiMedia'}
+
+# WordprocessingML tags read by docx_to_text
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_W_PARAGRAPH, _W_TABLE, _W_ROW, _W_CELL = _W + 'p', _W + 'tbl', _W + 'tr', _W + 'tc'
+_W_GRID_BEFORE, _W_VMERGE, _W_GRID_SPAN, _W_VAL = _W + 'gridBefore', _W + 'vMerge', _W + 'gridSpan', _W + 'val'
+_W_RUN_TEXT = frozenset(_W + name for name in ('br', 'cr', 'noBreakHyphen', 'ptab', 't', 'tab'))
+_DOCX_TAGS = (_W_PARAGRAPH, _W_TABLE, _W_ROW, _W_CELL, _W_GRID_BEFORE, _W_VMERGE, _W_GRID_SPAN, *_W_RUN_TEXT)
+
+# Pages handed to each pool task; smaller batches stream sooner, larger ones amortize re-parsing
+PDF_BATCH_PAGES = 8
+
+# Process pools for PDF pages by worker count, shared by every upload in the process
+_pdf_pools = {}
+_pdf_pools_lock = threading.Lock()
+
+
+def detect_kind(data):
+    """Detect the report format from its leading magic bytes"""
+    head = bytes(data[:1024])
+    if b'%PDF-' in head:
+        return 'pdf'
+    for signature, kind in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                if 'word/document.xml' in archive.namelist():
+                    return 'docx'
+        except zipfile.BadZipFile:
+            pass
+        raise ValueError("Unsupported file format. Use PDF, DOCX, TXT, XML, or a scanned image")
+    stripped = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if _XML_START.match(stripped):
+        return 'xml'
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sniffed window is still text
+        if e.start < len(head) - 3:
+            raise ValueError("Unsupported file format. Use PDF, DOCX, TXT, XML, or a scanned image")
+    return 'txt'
+
+
+def _extract_page_range(data, start, stop):
+    """Extract the text of pages [start, stop) in a pool worker"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [reader.pages[number].extract_text() for number in range(start, stop)]
+
+
+def pdf_pool(workers):
+    """Return the process-wide pool of `workers` PDF page extractors, starting it on first use
+
+    Workers come from a forkserver (or spawn where there is none) rather than fork: the app
+    process runs gateway, OCR and metrics threads, and forking a multi-threaded process can leave
+    a child holding a lock that no thread will release.
+    """
+    with _pdf_pools_lock:
+        pool = _pdf_pools.get(workers)
+        if pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            pool = _pdf_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(method)
+            )
+        return pool
+
+
+def iter_pdf_pages(data, workers=None):
+    """Yield the text of each PDF page in order, fanning batches of pages out to a process pool"""
+    # Format parsers are imported on first use, so a process only loads the ones its uploads need
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    if not workers or workers <= 1 or page_count <= PDF_BATCH_PAGES:
+        for page in reader.pages:
+            yield page.extract_text()
+        return
+
+    # Workers re-open the document themselves, so ship plain bytes rather than the parsed reader
+    data = bytes(data)
+    pool = pdf_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, data, start, min(start + PDF_BATCH_PAGES, page_count))
+        for start in range(0, page_count, PDF_BATCH_PAGES)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        # The pool is shared, so only this document's queued batches are dropped
+        for future in futures:
+            future.cancel()
+
+
+def iter_bytes(data, kind=None, workers=None, ocr=None):
+    """Yield report text incrementally: page by page for PDFs, in one piece for other formats
+
+    Pass an ocr.OCREngine to recover text from scanned PDF pages and image reports.
+    """
+    detected = kind is None
+    if detected:
+        kind = detect_kind(data)
+
+    if kind == 'pdf':
+        pages = iter_pdf_pages(data, workers)
+        yield from (ocr.fill_pdf_pages(data, pages) if ocr is not None else pages)
+
+    elif kind in ('png', 'jpeg', 'tiff'):
+        if ocr is None:
+            raise ValueError("Image reports need OCR. Upload a PDF, DOCX, TXT, or XML report instead")
+        yield ocr.ocr_image(data)
+
+    elif kind == 'docx':
+        from docx import Document
+        yield docx_to_text(Document(io.BytesIO(data)))
+
+    elif kind == 'txt':
+        yield str(data, 'utf-8')
+
+    elif kind == 'xml':
+        try:
+            yield xml_to_text(data, XML_PARSER)
+        except SyntaxError as e:
+            # ET.ParseError and lxml's XMLSyntaxError both derive from SyntaxError. A sniffed
+            # upload that only looked like XML, such as text opening with a tag, is read as text
+            if detected:
+                try:
+                    text = str(data, 'utf-8')
+                except UnicodeDecodeError:
+                    text = None
+                if text is not None:
+                    yield text
+                    return
+            raise ValueError(f"Invalid XML file: {str(e)}")
+
+    else:
+        raise ValueError("Unsupported file format. Use PDF, DOCX, TXT, XML, or a scanned image")
+
+
+def docx_to_text(doc):
+    """Flatten paragraphs and tables in document order, one ' | '-separated line per table row
+
+    The body is read in one lxml iterwalk rather than through python-docx's Paragraph, Row and
+    Cell objects, which run several XPath queries per run and per cell and made table-heavy
+    reports parse several times slower. Cells are joined as row.cells would give them: a cell
+    merged across columns counts once and a vertically merged cell repeats the text above it.
+    Text of a table nested in a cell is kept as part of that cell.
+    """
+    from lxml import etree
+
+    lines = []
+    parts = []
+    depth = 0  # tables open around the current element
+    above = {}  # grid column -> text of the last cell there, for vertical merges
+    cells, column, merge, span = [], 0, None, None
+    for event, element in etree.iterwalk(doc.element.body, events=('start', 'end'), tag=_DOCX_TAGS):
+        tag = element.tag
+        if tag in _W_RUN_TEXT:
+            if event == 'start':
+                # The oxml element classes render w:t, w:tab, w:br and the rest as their text
+                parts.append(str(element))
+        elif tag == _W_PARAGRAPH:
+            if depth:
+                parts.append(' ')
+            elif event == 'start':
+                parts = []
+            else:
+                lines.append(''.join(parts))
+        elif tag == _W_TABLE:
+            depth += 1 if event == 'start' else -1
+            if event == 'start' and depth == 1:
+                above = {}
+        elif depth != 1:
+            continue
+        elif tag == _W_CELL:
+            if event == 'start':
+                merge = span = None
+                parts = []
+                continue
+            text = above.get(column, '') if merge == 'continue' else ' '.join(''.join(parts).split())
+            above[column] = text
+            column += span or 1
+            # A merged cell counts once, as python-docx repeats it per grid column it spans
+            if not cells or text != cells[-1]:
+                cells.append(text)
+        elif event == 'end':
+            if tag == _W_ROW and any(cells):
+                lines.append(' | '.join(cells))
+        elif tag == _W_ROW:
+            cells = []
+            column = 0
+        elif tag == _W_GRID_BEFORE:
+            column = int(element.get(_W_VAL, 0))
+        elif tag == _W_VMERGE and merge is None:
+            merge = element.get(_W_VAL, 'continue')
+        elif tag == _W_GRID_SPAN and span is None:
+            span = int(element.get(_W_VAL, 1))
+    return '\n'.join(lines)
+
+
+def read_bytes(data, kind=None, workers=None, ocr=None):
+    """Read a medical report from an in-memory buffer such as uploaded_file.getbuffer()"""
+    return ''.join(iter_bytes(data, kind, workers, ocr))
+
+
+def read_file(file_path, ocr=None):
+    """Read medical report from different file formats"""
+    with open(file_path, 'rb') as file:
+        return read_bytes(file.read(), ocr=ocr)
+
+
+def _local_name(tag):
+    """Strip the namespace from an element tag; comments and processing instructions have none"""
+    if not isinstance(tag, str):
+        return None
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = _LOCAL_NAMES[tag] = tag.rsplit('}', 1)[-1]
+    return name
+
+
+def _iterparse(source, parser):
+    """Start an event stream over the document with the requested XML parser"""
+    if parser == 'lxml':
+        from lxml import etree
+        return etree.iterparse(source, events=('start', 'end'), resolve_entities=False, huge_tree=True)
+    import xml.etree.ElementTree as ET
+    return ET.iterparse(source, events=('start', 'end'))
+
+
+def _narrative_lines(element):
+    """Flatten CDA narrative markup (paragraphs, lists, tables) into readable lines"""
+    lines = []
+    words = []
+
+    def flush():
+        line = ' '.join(' '.join(words).split())
+        if line:
+            lines.append(line)
+        words.clear()
+
+    def walk(node):
+        name = _local_name(node.tag)
+        if name == 'tr':
+            flush()
+            cells = []
+            for cell in node:
+                if _local_name(cell.tag) in ('td', 'th'):
+                    # Most cells are plain text, so skip the itertext walk unless there is markup inside
+                    text = ''.join(cell.itertext()) if len(cell) else cell.text or ''
+                    cells.append(' '.join(text.split()))
+            if any(cells):
+                lines.append(' | '.join(cells))
+        elif name is not None:
+            block = name in NARRATIVE_BLOCKS
+            if block:
+                flush()
+            if node.text:
+                words.append(node.text)
+            for child in node:
+                walk(child)
+            if block:
+                flush()
+        if node.tail:
+            words.append(node.tail)
+
+    if element.text:
+        words.append(element.text)
+    for child in element:
+        walk(child)
+    flush()
+    return lines
+
+
+def iter_xml_text(source, parser='etree'):
+    """Yield readable text blocks from an XML report in one streaming pass
+
+    CDA documents yield each section title and its narrative text; any other XML yields the text of
+    every element in document order. Processed elements are cleared as the parse advances, so memory
+    stays flat regardless of document size. `parser` is 'etree' (stdlib) or 'lxml'.
+    """
+    if not hasattr(source, 'read'):
+        source = io.BytesIO(source)
+
+    # Each stack entry is [local name, element, whether its leading text has been emitted]
+    stack = []
+    is_cda = False
+    # Depth inside a section title or narrative block; its subtree is rendered whole when it closes
+    capture = 0
+    for event, element in _iterparse(source, parser):
+        if capture:
+            if event == 'start':
+                capture += 1
+                continue
+            capture -= 1
+            if capture:
+                continue
+            if _local_name(element.tag) == 'title':
+                title = ' '.join(''.join(element.itertext()).split())
+                if title:
+                    yield title
+            else:
+                lines = _narrative_lines(element)
+                if lines:
+                    yield '\n'.join(lines)
+
+        elif event == 'start':
+            name = _local_name(element.tag)
+            if not stack:
+                is_cda = name == 'ClinicalDocument'
+            elif is_cda:
+                if name in ('title', 'text') and stack[-1][0] == 'section':
+                    capture = 1
+                    continue
+            else:
+                # A parent's leading text is complete once its first child starts
+                parent = stack[-1]
+                if len(stack) > 1 and not parent[2]:
+                    parent[2] = True
+                    if parent[1].text and parent[1].text.strip():
+                        yield parent[1].text.strip()
+            stack.append([name, element, False])
+            continue
+
+        else:
+            _, _, emitted = stack.pop()
+            if not is_cda and stack and not emitted and element.text and element.text.strip():
+                yield element.text.strip()
+
+        # The element is finished, so detach it to keep the tree no larger than the current path
+        element.clear()
+        if stack:
+            del stack[-1][1][:]
+
+
+def xml_to_text(source, parser='etree'):
+    """Convert an XML report to readable text"""
+    return '\n'.join(iter_xml_text(source, parser))
+
+
+def preprocess_text(text, placeholders=None, redactor=None):
+    """Clean medical report text: collapse whitespace and redact identifiers in one pass
+
+    Pass a redaction.PlaceholderMap to get numbered placeholders that can be restored for display.
+    """
+    return (redactor or default_redactor()).redact(text, placeholders)
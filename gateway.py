@@ -0,0 +1,290 @@
+"""Process-wide gateway that schedules model requests from every session onto one async client
+
+Streamlit runs each session's script on its own thread. Instead of every session calling the
+provider directly, requests are queued per session and a dispatcher on a background event loop
+starts them round-robin across sessions, so one user's burst cannot starve the others. At most
+max_concurrency requests are in flight over a pooled HTTP client, an optional tokens-per-minute
+budget paces dispatch below the provider's quota, and 429s/5xx are retried with backoff.
+
+Callers keep using the llm helpers: `gateway.client_for(session_id)` returns an object with the same
+`chat.completions.create(...)` surface as the synchronous SDK clients.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+
+import metrics
+from chunking import estimate_message_tokens
+from llm import is_retryable, retry_delay
+
+_DONE = object()
+
+
+class GatewayBusy(RuntimeError):
+    """Raised when the gateway queue is full; the caller should ask the user to retry shortly"""
+
+
+def pooled_http_client(max_connections, timeout=120.0):
+    """Return an async HTTP client that keeps up to max_connections connections to the provider alive"""
+    import httpx
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(timeout, connect=10.0),
+    )
+
+
+def request_tokens(request):
+    """Estimate the tokens a request will consume: prompt text, image parts and the completion limit"""
+    tokens = estimate_message_tokens(request.get("messages", []))
+    return tokens + int(request.get("max_tokens") or request.get("max_completion_tokens") or 0)
+
+
+class TokenBudget:
+    """Token bucket refilled continuously at tokens_per_minute; only used from the gateway loop"""
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.available = float(tokens_per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens):
+        """Wait until the bucket holds tokens (capped at its capacity), then spend them"""
+        tokens = min(tokens, self.capacity)
+        self._refill()
+        while self.available < tokens:
+            await asyncio.sleep((tokens - self.available) / self.rate)
+            self._refill()
+        self.available -= tokens
+
+    def settle(self, estimated, actual):
+        """Correct an earlier charge once the provider reports actual usage"""
+        self._refill()
+        self.available = min(self.capacity, self.available + estimated - actual)
+
+    def drain(self):
+        """The provider rate-limited us anyway; stop dispatching until the bucket refills"""
+        self._refill()
+        self.available = min(self.available, 0.0)
+
+
+class _Job:
+    """One queued request; results flow back to the calling thread through a queue"""
+
+    def __init__(self, session, request):
+        self.session = session
+        self.request = request
+        self.tokens = request_tokens(request)
+        self.enqueued = time.perf_counter()
+        self.cancelled = False
+        self.results = queue.Queue()
+
+    def __iter__(self):
+        """Yield stream chunks (or the single completion) as they arrive, raising the request's error"""
+        try:
+            while True:
+                item = self.results.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # The caller stopped reading (finished, failed or navigated away); stop the request too
+            self.cancelled = True
+
+
+class Gateway:
+    """Fair, rate-budgeted request scheduler shared by all sessions in the process
+
+    `client` is an async OpenAI-compatible client (AsyncAzureOpenAI, AsyncOpenAI, AsyncGroq) created
+    with max_retries=0, since retries happen here where they can release their slot while waiting.
+    """
+
+    def __init__(self, client, max_concurrency=8, tokens_per_minute=None, max_queued=256, max_retries=4,
+                 name="default"):
+        self.client = client
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.max_retries = max_retries
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._budget = TokenBudget(tokens_per_minute) if tokens_per_minute else None
+        self._waits = deque(maxlen=500)
+        # Session id -> deque of its queued jobs, ordered by whose turn is next
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._tasks = set()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self):
+        self._ready = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def client_for(self, session):
+        """Return a synchronous client stand-in whose requests are queued under the given session id"""
+        return SessionClient(self, session)
+
+    def submit(self, session, request):
+        """Queue a chat.completions request for a session and return its job; safe from any thread"""
+        job = _Job(session, request)
+        with self._lock:
+            if self.queued >= self.max_queued:
+                raise GatewayBusy("The model is handling too many requests right now, please try again shortly")
+            self._pending.setdefault(session, deque()).append(job)
+            self.queued += 1
+        self._loop.call_soon_threadsafe(self._ready.set)
+        return job
+
+    def _next_job(self):
+        """Pop the next job round-robin across sessions, skipping ones whose caller gave up"""
+        with self._lock:
+            while self._pending:
+                session, jobs = next(iter(self._pending.items()))
+                job = jobs.popleft()
+                if jobs:
+                    self._pending.move_to_end(session)
+                else:
+                    del self._pending[session]
+                self.queued -= 1
+                if not job.cancelled:
+                    return job
+            return None
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            job = self._next_job()
+            while job is None:
+                self._ready.clear()
+                # Check again after clearing so a submit between the two cannot be missed
+                job = self._next_job()
+                if job is None:
+                    await self._ready.wait()
+                    job = self._next_job()
+            if self._budget is not None:
+                await self._budget.acquire(job.tokens)
+            task = asyncio.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job):
+        """Run one job in an acquired slot, retrying failures that happen before any output was delivered"""
+        wait = time.perf_counter() - job.enqueued
+        with self._lock:
+            self.in_flight += 1
+            self._waits.append(wait)
+        metrics.observe("queue_wait", wait, backend=self.name)
+        try:
+            for attempt in range(self.max_retries + 1):
+                delivered = False
+                try:
+                    if job.request.get("stream"):
+                        stream = await self.client.chat.completions.create(**job.request)
+                        try:
+                            async for chunk in stream:
+                                if job.cancelled:
+                                    break
+                                delivered = True
+                                job.results.put(chunk)
+                        finally:
+                            await stream.close()
+                    else:
+                        completion = await self.client.chat.completions.create(**job.request)
+                        if self._budget is not None and completion.usage is not None:
+                            self._budget.settle(job.tokens, completion.usage.total_tokens)
+                        job.results.put(completion)
+                    break
+                except Exception as e:
+                    if delivered or attempt == self.max_retries or not is_retryable(e):
+                        raise
+                    metrics.count("gateway_retries", backend=self.name, status=str(getattr(e, "status_code", "connection")))
+                    if getattr(e, "status_code", None) == 429:
+                        self.rate_limited += 1
+                        if self._budget is not None:
+                            self._budget.drain()
+                    self.retries += 1
+                    # Give the slot back while backing off so other sessions keep moving
+                    self._slots.release()
+                    try:
+                        await asyncio.sleep(retry_delay(e, attempt))
+                    finally:
+                        await self._slots.acquire()
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            job.results.put(e)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+            job.results.put(_DONE)
+
+    def queued_for(self, session):
+        """Number of requests a session has waiting in the queue"""
+        with self._lock:
+            return len(self._pending.get(session, ()))
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "sessions_waiting": len(self._pending),
+                "completed": self.completed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            }
+        if self._budget is not None:
+            stats["tokens_available"] = int(self._budget.available)
+        return stats
+
+    def close(self):
+        """Stop the dispatcher and close the HTTP connections"""
+        async def shutdown():
+            self._dispatcher.cancel()
+            await self.client.close()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class SessionClient:
+    """Synchronous stand-in for an SDK client that sends requests through a Gateway for one session"""
+
+    def __init__(self, gateway, session):
+        self.gateway = gateway
+        self.session = session
+        # llm's response cache keys on base_url, so replies stay keyed by the real endpoint
+        self.base_url = getattr(gateway.client, "base_url", "")
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream=False, **request):
+        job = self.gateway.submit(self.session, dict(request, stream=stream))
+        if stream:
+            return iter(job)
+        results = iter(job)
+        try:
+            return next(results)
+        finally:
+            results.close()
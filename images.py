@@ -0,0 +1,94 @@
+import base64
+import io
+
+from cache import content_hash
+
+# Bump whenever preparation changes its output so stale cache entries are ignored
+IMAGE_PREP_VERSION = "1"
+
+# Vision models tile "high" detail images after fitting them in 2048x2048 and scaling the short side to
+# 768px, and downscale "low" detail images to 512x512; anything larger is only extra upload
+TILE_LIMITS = {
+    "high": (2048, 768),
+    "auto": (2048, 768),
+    "low": (512, 512),
+}
+
+
+def _normalize_mode(image):
+    """Convert any PIL mode to one JPEG can store, flattening transparency onto white"""
+    from PIL import Image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode in ("I", "F") or image.mode.startswith("I;"):
+        # 16-bit and float radiographs: stretch to 8 bits instead of clipping everything above 255
+        image = image.convert("I")
+        low, high = image.getextrema()
+        scale = 255.0 / max(1, high - low)
+        return image.point(lambda value: value * scale - low * scale).convert("L")
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def _target_size(size, detail):
+    """Return the largest size the provider will actually use for an image at the given detail level"""
+    max_side, short_side = TILE_LIMITS.get(detail, TILE_LIMITS["high"])
+    width, height = size
+    scale = min(1.0, max_side / max(width, height))
+    scale *= min(1.0, short_side / max(1.0, min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(data, detail="high", quality=85, cache=None):
+    """Decode, normalize, resize and JPEG-encode an uploaded image once, returning a reusable payload
+
+    The payload is a dict with the base64 data URL plus its hash, size and detail level. With a cache
+    (anything with get/put), repeat uploads of the same bytes skip decoding and encoding entirely.
+    """
+    key = content_hash(data, "image", IMAGE_PREP_VERSION, detail, quality)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return _payload(key, cached, detail)
+
+    # Imported here so a cache hit never loads Pillow
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        # For JPEGs, let the decoder skip detail that is about to be thrown away anyway
+        image.draft(image.mode, _target_size(image.size, detail))
+        image = _normalize_mode(ImageOps.exif_transpose(image))
+        target = _target_size(image.size, detail)
+        if image.size != target:
+            image = image.resize(target, Image.LANCZOS, reducing_gap=3.0)
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG", quality=quality, optimize=True)
+
+    data_url = "data:image/jpeg;base64," + base64.b64encode(buffered.getvalue()).decode('ascii')
+    if cache is not None:
+        cache.put(key, data_url)
+    return _payload(key, data_url, detail)
+
+
+def _payload(key, data_url, detail):
+    return {"hash": key, "data_url": data_url, "detail": detail, "bytes": len(data_url)}
+
+
+def image_message_part(payload):
+    """Build the chat content part that attaches a prepared image"""
+    return {"type": "image_url", "image_url": {"url": payload["data_url"], "detail": payload["detail"]}}
+
+
+def thumbnail(data_url, max_side=320, quality=80):
+    """Return a small JPEG of a prepared image for on-screen previews, decoded at reduced scale"""
+    from PIL import Image
+    data = base64.b64decode(data_url.split(',', 1)[1])
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft(image.mode, (max_side, max_side))
+        image.thumbnail((max_side, max_side))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
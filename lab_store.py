@@ -0,0 +1,328 @@
+"""Per-patient columnar store of lab observations, for trends across many reports
+
+Each patient has a directory of append-only column files, one fixed-width NumPy array per file:
+analyte id, collection day, value, and the low/high reference bounds. Queries memory-map the
+columns and gather them once into (analyte, day) order. An analyte's observations then form one
+contiguous slice located through an offsets array, and a date window inside it is a binary
+search. Trend, delta and range statistics are array reductions over that slice.
+
+A series is one analyte in one unit: glucose in mg/dL and glucose in mmol/L are kept apart, since
+a delta or trend across the two would be meaningless.
+
+Directory names are a hash of the patient identifier, so no identifier reaches the filesystem;
+analyte names and units are kept in a small TSV beside the columns.
+"""
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+COLUMNS = (
+    ("analyte", np.int32),
+    ("day", np.int64),
+    ("value", np.float64),
+    ("low", np.float64),
+    ("high", np.float64),
+)
+
+# Different labs name the same test differently; all spellings share one series
+ALIASES = {
+    "hemoglobin a1c": "hba1c",
+    "a1c": "hba1c",
+    "glycated hemoglobin": "hba1c",
+    "glycohemoglobin": "hba1c",
+    "hgb": "hemoglobin",
+    "platelet count": "platelets",
+    "plt": "platelets",
+    "white blood cells": "wbc",
+    "white blood cell count": "wbc",
+    "blood glucose": "glucose",
+    "fasting glucose": "glucose",
+    "glucose (fasting)": "glucose",
+    "ldl cholesterol": "ldl",
+    "ldl-c": "ldl",
+    "hdl cholesterol": "hdl",
+    "hdl-c": "hdl",
+    "thyroid stimulating hormone": "tsh",
+    "alanine aminotransferase": "alt",
+}
+
+_WINDOW = re.compile(r"(?:last|past|previous|over)\s+(?:the\s+)?(\d+|a|one|two|three|five|ten)\s+(year|month|week)s?", re.I)
+_WINDOW_NUMBERS = {"a": 1, "one": 1, "two": 2, "three": 3, "five": 5, "ten": 10}
+_WINDOW_DAYS = {"year": 365, "month": 30, "week": 7}
+_HISTORY_WORDS = re.compile(r"\b(?:trend|trends|history|changed|change|over time|progress|improv\w*|wors\w*)\b", re.I)
+
+
+def analyte_key(name):
+    """Canonical series key for an analyte name"""
+    key = ' '.join(name.lower().split())
+    return ALIASES.get(key, key)
+
+
+def unit_key(unit):
+    """Canonical spelling of a unit, so "mg/dL", "mg/dl" and "µmol/L"/"umol/L" share a series"""
+    return ' '.join(unit.replace('µ', 'u').replace('μ', 'u').lower().split())
+
+
+def patient_path(root, patient_id):
+    """Directory for one patient's store under root, named by a hash of the identifier"""
+    digest = hashlib.sha256(' '.join(patient_id.lower().split()).encode('utf-8')).hexdigest()
+    return os.path.join(root, digest[:32])
+
+
+def _format_number(number):
+    return f"{number:.3g}" if abs(number) < 1000 else f"{number:.0f}"
+
+
+class LabStore:
+    """Append-only columnar lab history for one patient; safe to share across sessions"""
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.names = []
+        self.units = []
+        self.reports = set()
+        self._ids = {}  # (analyte key, unit key) -> series id
+        self._by_key = {}  # analyte key -> series ids in the order they were first stored
+        self._lock = threading.Lock()
+        self._index = None
+        self._mentions = None
+        self._load_metadata()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load_metadata(self):
+        if os.path.exists(self._file("analytes.tsv")):
+            with open(self._file("analytes.tsv"), encoding='utf-8') as f:
+                for line in f:
+                    key, name, unit = line.rstrip('\n').split('\t')
+                    self._register(key, name, unit)
+        if os.path.exists(self._file("reports.txt")):
+            with open(self._file("reports.txt"), encoding='utf-8') as f:
+                self.reports = {line.strip() for line in f if line.strip()}
+
+    def _register(self, key, name, unit):
+        analyte = self._ids[(key, unit_key(unit))] = len(self.names)
+        self._by_key.setdefault(key, []).append(analyte)
+        self.names.append(name)
+        self.units.append(unit)
+        return analyte
+
+    def _analyte_id(self, name, unit, new_lines):
+        key = analyte_key(name)
+        analyte = self._ids.get((key, unit_key(unit)))
+        if analyte is None:
+            analyte = self._register(key, name, unit)
+            new_lines.append(f"{key}\t{name}\t{unit}\n")
+        return analyte
+
+    def _series_id(self, analyte, unit=None):
+        """Series id for an analyte name in a unit (by default its first stored unit), or None"""
+        key = analyte_key(analyte)
+        if unit is not None:
+            return self._ids.get((key, unit_key(unit)))
+        ids = self._by_key.get(key)
+        return ids[0] if ids else None
+
+    def __len__(self):
+        """Number of stored observations"""
+        return len(self._view()[0]["value"])
+
+    def add_report(self, report_id, labs, day):
+        """Append a report's labs.LabTable as observations on `day`; returns rows added
+
+        report_id is any stable digest of the report, so adding the same report twice adds nothing.
+        """
+        with self._lock:
+            if report_id in self.reports:
+                return 0
+            new_lines = []
+            analytes = np.fromiter(
+                (self._analyte_id(name, unit, new_lines) for name, unit in zip(labs.analytes, labs.units)),
+                dtype=np.int32, count=len(labs),
+            )
+            if new_lines:
+                with open(self._file("analytes.tsv"), 'a', encoding='utf-8') as f:
+                    f.writelines(new_lines)
+            columns = {
+                "analyte": analytes,
+                "day": np.full(len(labs), np.datetime64(day, 'D').astype(np.int64)),
+                "value": labs.values,
+                "low": labs.low,
+                "high": labs.high,
+            }
+            for name, dtype in COLUMNS:
+                with open(self._file(f"{name}.bin"), 'ab') as f:
+                    f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+            # Recorded last: a report interrupted mid-append is ingested again rather than lost
+            with open(self._file("reports.txt"), 'a', encoding='utf-8') as f:
+                f.write(report_id + "\n")
+            self.reports.add(report_id)
+            self._index = None
+            self._mentions = None
+            return len(labs)
+
+    def _view(self):
+        """Columns in (analyte, day) order plus per-analyte offsets, rebuilt after each append"""
+        with self._lock:
+            if self._index is not None:
+                return self._index
+            # Rows past the shortest column belong to an interrupted append and are ignored
+            rows = min(
+                (os.path.getsize(self._file(f"{name}.bin")) // np.dtype(dtype).itemsize
+                 if os.path.exists(self._file(f"{name}.bin")) else 0)
+                for name, dtype in COLUMNS
+            )
+            mapped = {
+                name: np.memmap(self._file(f"{name}.bin"), dtype=dtype, mode='r', shape=(rows,))
+                if rows else np.empty(0, dtype=dtype)
+                for name, dtype in COLUMNS
+            }
+            order = np.lexsort((mapped["day"], mapped["analyte"]))
+            columns = {name: np.asarray(column[order]) for name, column in mapped.items()}
+            offsets = np.searchsorted(columns["analyte"], np.arange(len(self.names) + 1))
+            self._index = (columns, offsets)
+            return self._index
+
+    def series(self, analyte, since=None, until=None, unit=None):
+        """Return (days, values, low, high) arrays for one analyte in date order, optionally windowed
+
+        An analyte stored in several units has one series per unit; `unit` picks one, and the
+        default is the unit it was first stored in.
+        """
+        return self._series(self._series_id(analyte, unit), since, until)
+
+    def _series(self, analyte_id, since=None, until=None):
+        columns, offsets = self._view()
+        if analyte_id is None or analyte_id + 1 >= len(offsets):
+            empty = np.empty(0)
+            return empty.astype('datetime64[D]'), empty, empty, empty
+        start, stop = offsets[analyte_id], offsets[analyte_id + 1]
+        days = columns["day"][start:stop]
+        if since is not None:
+            start += np.searchsorted(days, np.datetime64(since, 'D').astype(np.int64), side='left')
+        if until is not None:
+            stop = offsets[analyte_id] + np.searchsorted(days, np.datetime64(until, 'D').astype(np.int64), side='right')
+        return (
+            columns["day"][start:stop].astype('datetime64[D]'),
+            columns["value"][start:stop],
+            columns["low"][start:stop],
+            columns["high"][start:stop],
+        )
+
+    def stats(self, analyte, since=None, until=None, unit=None):
+        """Delta, trend and range statistics for one analyte, or None when it has no observations
+
+        trend_per_year is the least-squares slope of value against time. `unit` picks the series
+        as in series().
+        """
+        return self._stats(self._series_id(analyte, unit), since, until)
+
+    def _stats(self, analyte_id, since=None, until=None):
+        days, values, low, high = self._series(analyte_id, since, until)
+        if not len(values):
+            return None
+        years = (days - days[0]).astype(np.float64) / 365.25
+        spread = years - years.mean()
+        denominator = float(spread @ spread)
+        slope = float(spread @ (values - values.mean())) / denominator if denominator else 0.0
+        first, last = float(values[0]), float(values[-1])
+        return {
+            "analyte": self.names[analyte_id],
+            "unit": self.units[analyte_id],
+            "count": len(values),
+            "first_day": days[0],
+            "first": first,
+            "last_day": days[-1],
+            "last": last,
+            "delta": last - first,
+            "delta_pct": (last - first) / abs(first) * 100 if first else None,
+            "trend_per_year": slope,
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "mean": float(values.mean()),
+            "out_of_range": int(np.count_nonzero((values < low) | (values > high))),
+        }
+
+    def mentioned(self, text):
+        """Stored analytes named in text (by any stored name or alias), in order of first mention"""
+        return list(dict.fromkeys(self.names[analyte] for analyte in self._mentioned_ids(text)))
+
+    def _mentioned_ids(self, text):
+        """Series ids of the analytes named in text, every unit of each, in order of first mention"""
+        with self._lock:
+            if self._mentions is None:
+                # Spelling -> analyte key
+                spellings = {}
+                for key, ids in self._by_key.items():
+                    spellings[key] = key
+                    for analyte in ids:
+                        spellings[self.names[analyte].lower()] = key
+                for alias, key in ALIASES.items():
+                    if key in self._by_key and len(alias) >= 3:
+                        spellings[alias] = key
+                # Longest spellings first so "hdl cholesterol" wins over "hdl"
+                ordered = sorted(spellings, key=len, reverse=True)
+                pattern = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, ordered)) + r")(?!\w)") if ordered else None
+                self._mentions = (pattern, spellings)
+            pattern, spellings = self._mentions
+        if pattern is None:
+            return []
+        found = []
+        for match in pattern.finditer(text.lower()):
+            for analyte in self._by_key[spellings[match.group()]]:
+                if analyte not in found:
+                    found.append(analyte)
+        return found
+
+    def context_table(self, message, today=None, max_analytes=6):
+        """Compact markdown table of the history relevant to a chat message, or '' if none is
+
+        Uses the analytes the message names, one row per unit they were reported in; a message
+        that only asks about change over time ("how have my labs changed") gets the series with
+        the most observations. A window such as "last 5 years" limits the rows considered.
+        """
+        if not self.names:
+            return ''
+        analytes = self._mentioned_ids(message)
+        if not analytes and _HISTORY_WORDS.search(message):
+            columns, offsets = self._view()
+            counts = np.diff(offsets)
+            analytes = [index for index in np.argsort(-counts, kind='stable')[:max_analytes] if counts[index]]
+        since = None
+        window = _WINDOW.search(message)
+        if window:
+            number = window.group(1).lower()
+            number = int(number) if number.isdigit() else _WINDOW_NUMBERS[number]
+            today = np.datetime64(today or 'today', 'D')
+            since = today - np.timedelta64(number * _WINDOW_DAYS[window.group(2).lower()], 'D')
+
+        rows = []
+        for analyte in analytes[:max_analytes]:
+            stats = self._stats(analyte, since)
+            if stats is None:
+                continue
+            unit = f" ({stats['unit']})" if stats['unit'] else ''
+            change = f"{stats['delta']:+.3g}"
+            if stats['delta_pct'] is not None:
+                change += f" ({stats['delta_pct']:+.0f}%)"
+            rows.append(
+                f"| {stats['analyte']}{unit} | {stats['count']} "
+                f"| {_format_number(stats['first'])} ({stats['first_day']}) "
+                f"| {_format_number(stats['last'])} ({stats['last_day']}) "
+                f"| {change} | {stats['trend_per_year']:+.3g} "
+                f"| {_format_number(stats['min'])}-{_format_number(stats['max'])} | {stats['out_of_range']} |"
+            )
+        if not rows:
+            return ''
+        heading = f"Lab history from {len(self.reports)} stored report(s)" + (f" since {since}" if since is not None else "")
+        return "\n".join([
+            heading + ":",
+            "| Analyte | Results | First | Latest | Change | Trend/yr | Min-Max | Out of range |",
+            "|---|---|---|---|---|---|---|---|",
+            *rows,
+        ])
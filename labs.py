@@ -0,0 +1,293 @@
+"""Local extraction of lab results, with reference-range flags computed over NumPy columns
+
+extract_labs() finds "analyte value unit (low-high)" rows in extracted report text, in the shapes
+our extractors produce: free-text lines from PDFs and TXT files, and ' | '-separated table rows
+from DOCX tables and CDA narrative tables. Rows are kept as parallel arrays (a LabTable), so
+flagging every value against its range is a handful of array comparisons, whatever the number
+of rows.
+
+LabTable.summary() condenses the table into a few lines per analyte that are sent to the model
+next to the report, so abnormal results are flagged deterministically instead of being
+re-derived from the raw text on every call.
+"""
+import re
+
+import numpy as np
+
+_NUMBER = r"-?\d+(?:\.\d+)?"
+_FLAG = r"HH|LL|H|L|HIGH|LOW|High|Low"
+_SEPARATOR = r"[ \t]*\|?[ \t]*"
+_REF_LABEL = r"(?i:ref(?:erence)?(?:[ \t]+(?:range|interval))?)[ \t]*:?[ \t]*"
+
+_RANGE = (
+    rf"(?:(?P<low>{_NUMBER})[ \t]*(?:-|–|to)[ \t]*(?P<high>{_NUMBER})|(?P<bound>[<>])=?[ \t]*(?P<limit>{_NUMBER}))"
+)
+
+# One row per line: analyte, optional comparator, value, optional H/L flag, unit and reference
+# range (a low-high span or a one-sided bound), each optionally separated by table pipes. Analyte
+# words may start with digits ("25-OH Vitamin D"). The range must be in parentheses or brackets,
+# labelled "ref", or follow a unit, and the value may not run straight into a hyphen and digits;
+# otherwise "DOB: 1980-01-02" reads as 1980 with range -1 to 2.
+_ROW = re.compile(
+    rf"""^[ \t]*
+    (?P<analyte>(?:[A-Za-z]|\d+-?[A-Za-z])[\w,'()/+-]*(?:[ \t]+[A-Za-z(\d][\w,'()/+-]*){{0,5}}?)
+    (?:[ \t]*[:|][ \t]*|[ \t]+)
+    (?P<comparator>[<>]=?)?[ \t]*(?P<value>{_NUMBER})(?![\d.]|-\d)
+    (?:[ \t]*(?P<flag>{_FLAG})\b)?
+    (?:{_SEPARATOR}(?P<unit>(?!(?i:ref(?:erence)?)\b)(?:10\^\d+/)?[A-Za-z%µμ][\w%µμ/^.*]*))?
+    (?:{_SEPARATOR}(?P<open>[(\[])?[ \t]*(?P<ref>{_REF_LABEL})?
+        (?(open)|(?(ref)|(?(unit)|(?!))))
+        {_RANGE}[ \t]*(?(open)[)\]]))?
+    (?:{_SEPARATOR}(?P<trailing_flag>{_FLAG})\b)?
+    [ \t|]*$""",
+    re.MULTILINE | re.VERBOSE,
+)
+
+# Header fields that look like "label number" rows but are never lab results
+_NOT_ANALYTE = re.compile(
+    r"(?i)\b(?:date|dob|d\.o\.b|birth|age|collected|received|reported|mrn|id|account|acct|policy|member|"
+    r"phone|fax|zip|page|room|bed)\b"
+)
+
+# Without a reference range, a row only counts as a lab result when its unit looks like one;
+# this keeps "Follow up in 2 weeks" out of the table
+_LAB_UNIT = re.compile(
+    r"[/%^]|^(?:fL|pg|ng|ug|mg|g|IU|U|mEq|mmHg|sec|s|ratio|cells|copies|titer)$"
+)
+
+_FLAG_NAMES = {"H": "high", "L": "low"}
+
+
+def _normalize_flag(flag):
+    return flag[0].upper() if flag else ''
+
+
+class LabTable:
+    """Columnar lab results: one entry per extracted row in each parallel array
+
+    `low` and `high` are NaN where the report gives no bound. `flags` holds 'H', 'L' or '' per
+    row, computed from the range where there is one and taken from the report's own H/L markers
+    otherwise. `comparators` keeps a reported '<' or '>' ("LDL <100") so a censored value is not
+    shown or flagged as exact.
+    """
+
+    def __init__(self, analytes, values, units, low, high, reported_flags=None, comparators=None):
+        self.analytes = np.asarray(analytes, dtype=object)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.units = np.asarray(units, dtype=object)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        if reported_flags is None:
+            reported_flags = [''] * len(self.values)
+        if comparators is None:
+            comparators = [''] * len(self.values)
+        self.comparators = np.asarray(comparators, dtype='<U2')
+        self.flags = flag_results(
+            self.values, self.low, self.high, np.asarray(reported_flags, dtype='<U1'), self.comparators
+        )
+
+    @classmethod
+    def concat(cls, tables):
+        """Join tables extracted from consecutive pieces of one report"""
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls([], [], [], [], [])
+        joined = cls.__new__(cls)
+        for column in ("analytes", "values", "units", "low", "high", "comparators", "flags"):
+            setattr(joined, column, np.concatenate([getattr(table, column) for table in tables]))
+        return joined
+
+    def __len__(self):
+        return len(self.values)
+
+    def abnormal(self):
+        """Boolean mask of rows outside their reference range"""
+        return self.flags != ''
+
+    def records(self):
+        """Rows as a list of dicts, for display in a table widget"""
+        return [
+            {
+                "Analyte": analyte,
+                "Value": f"{comparator}{_format_number(value)}",
+                "Unit": unit,
+                "Range": _format_range(low, high),
+                "Flag": _FLAG_NAMES.get(flag, ''),
+            }
+            for analyte, comparator, value, unit, low, high, flag in zip(
+                self.analytes, self.comparators, self.values.tolist(), self.units, self.low.tolist(),
+                self.high.tolist(), self.flags
+            )
+        ]
+
+    def summary(self, max_lines=40):
+        """Compact per-analyte text for the model: abnormal analytes first, then the rest
+
+        An analyte reported once becomes one line with its value and range; repeated analytes
+        are aggregated into counts, the value span and the last value.
+        """
+        if not len(self):
+            return ''
+        keys = np.array([' '.join(name.lower().split()) for name in self.analytes], dtype=object)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        groups = len(first)
+        counts = np.bincount(inverse, minlength=groups)
+        highs = np.bincount(inverse, weights=self.flags == 'H', minlength=groups).astype(np.int64)
+        lows = np.bincount(inverse, weights=self.flags == 'L', minlength=groups).astype(np.int64)
+        minimum = np.full(groups, np.inf)
+        maximum = np.full(groups, -np.inf)
+        np.minimum.at(minimum, inverse, self.values)
+        np.maximum.at(maximum, inverse, self.values)
+        # Index of each analyte's last row: the max position seen per group
+        last = np.zeros(groups, dtype=np.int64)
+        np.maximum.at(last, inverse, np.arange(len(self)))
+
+        # Abnormal analytes first (most out-of-range results first), then report order
+        order = np.lexsort((first, -(highs + lows)))
+        lines = []
+        for group in order[:max_lines]:
+            row = last[group]
+            unit = f" {self.units[row]}" if self.units[row] else ''
+            ref = _format_range(self.low[row], self.high[row])
+            ref = f" (ref {ref})" if ref else ''
+            name = self.analytes[first[group]]
+            if counts[group] == 1:
+                flag = _FLAG_NAMES.get(self.flags[row])
+                value = self.comparators[row] + _format_number(self.values[row])
+                lines.append(f"- {name}: {value}{unit}{ref}" + (f" {flag.upper()}" if flag else ''))
+                continue
+            flagged = ', '.join(f"{count} {label}" for count, label in ((highs[group], "high"), (lows[group], "low")) if count)
+            lines.append(
+                f"- {name}: {counts[group]} results{', ' + flagged if flagged else ''}; "
+                f"{_format_number(minimum[group])}-{_format_number(maximum[group])}{unit}{ref}; "
+                f"last {self.comparators[row]}{_format_number(self.values[row])}"
+            )
+        if groups > max_lines:
+            lines.append(f"- ...and {groups - max_lines} more analytes")
+        flagged_rows = int(self.abnormal().sum())
+        heading = (
+            f"Lab results parsed from the report ({len(self)} values, {flagged_rows} flagged; "
+            "HIGH/LOW mark values outside the listed range or flagged by the lab):"
+        )
+        return heading + "\n" + "\n".join(lines)
+
+
+def flag_results(values, low, high, reported_flags, comparators=None):
+    """Return 'H'/'L'/'' per row: out-of-range checks where a bound exists, the report's own flag elsewhere
+
+    With comparators, a value reported as "<x" is never flagged high and one reported as ">x"
+    never low, since the true result may lie on either side of that bound.
+    """
+    flags = np.full(len(values), '', dtype='<U1')
+    # Comparisons against NaN are False, so a missing bound never flags
+    below = values < low
+    above = values > high
+    if comparators is not None:
+        below &= ~np.char.startswith(comparators, '>')
+        above &= ~np.char.startswith(comparators, '<')
+    flags[below] = 'L'
+    flags[above] = 'H'
+    unbounded = np.isnan(low) & np.isnan(high)
+    flags[unbounded] = reported_flags[unbounded]
+    return flags
+
+
+def _format_number(number):
+    return f"{number:g}"
+
+
+def _format_range(low, high):
+    if np.isnan(low) and np.isnan(high):
+        return ''
+    if np.isnan(low):
+        return f"<{_format_number(high)}"
+    if np.isnan(high):
+        return f">{_format_number(low)}"
+    return f"{_format_number(low)}-{_format_number(high)}"
+
+
+def extract_labs(text):
+    """Parse every lab row in text into a LabTable with out-of-range flags"""
+    analytes, values, units, low, high, reported, comparators = [], [], [], [], [], [], []
+    for match in _ROW.finditer(text):
+        unit = match.group('unit') or ''
+        bounded = match.group('low') is not None or match.group('limit') is not None
+        if not bounded and not _LAB_UNIT.search(unit):
+            continue
+        analyte = ' '.join(match.group('analyte').split())
+        if _NOT_ANALYTE.search(analyte):
+            continue
+        analytes.append(analyte)
+        comparators.append(match.group('comparator') or '')
+        values.append(match.group('value'))
+        units.append(unit)
+        if match.group('low') is not None:
+            low.append(match.group('low'))
+            high.append(match.group('high'))
+        elif match.group('bound') == '<':
+            low.append('nan')
+            high.append(match.group('limit'))
+        elif match.group('bound') == '>':
+            low.append(match.group('limit'))
+            high.append('nan')
+        else:
+            low.append('nan')
+            high.append('nan')
+        reported.append(_normalize_flag(match.group('flag') or match.group('trailing_flag')))
+    # Numbers are converted column-wise by NumPy rather than one float() per field
+    return LabTable(
+        analytes,
+        np.array(values, dtype=str).astype(np.float64),
+        units,
+        np.array(low, dtype=str).astype(np.float64),
+        np.array(high, dtype=str).astype(np.float64),
+        reported,
+        comparators,
+    )
+
+
+_MONTHS = {month: number for number, month in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+
+_DATE_VALUE = (
+    r"[ \t]*:[ \t]*"
+    r"(?:(?P<month>\d{1,2})[/.-](?P<day>\d{1,2})[/.-](?P<year>\d{4})"
+    r"|(?P<iso_year>\d{4})-(?P<iso_month>\d{2})-(?P<iso_day>\d{2})"
+    r"|(?P<month_name>[A-Za-z]{3})[a-z]*\.?[ \t]+(?P<named_day>\d{1,2}),?[ \t]+(?P<named_year>\d{4}))"
+)
+
+# The date a report's results belong to
+_COLLECTION_DATE = re.compile(
+    r"\b(?i:collected|collection[ \t]+date|date[ \t]+collected|specimen[ \t]+date|date[ \t]+of[ \t]+service|"
+    r"service[ \t]+date|report(?:ed)?(?:[ \t]+date)?|result[ \t]+date)" + _DATE_VALUE
+)
+
+# Failing those, a bare "Date:" that starts a line or table cell. Anything written before it
+# ("Birth Date", "Admission Date", "Update") names some other date.
+_BARE_DATE = re.compile(r"(?<![^\n|])[ \t]*(?i:date)" + _DATE_VALUE)
+
+
+def _parse_date(match):
+    if match.group('year'):
+        year, month, day = match.group('year'), match.group('month'), match.group('day')
+    elif match.group('iso_year'):
+        year, month, day = match.group('iso_year'), match.group('iso_month'), match.group('iso_day')
+    else:
+        month = _MONTHS.get(match.group('month_name').lower())
+        if month is None:
+            return None
+        year, day = match.group('named_year'), match.group('named_day')
+    try:
+        return np.datetime64(f"{int(year):04d}-{int(month):02d}-{int(day):02d}", 'D')
+    except ValueError:
+        return None
+
+
+def collection_date(text):
+    """Return the first labelled collection/report date in text as numpy.datetime64[D], or None"""
+    for pattern in (_COLLECTION_DATE, _BARE_DATE):
+        for match in pattern.finditer(text):
+            day = _parse_date(match)
+            if day is not None:
+                return day
+    return None
@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from collections import deque
+
+import metrics
+from chunking import estimate_message_tokens, estimate_tokens
+
+# Latency records for the most recent requests across all sessions, newest last
+_recent = deque(maxlen=500)
+_recent_lock = threading.Lock()
+
+
+def record_request(label, ttft, total, chars, ok, cached=False, prompt_tokens=0, completion_tokens=0, usage="estimated"):
+    """Store latency and token metrics for one model request
+
+    usage says whether the token counts came from the provider ("reported") or were estimated.
+    """
+    with _recent_lock:
+        _recent.append({
+            "label": label,
+            "ttft": ttft,
+            "total": total,
+            "chars": chars,
+            "ok": ok,
+            "cached": cached,
+            "time": time.time(),
+        })
+    metrics.observe(
+        "model", total, ok=ok, label=label, cache="hit" if cached else "miss", usage="none" if cached else usage,
+        chars=chars, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+    )
+    if ttft is not None and not cached:
+        metrics.observe("model_first_token", ttft, label=label)
+
+
+def _token_counts(usage, messages, text):
+    """(prompt, completion, source) tokens: the provider's usage when it sent one, else estimates"""
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        return usage.prompt_tokens, usage.completion_tokens or 0, "reported"
+    return estimate_message_tokens(messages), estimate_tokens(text), "estimated"
+
+
+def _chunk_usage(chunk):
+    """Usage carried by a stream chunk: OpenAI's final chunk, or Groq's x_groq extension"""
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
+
+
+def recent_requests(label=None):
+    """Return recorded request metrics, optionally only those with the given label"""
+    with _recent_lock:
+        records = list(_recent)
+    if label is not None:
+        records = [record for record in records if record["label"] == label]
+    return records
+
+
+def is_retryable(error):
+    """Return True for failures worth retrying: rate limits, 5xx responses, timeouts and dropped connections
+
+    Checked by status code and class name so it covers both the openai and groq SDKs.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+def retry_delay(error, attempt, base=0.5, cap=60.0):
+    """Seconds to wait before retrying: the server's Retry-After if given, else jittered backoff"""
+    backoff = min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return max(backoff, float(response.headers.get("retry-after")))
+        except (TypeError, ValueError):
+            pass
+    return backoff
+
+
+def _cache_lookup(cache, bypass, client, request):
+    """Return (key, cached reply) for a request, or (None, None) when the cache is off or bypassed"""
+    if cache is None:
+        return None, None
+    if bypass:
+        cache.record_bypass()
+        return None, None
+    key = cache.key(str(getattr(client, "base_url", "")), request)
+    return key, cache.get(key)
+
+
+def stream_chat(client, label="chat", error_message="Error generating response", cache=None, bypass=False, **request):
+    """Yield reply text as it streams from an OpenAI-compatible client, recording TTFT and total latency
+
+    Works with any client exposing chat.completions.create (Azure OpenAI, Groq). Errors are yielded as
+    a final "<error_message>: <exception>" chunk so the UI can render them in place of the reply.
+    With a cache.ResponseCache, an identical earlier request is replayed without calling the model
+    unless bypass is set; only complete, successful replies are stored.
+    """
+    start = time.perf_counter()
+    key, cached = _cache_lookup(cache, bypass, client, request)
+    if cached is not None:
+        elapsed = time.perf_counter() - start
+        record_request(label, elapsed, elapsed, len(cached), True, cached=True)
+        yield cached
+        return
+
+    ttft = None
+    chars = 0
+    ok = True
+    parts = []
+    usage = None
+    try:
+        for chunk in client.chat.completions.create(stream=True, **request):
+            usage = _chunk_usage(chunk) or usage
+            # Azure sends content-filter bookkeeping chunks with no choices
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chars += len(delta)
+                parts.append(delta)
+                yield delta
+        if key is not None and parts:
+            cache.put(key, ''.join(parts))
+    except Exception as e:
+        ok = False
+        yield f"{error_message}: {e}"
+    finally:
+        prompt_tokens, completion_tokens, source = _token_counts(usage, request.get("messages", []), ''.join(parts))
+        record_request(label, ttft, time.perf_counter() - start, chars, ok,
+                       prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, usage=source)
+
+
+def complete_chat(client, label="chat", cache=None, bypass=False, **request):
+    """Send one non-streaming request and return the reply text, recording its latency"""
+    start = time.perf_counter()
+    key, cached = _cache_lookup(cache, bypass, client, request)
+    if cached is not None:
+        elapsed = time.perf_counter() - start
+        record_request(label, elapsed, elapsed, len(cached), True, cached=True)
+        return cached
+
+    ok = False
+    text = ""
+    usage = None
+    try:
+        completion = client.chat.completions.create(stream=False, **request)
+        usage = getattr(completion, "usage", None)
+        text = completion.choices[0].message.content or ""
+        ok = True
+        if key is not None and text:
+            cache.put(key, text)
+        return text
+    finally:
+        total = time.perf_counter() - start
+        prompt_tokens, completion_tokens, source = _token_counts(usage, request.get("messages", []), text)
+        record_request(label, total if ok else None, total, len(text), ok,
+                       prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, usage=source)
@@ -0,0 +1,124 @@
+"""Token-budgeted conversation memory for follow-up chat turns
+
+The most recent turns go to the model verbatim, as many as fit in recent_tokens. Turns that fall
+out of that window are folded into a running summary by a background thread, so no chat request
+waits on summarization: a request uses whatever summary is ready. Until a refresh lands, turns
+that have just left the window are simply absent.
+
+Each turn keeps two texts: `content` for display (placeholders restored to real values) and
+`text` for the model (still redacted), so restoring values on screen never sends them back out.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chunking import estimate_tokens
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and a medical assistant.
+Merge the new turns into the existing summary. Keep the patient's questions, concerns, symptoms, and any results, diagnoses, medications or advice discussed; drop greetings and repetition.
+Write concise bullet points, at most the requested length, and do not add anything that was not said."""
+
+# Summaries for every session share a couple of threads; refreshes are rare and short
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+class ConversationMemory:
+    """Chat turns for one session: verbatim recent window plus an incrementally updated summary
+
+    `summarized` counts the leading turns already folded into `summary`. refresh() folds the turns
+    between that point and the start of the recent window in the background.
+    """
+
+    def __init__(self, recent_tokens=1500, summary_tokens=300):
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.turns = []
+        self.summary = ""
+        self.summarized = 0
+        self.refreshes = 0
+        self._tokens = []
+        self._generation = 0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, role, content, text=None):
+        """Record a turn; `text` is what the model should see if it differs from the displayed content"""
+        text = content if text is None else text
+        with self._lock:
+            self.turns.append({"role": role, "content": content, "text": text})
+            self._tokens.append(estimate_tokens(text))
+
+    def clear(self):
+        """Forget every turn and the summary; a refresh still running is discarded when it finishes"""
+        with self._lock:
+            self.turns = []
+            self._tokens = []
+            self.summary = ""
+            self.summarized = 0
+            self._generation += 1
+            self._pending = None
+
+    def _window_start(self):
+        """Index of the oldest turn in the recent window: newest turns first, until the budget is spent"""
+        used = 0
+        start = len(self.turns)
+        while start > self.summarized and used + self._tokens[start - 1] <= self.recent_tokens:
+            start -= 1
+            used += self._tokens[start]
+        return start
+
+    def messages(self):
+        """Model messages for the next request: the summary (if any) followed by the recent window"""
+        with self._lock:
+            start = self._window_start()
+            recent = [{"role": turn["role"], "content": turn["text"]} for turn in self.turns[start:]]
+            summary = self.summary
+        if summary:
+            recent.insert(0, {"role": "user", "content": f"Summary of our earlier conversation:\n{summary}"})
+        return recent
+
+    def window(self, count):
+        """The last `count` turns for display, so a rerun renders a bounded number of messages"""
+        with self._lock:
+            return self.turns[-count:] if count else []
+
+    def refresh(self, complete):
+        """Fold turns that have left the recent window into the summary on a background thread
+
+        `complete(messages, max_tokens)` sends one chat request and returns its text; it is called
+        off the request path. Returns the Future, or None when nothing needs folding or a refresh
+        is already running.
+        """
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return None
+            stop = self._window_start()
+            if stop <= self.summarized:
+                return None
+            turns = self.turns[self.summarized:stop]
+            previous = self.summary
+            generation = self._generation
+            self._pending = _refresh_pool.submit(self._fold, complete, previous, turns, stop, generation)
+            return self._pending
+
+    def _fold(self, complete, previous, turns, stop, generation):
+        transcript = "\n".join(f"{turn['role']}: {turn['text']}" for turn in turns)
+        summary = complete(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": (
+                    f"Existing summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}\n\n"
+                    f"Updated summary in at most {self.summary_tokens * 3 // 4} words:"
+                )},
+            ],
+            self.summary_tokens,
+        )
+        with self._lock:
+            # A clear() while this ran means these turns are gone; keep the empty state
+            if generation == self._generation and summary:
+                self.summary = summary.strip()
+                self.summarized = stop
+                self.refreshes += 1
+        return summary
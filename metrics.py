@@ -0,0 +1,299 @@
+"""Per-stage timing spans and counters for the report and chat pipeline
+
+Code times a stage with `with metrics.span("extract", kind="pdf") as span:` and attaches what it
+processed with `span.set(bytes=..., pages=...)`. Work timed elsewhere (model requests, queue waits)
+is recorded with observe(). Field values decide how a span is aggregated:
+
+- strings are labels (kind, label, backend, cache); keep them to a handful of values each
+- numbers are added to counters named after the stage and field, e.g. extract_bytes_total
+
+Each series (stage plus labels) keeps cumulative histogram buckets for Prometheus and a window of
+recent durations for percentiles. Finished spans are also kept as recent events and, when
+configured, appended to a JSON lines file. A span that raises is recorded as failed with the
+exception type, and the exception propagates unchanged.
+
+profile() wraps one request in cProfile when profiling is switched on.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "healthinsight"
+
+# Upper bounds of the latency histogram buckets in seconds, from cache hits to long model replies
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Series:
+    """Latency histogram, error count and recent durations for one stage and label set"""
+
+    def __init__(self, window):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds, ok):
+        self.count += 1
+        self.total += seconds
+        if not ok:
+            self.errors += 1
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+        self.recent.append(seconds)
+
+
+class Span:
+    """Fields of one running stage; set() adds labels and counts as the work discovers them"""
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+def _split(fields):
+    """Separate string labels from numeric counts, dropping None values"""
+    labels = tuple(sorted((name, value) for name, value in fields.items() if isinstance(value, str)))
+    counts = {
+        name: value for name, value in fields.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+    return labels, counts
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}" if labels else ""
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Registry:
+    """Thread-safe store of stage latencies, counters and recent events, shared by every session"""
+
+    def __init__(self, window=1000, events=500, jsonl_path=None):
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self._series = {}  # (stage, labels) -> _Series
+        self._counters = {}  # (name, labels) -> value
+        self._events = deque(maxlen=events)
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._jsonl = None
+
+    def configure(self, jsonl_path=None):
+        """Start (or stop, with None) appending every finished span to a JSON lines file"""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+            self.jsonl_path = jsonl_path
+
+    def add_collector(self, collect):
+        """Register a callable returning (name, labels dict, value, 'counter' or 'gauge') tuples at export
+
+        For state other objects already count themselves, such as cache hit and miss totals.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Time the enclosed block as one occurrence of stage; yields a Span for adding fields"""
+        span = Span(stage, fields)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.fields["error"] = type(e).__name__
+            self.observe(stage, time.perf_counter() - start, ok=False, **span.fields)
+            raise
+        self.observe(stage, time.perf_counter() - start, **span.fields)
+
+    def observe(self, stage, seconds, ok=True, **fields):
+        """Record one occurrence of a stage that was timed elsewhere"""
+        error = fields.pop("error", None)
+        labels, counts = _split(fields)
+        event = {"time": round(time.time(), 3), "stage": stage, "seconds": round(seconds, 6), "ok": ok, **fields}
+        if error is not None:
+            event["error"] = error
+        with self._lock:
+            series = self._series.get((stage, labels))
+            if series is None:
+                series = self._series[(stage, labels)] = _Series(self.window)
+            series.add(seconds, ok)
+            for name, amount in counts.items():
+                key = (f"{stage}_{name}_total", labels)
+                self._counters[key] = self._counters.get(key, 0) + amount
+            self._events.append(event)
+            if self.jsonl_path is not None:
+                if self._jsonl is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.jsonl_path)), exist_ok=True)
+                    self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8', buffering=1)
+                self._jsonl.write(json.dumps(event, default=str) + "\n")
+
+    def count(self, name, amount=1, **labels):
+        """Add to a counter outside any span, e.g. count("uploads", kind="pdf")"""
+        key = (f"{name}_total", tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def summary(self):
+        """One row per series: count, errors, mean and recent p50/p95/p99 in milliseconds"""
+        with self._lock:
+            series = [(stage, labels, s.count, s.errors, s.total, sorted(s.recent))
+                      for (stage, labels), s in self._series.items()]
+        rows = []
+        for stage, labels, count, errors, total, recent in sorted(series, key=lambda item: (item[0], item[1])):
+            rows.append({
+                "stage": stage,
+                "labels": ", ".join(f"{name}={value}" for name, value in labels),
+                "count": count,
+                "errors": errors,
+                "mean_ms": round(total / count * 1000, 2),
+                "p50_ms": round(_percentile(recent, 0.5) * 1000, 2),
+                "p95_ms": round(_percentile(recent, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(recent, 0.99) * 1000, 2),
+            })
+        return rows
+
+    def counters(self):
+        """Current counter values as rows of name, labels and value"""
+        with self._lock:
+            items = sorted(self._counters.items())
+        return [{"name": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+                for (name, labels), value in items]
+
+    def events(self):
+        """The most recent finished spans, oldest first"""
+        with self._lock:
+            return list(self._events)
+
+    def jsonl(self):
+        """Recent events as JSON lines, in the same format as the configured file"""
+        return "".join(json.dumps(event, default=str) + "\n" for event in self.events())
+
+    def prometheus(self):
+        """All series and counters in the Prometheus text exposition format"""
+        with self._lock:
+            series = [(stage, labels, s.count, s.errors, s.total, list(s.buckets))
+                      for (stage, labels), s in self._series.items()]
+            counters = sorted(self._counters.items())
+            collectors = list(self._collectors)
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent in each pipeline stage",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        failures = []
+        for stage, labels, count, errors, total, buckets in sorted(series, key=lambda item: (item[0], item[1])):
+            labels = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, observed in zip(BUCKETS, buckets):
+                cumulative += observed
+                lines.append(f"{PREFIX}_stage_seconds_bucket{_label_text(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{PREFIX}_stage_seconds_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{_label_text(labels)} {total:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_count{_label_text(labels)} {count}")
+            failures.append(f"{PREFIX}_stage_failures_total{_label_text(labels)} {errors}")
+        lines += [f"# HELP {PREFIX}_stage_failures_total Stage occurrences that failed",
+                  f"# TYPE {PREFIX}_stage_failures_total counter", *failures]
+
+        samples = [(name, labels, value, "counter") for (name, labels), value in counters]
+        for collect in collectors:
+            samples += [(name, tuple(sorted(labels.items())), value, kind) for name, labels, value, kind in collect()]
+        declared = set()
+        for name, labels, value, kind in sorted(samples, key=lambda item: (item[0], item[1])):
+            if name not in declared:
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                declared.add(name)
+            lines.append(f"{PREFIX}_{name}{_label_text(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+span = registry.span
+observe = registry.observe
+count = registry.count
+
+# Summaries of the latest profiled requests, newest last
+_profiles = deque(maxlen=10)
+# cProfile cannot run two profilers at once, so concurrent requests are simply not profiled
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile(label, enabled=True, directory=None, top=25):
+    """Run the enclosed request under cProfile when enabled, keeping a text summary of the hottest calls
+
+    With a directory, the raw stats are also dumped there as <label>-<timestamp>.prof for snakeviz
+    or pstats. Only the calling thread is profiled.
+    """
+    if not enabled or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - start
+        path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+            profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        _profiles.append({"label": label, "time": time.time(), "seconds": seconds, "path": path,
+                          "text": out.getvalue()})
+    finally:
+        _profile_lock.release()
+
+
+def recent_profiles():
+    """Summaries of the latest profiled requests, newest first"""
+    return list(reversed(_profiles))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve the default registry at http://host:port/metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
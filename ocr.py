@@ -0,0 +1,102 @@
+import io
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache import content_hash
+
+# Bump whenever OCR settings change their output so stale cache entries are ignored
+OCR_VERSION = "1"
+
+# Pages whose text layer has fewer non-whitespace characters than this are treated as scanned
+MIN_TEXT_CHARS = 20
+
+
+def needs_ocr(text, min_chars=MIN_TEXT_CHARS):
+    """Return True when a page's extracted text is too sparse to be a real text layer"""
+    return len(''.join(text.split())) < min_chars
+
+
+def _completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _resolve(item):
+    return item.result() if isinstance(item, Future) else item
+
+
+class OCREngine:
+    """Tesseract OCR fallback that runs on a worker pool and caches results per page image hash"""
+
+    def __init__(self, cache=None, workers=4, lang='eng', min_chars=MIN_TEXT_CHARS):
+        self.cache = cache
+        self.lang = lang
+        self.min_chars = min_chars
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+            self._tesseract = pytesseract
+        except Exception:
+            self._tesseract = None
+
+    @property
+    def available(self):
+        return self._tesseract is not None
+
+    def _recognize(self, key, images):
+        # Each pytesseract call runs the tesseract binary in a subprocess, so threads scale across cores
+        from PIL import Image
+        texts = []
+        for data in images:
+            with Image.open(io.BytesIO(data)) as image:
+                texts.append(self._tesseract.image_to_string(image, lang=self.lang).strip())
+        text = '\n'.join(filter(None, texts))
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text
+
+    def submit(self, images):
+        """Queue OCR for the images that make up one page and return a future for its text"""
+        key = content_hash(b''.join(images), "ocr", OCR_VERSION, self.lang)
+        if self.cache is not None:
+            text = self.cache.get(key)
+            if text is not None:
+                return _completed(text)
+
+        return self._pool.submit(self._recognize, key, images)
+
+    def ocr_image(self, data):
+        """OCR a single standalone image such as a photographed or scanned report"""
+        if not self.available:
+            raise ValueError("OCR is unavailable: install the tesseract binary to read image reports")
+        return self.submit([bytes(data)]).result()
+
+    def fill_pdf_pages(self, data, page_texts):
+        """Yield page texts in order, replacing sparse pages with OCR of their embedded scans"""
+        if not self.available:
+            yield from page_texts
+            return
+
+        reader = None
+        pending = deque()
+        for number, text in enumerate(page_texts):
+            if needs_ocr(text, self.min_chars):
+                if reader is None:
+                    import PyPDF2
+                    reader = PyPDF2.PdfReader(io.BytesIO(data))
+                try:
+                    images = [image.data for image in reader.pages[number].images]
+                except Exception:
+                    # PyPDF2 cannot decode every image filter (JBIG2 is common in scans, for one);
+                    # such a page keeps its text layer rather than failing the whole document
+                    images = []
+                pending.append(self.submit(images) if images else text)
+            else:
+                pending.append(text)
+            # Release every page that is already resolved without stalling on OCR still in flight
+            while pending and (not isinstance(pending[0], Future) or pending[0].done()):
+                yield _resolve(pending.popleft())
+        while pending:
+            yield _resolve(pending.popleft())
@@ -0,0 +1,169 @@
+"""Model backends and report analysis shared by app.py and agent.py
+
+Both front ends build the same router over every provider configured in their secrets and run
+reports through the same condense-then-analyze flow; they differ only in prompts and sampling.
+"""
+import time
+
+import llm
+import metrics
+from gateway import Gateway, pooled_http_client
+from images import image_message_part
+from router import Backend, Router
+from summarize import condense_report, format_stats, needs_condensing
+
+GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+
+def build_router(secrets):
+    """Return a router over a gateway-backed backend for each provider configured in secrets
+
+    Recognizes an [azure_openai] section and a GROQ_API_KEY entry (with optional MODEL and BASE_URL
+    under [groq]); a [router] section may set HEDGE_AFTER_SECONDS to enable hedged requests.
+    """
+    settings = secrets.get("gateway", {})
+    max_concurrency = int(settings.get("MAX_CONCURRENCY", 8))
+    tokens_per_minute = int(settings.get("TOKENS_PER_MINUTE", 0)) or None
+    max_queued = int(settings.get("MAX_QUEUED", 256))
+
+    def gateway(client, name):
+        return Gateway(client, max_concurrency=max_concurrency, tokens_per_minute=tokens_per_minute, max_queued=max_queued,
+                       name=name)
+
+    # Each provider SDK is imported only when its section is configured; both are slow to import
+    backends = []
+    if "azure_openai" in secrets:
+        from openai import AsyncAzureOpenAI
+        azure = secrets["azure_openai"]
+        client = AsyncAzureOpenAI(
+            azure_endpoint=azure["ENDPOINT_URL"],
+            api_key=azure["AZURE_OPENAI_API_KEY"],
+            api_version=azure["API_VERSION"],
+            max_retries=0,
+            http_client=pooled_http_client(max_concurrency),
+        )
+        backends.append(Backend("azure", gateway(client, "azure"), azure["DEPLOYMENT_NAME"], vision=True))
+    if "GROQ_API_KEY" in secrets:
+        from groq import AsyncGroq
+        groq = secrets.get("groq", {})
+        client = AsyncGroq(
+            api_key=secrets["GROQ_API_KEY"],
+            base_url=groq.get("BASE_URL"),
+            max_retries=0,
+            http_client=pooled_http_client(max_concurrency),
+        )
+        model = groq.get("MODEL", GROQ_MODEL)
+        backends.append(Backend("groq", gateway(client, "groq"), model, vision=True))
+
+    hedge_after = secrets.get("router", {}).get("HEDGE_AFTER_SECONDS")
+    return Router(backends, hedge_after=float(hedge_after) if hedge_after else None)
+
+
+def queue_stats(router):
+    """Sum queued and in-flight requests over the router's gateway-backed backends"""
+    queued = in_flight = 0
+    for backend in router.backends:
+        if isinstance(backend.client, Gateway):
+            stats = backend.client.stats()
+            queued += stats["queued"]
+            in_flight += stats["in_flight"]
+    return queued, in_flight
+
+
+def analysis_messages(report_text, system_prompt, instruction="", lab_summary="", condensed=False):
+    """Build the report analysis request, the reduce step when report_text is condense_report notes
+
+    A lab_summary (labs.LabTable.summary()) is sent ahead of the report and is never condensed.
+    """
+    if condensed:
+        report_text = "(section notes from a long report)\n" + report_text
+    messages = [{"role": "system", "content": system_prompt}]
+    if lab_summary:
+        messages.append({"role": "user", "content": lab_summary})
+    messages.append({"role": "user", "content": instruction + report_text})
+    return messages
+
+
+def analyze_report(client, report_text, system_prompt, instruction="", sampling=None, cache=None, bypass=False,
+                   long_report_tokens=6000, section_tokens=3000, max_workers=4, lab_summary=""):
+    """Yield the analysis of a cleaned report as it streams
+
+    Reports over long_report_tokens are condensed section by section first (map), and the analysis
+    prompt then runs over the section notes (reduce), followed by a one-line timing caption.
+    See analysis_messages for how the lab_summary is sent.
+    """
+    sampling = sampling or {}
+
+    def complete(messages, max_tokens):
+        return llm.complete_chat(
+            client, label="summarize_section", cache=cache, bypass=bypass,
+            messages=messages, **dict(sampling, max_tokens=max_tokens),
+        )
+
+    try:
+        stats = None
+        if needs_condensing(report_text, long_report_tokens):
+            report_text, stats = condense_report(
+                report_text,
+                complete,
+                section_tokens=section_tokens,
+                budget_tokens=long_report_tokens,
+                max_workers=max_workers,
+            )
+    except Exception as e:
+        yield f"Error analyzing report: {e}"
+        return
+
+    messages = analysis_messages(report_text, system_prompt, instruction, lab_summary, condensed=stats is not None)
+    start = time.perf_counter()
+    yield from llm.stream_chat(
+        client,
+        label="analyze_report",
+        error_message="Error analyzing report",
+        cache=cache,
+        bypass=bypass,
+        messages=messages,
+        **sampling,
+    )
+    if stats is not None:
+        yield f"\n\n_{format_stats(stats, time.perf_counter() - start)}_"
+
+
+def chat_messages(message, system_prompt, report_text=None, image=None, report_index=None, lab_history=None,
+                  history=None, top_k=8, context_tokens=1500):
+    """Build the messages for a follow-up chat turn with whatever medical context the session has
+
+    `history` is the conversation so far from ConversationMemory.messages(): a summary of older
+    turns plus the recent ones verbatim, sent ahead of the new query.
+
+    When a report_index is given, only the report chunks most relevant to the message are sent,
+    within context_tokens, instead of the whole report. lab_history is a compact table from the
+    patient's lab store covering the analytes the message asks about.
+    """
+    messages = [
+        {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
+        *(history or []),
+        {"role": "user", "content": [{"type": "text", "text": f"User query: {message}"}]}
+    ]
+
+    if report_index is not None and len(report_index):
+        with metrics.span("retrieve") as span:
+            excerpts = report_index.select(message, top_k=top_k, token_budget=context_tokens)
+            span.set(chunks=len(excerpts))
+        report_text = "\n...\n".join(excerpts)
+        if report_text:
+            report_text = f"(relevant excerpts)\n{report_text}"
+    if report_text:
+        messages.append({"role": "user", "content": [{"type": "text", "text": f"Medical report content: {report_text}"}]})
+    if lab_history:
+        messages.append({"role": "user", "content": [{"type": "text", "text": lab_history}]})
+    if image:
+        # The payload was encoded at upload time, so follow-up turns reuse it without touching pixels
+        messages.append({
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "Please consider this medical image:"},
+                image_message_part(image)
+            ]
+        })
+    return messages
@@ -0,0 +1,314 @@
+"""Single-pass PHI redaction for report text
+
+All identifier rules (plus an optional dictionary of names) are compiled into one regex that is
+applied in a single scan, so cleaning a report costs one pass over the text whatever the number of
+rules; whitespace is then collapsed with str.split, as preprocess_text always did. Labelled rules
+("DOB: ...", "MRN ...") replace only the value and keep the label, so the model still sees what
+kind of field was there.
+
+Every rule starts with a character from a small trigger set (digits, capitals, '(', '+', '@'),
+and the combined pattern opens with that set as a character class. The regex engine can then skip
+ordinary lowercase text and spaces without trying any rule, which is most of a report.
+
+With a PlaceholderMap, each distinct value gets a stable numbered placeholder such as [NAME_1]
+that can be mapped back for display; without one, values become bare [NAME]-style tags.
+"""
+import re
+import threading
+
+# Lookbehinds used right after a rule's first character: no word character just before it
+_WORD_START = r"(?<!\w.)"
+_NUMBER_START = r"(?<![\w-].)"
+
+# Labelled rules: category -> (label alternatives, separator, value). Labels match
+# case-insensitively after their initial capital; only the value is replaced.
+_ID_LABELS = (
+    r"MRN|Medical[ \t]+Record(?:[ \t]+(?:Number|No\.?))?|Patient[ \t]+ID|Account(?:[ \t]+(?:Number|No\.?))?|"
+    r"Acct\.?|Member[ \t]+ID|Policy(?:[ \t]+(?:Number|No\.?))?|Insurance[ \t]+ID"
+)
+_DOB_LABELS = r"DOB|D\.O\.B\.|Date[ \t]+of[ \t]+Birth|Birth[ \t]?Date"
+_NAME_LABELS = (
+    r"Patient(?:[ \t]+Name)?|Pt\.?(?:[ \t]+Name)?|Name|Guarantor|Emergency[ \t]+Contact|Next[ \t]+of[ \t]+Kin"
+)
+# Other header fields that often share a line with a name
+_HEADER_LABELS = (
+    r"Age|Sex|Gender|Race|Ethnicity|Language|Weight|Height|Physician|Doctor|Provider|Attending|Referring|"
+    r"Ordering|Ward|Room|Bed|Unit|Department|Clinic|Facility|Location|Address|Phone|Email|SSN|Visit|"
+    r"Encounter|Admitted|Admission|Discharge|Specimen|Accession|Collected|Received|Reported|Report|Status"
+)
+# A name's later words must not be another field's label, or "Name: John Smith DOB: ..." would
+# take "DOB" as a surname and leave the date after it unredacted. Any word followed by a colon
+# counts as a label, as do the known labels without one ("Patient: Jane Doe, Age 45").
+_NOT_LABEL = (
+    rf"(?![A-Za-z][\w.'-]*[ \t]*:|(?i:{_ID_LABELS}|{_DOB_LABELS}|{_NAME_LABELS}|{_HEADER_LABELS})(?!\w))"
+)
+LABELLED = {
+    "ID": (
+        _ID_LABELS,
+        r"[ \t]{0,3}[:#]?\s{0,3}(?:#[ \t]?)?",
+        # All-digit IDs of any length ("Patient ID: 12"), other IDs from four characters
+        r"(?:[A-Z0-9][A-Z0-9-]{3,19}|\d{1,3})\b",
+    ),
+    "DOB": (
+        _DOB_LABELS,
+        r"[ \t]{0,3}:?\s{0,3}",
+        r"(?:\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{4}-\d{2}-\d{2}|[A-Z][a-z]{2,8}\.?[ \t]\d{1,2},?[ \t]\d{4})",
+    ),
+    "NAME": (
+        _NAME_LABELS,
+        r"[ \t]{0,3}:\s{0,3}",
+        r"[A-Z][A-Za-z'-]{1,30}(?:,?[ \t]" + _NOT_LABEL + r"(?:[A-Z]\.|[A-Z][A-Za-z'-]{1,30})){1,3}",
+    ),
+}
+
+# Unlabelled rules: (category, first character class, rest of the match)
+RULES = [
+    ("SSN", r"\d", _NUMBER_START + r"\d\d-\d\d-\d{4}(?![\w-])"),
+    ("PHONE", r"\(", _NUMBER_START + r"\d{3}\)[ \t]?\d{3}[-. ]\d{4}(?![\w-])"),
+    ("PHONE", r"\+", r"1[-. ]?(?:\(\d{3}\)[ \t]?|\d{3}[-. ])\d{3}[-. ]\d{4}(?![\w-])"),
+    ("PHONE", r"\d", _NUMBER_START + r"(?:(?<=1)[-. ]?(?:\(\d{3}\)[ \t]?|\d{3}[-. ])|\d\d[-. ])\d{3}[-. ]\d{4}(?![\w-])"),
+    # The local part before '@' is added back in Python, since every rule must start at a trigger
+    ("EMAIL", r"@", r"(?<=[\w.+-]@)[\w-]{1,63}(?:\.[\w-]{1,63}){1,4}\b"),
+    (
+        "ADDRESS", r"\d",
+        _WORD_START + r"\d{0,5}[ \t](?:[A-Z][a-z]{1,20}[ \t]){1,4}(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|"
+        r"Lane|Ln|Drive|Dr|Court|Ct|Way|Place|Pl|Terrace|Ter|Circle|Cir|Parkway|Pkwy|Highway|Hwy)\b\.?"
+        r"(?:,?[ \t](?:Apt|Suite|Ste|Unit)\.?[ \t]?#?[\w-]{1,8})?",
+    ),
+    # City, state and ZIP code, or just state and ZIP
+    (
+        "LOCATION", r"A-Z",
+        _WORD_START + r"(?:[a-z]{1,20}(?:[ \t][A-Z][a-z]{1,20}){0,2},[ \t][A-Z]{2}|[A-Z])[ \t]\d{5}(?:-\d{4})?\b",
+    ),
+    # Clinical dates are useful to the analysis, so general dates are only redacted on request
+    ("DATE", r"\d", _WORD_START + r"(?:\d?/\d{1,2}/\d{4}|\d{3}-\d{2}-\d{2})\b"),
+]
+
+DEFAULT_CATEGORIES = ("SSN", "PHONE", "EMAIL", "ID", "DOB", "NAME", "ADDRESS", "LOCATION")
+
+# Upper bound on the length of any single match, including its kept label
+MAX_MATCH_CHARS = 256
+
+_EMAIL_LOCAL = re.compile(r'[\w.+-]{1,64}$')
+
+
+def _split_alternatives(pattern):
+    """Split a regex on its top-level '|' (nested groups and classes are left intact)"""
+    parts, depth, start, escaped, in_class = [], 0, 0, False, False
+    for index, char in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            parts.append(pattern[start:index])
+            start = index + 1
+    parts.append(pattern[start:])
+    return parts
+
+
+def _trie_pattern(words):
+    """Compile a word list into a prefix-trie regex, far faster than a flat alternation of thousands"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def render(node):
+        ending = '' in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if ending else body
+
+    return render(trie)
+
+
+class PlaceholderMap:
+    """Reversible mapping between redacted values and their numbered placeholders"""
+
+    def __init__(self):
+        self.placeholders = {}
+        self.values = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def placeholder(self, label, value):
+        """Return the placeholder for a value, numbering new values per label"""
+        key = (label, ' '.join(value.split()))
+        with self._lock:
+            placeholder = self.placeholders.get(key)
+            if placeholder is None:
+                self._counts[label] = self._counts.get(label, 0) + 1
+                placeholder = f"[{label}_{self._counts[label]}]"
+                self.placeholders[key] = placeholder
+                self.values[placeholder] = key[1]
+            return placeholder
+
+    def restore(self, text):
+        """Put the original values back in place of any placeholders in text"""
+        if not self.values:
+            return text
+        return re.sub(r'\[[A-Z]+_\d+\]', lambda match: self.values.get(match.group(), match.group()), text)
+
+    def iter_restore(self, chunks):
+        """restore() over streamed chunks, holding back a trailing partial placeholder until it completes"""
+        pending = ''
+        for chunk in chunks:
+            pending += chunk
+            cut = pending.rfind('[')
+            if cut != -1 and ']' not in pending[cut:] and len(pending) - cut < 24:
+                ready, pending = pending[:cut], pending[cut:]
+            else:
+                ready, pending = pending, ''
+            if ready:
+                yield self.restore(ready)
+        if pending:
+            yield self.restore(pending)
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _collapse_whitespace(pieces):
+    """Incremental ' '.join(text.split()) over a stream of text pieces"""
+    started = False
+    space = False
+    for piece in pieces:
+        words = piece.split()
+        if not words:
+            space = space or bool(piece)
+            continue
+        text = ' '.join(words)
+        if started and (space or piece[0].isspace()):
+            text = ' ' + text
+        started = True
+        space = piece[-1].isspace()
+        yield text
+
+
+class Redactor:
+    """Compiled PHI matcher; immutable after construction and safe to share across threads"""
+
+    def __init__(self, names=(), categories=DEFAULT_CATEGORIES):
+        rules = [rule for rule in RULES if rule[0] in categories]
+        for category, (labels, separator, value) in LABELLED.items():
+            if category not in categories:
+                continue
+            initials = {}
+            for label in _split_alternatives(labels):
+                initials.setdefault(label[0], []).append(label[1:])
+            for initial, rests in initials.items():
+                rule = f"{_WORD_START}(?i:{'|'.join(rests)}){separator}{{value}}{value}"
+                rules.append((category, initial, rule))
+        initials = {}
+        for name in {name.strip() for name in names if name.strip()}:
+            initials.setdefault(name[0], []).append(name[1:])
+        for initial, rests in sorted(initials.items()):
+            rules.append(("NAME", re.escape(initial), f"{_WORD_START}{_trie_pattern(rests)}\\b"))
+
+        # Group rules by their first character so a position is checked against one group only
+        self.labels = []
+        self.valued = set()
+        groups = {}
+        for category, lead, rule in rules:
+            index = len(self.labels)
+            self.labels.append(category)
+            if '{value}' in rule:
+                self.valued.add(index)
+                rule = rule.replace('{value}', f'(?P<v{index}>)')
+            groups.setdefault(lead, []).append(f"{rule}(?P<g{index}>)")
+        branches = [f"(?<=[{lead}])(?:{'|'.join(alternatives)})" for lead, alternatives in groups.items()]
+        self.pattern = re.compile(f"[{''.join(groups)}](?:{'|'.join(branches)})")
+
+    def _scan(self, text, cursor, out, placeholders, limit=None):
+        """Append text[cursor:] to out with identifiers replaced, returning how far the text was consumed
+
+        With a limit (streaming), stops before any match starting at or after limit or running to
+        the end of text, since more input could still change it.
+        """
+        stop = len(text)
+        for match in self.pattern.finditer(text, cursor):
+            if limit is not None and (match.start() >= limit or match.end() == len(text)):
+                stop = match.start()
+                break
+            index = int(match.lastgroup[1:])
+            label = self.labels[index]
+            start = match.start(f"v{index}") if index in self.valued else match.start()
+            if label == "EMAIL":
+                local = _EMAIL_LOCAL.search(text, max(cursor, start - 64), start)
+                if local is not None:
+                    start = local.start()
+            value = text[start:match.end()]
+            out.append(text[cursor:start])
+            out.append(placeholders.placeholder(label, value) if placeholders is not None else f"[{label}]")
+            cursor = match.end()
+        if limit is not None:
+            stop = min(stop, limit)
+            # Never cut inside a word: an email's local part must stay with its '@'
+            boundary = stop
+            while boundary > cursor and boundary > stop - 64 and not text[boundary - 1].isspace():
+                boundary -= 1
+            if boundary > stop - 64:
+                stop = boundary
+        if cursor < stop:
+            out.append(text[cursor:stop])
+            cursor = stop
+        return cursor
+
+    def redact(self, text, placeholders=None):
+        """Return text with identifiers replaced and whitespace collapsed"""
+        out = []
+        self._scan(text, 0, out, placeholders)
+        return ' '.join(''.join(out).split())
+
+    def _iter_scan(self, chunks, placeholders):
+        buffer = ''
+        position = 0
+        for chunk in chunks:
+            buffer += chunk
+            safe = len(buffer) - MAX_MATCH_CHARS
+            if safe <= position:
+                continue
+            out = []
+            cursor = self._scan(buffer, position, out, placeholders, limit=safe)
+            yield ''.join(out)
+            # Keep a little context before the resume point for the rules' look-behinds
+            context = max(0, cursor - 16)
+            buffer = buffer[context:]
+            position = cursor - context
+        out = []
+        self._scan(buffer, position, out, placeholders)
+        yield ''.join(out)
+
+    def iter_redact(self, chunks, placeholders=None):
+        """Redact a stream of text chunks, yielding cleaned text as soon as it cannot change
+
+        The last MAX_MATCH_CHARS of each buffer are held back so a match straddling chunk
+        boundaries is still seen whole; the joined output equals redact() on the whole text.
+        """
+        return _collapse_whitespace(self._iter_scan(chunks, placeholders))
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_redactor():
+    """Return the shared Redactor for the default categories, compiling it on first use"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Redactor()
+        return _default
@@ -0,0 +1,85 @@
+import re
+
+import numpy as np
+
+from chunking import chunk_text, estimate_tokens
+
+_TERM = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+
+
+def tokenize(text):
+    """Lower-case word and number terms used for both chunks and queries"""
+    return _TERM.findall(text.lower())
+
+
+class ChunkIndex:
+    """Local BM25 index over report chunks, stored as NumPy postings so queries need no network"""
+
+    def __init__(self, text, chunk_tokens=200, k1=1.5, b=0.75):
+        self.chunks = chunk_text(text, chunk_tokens)
+        self.chunk_tokens = np.array([estimate_tokens(chunk) for chunk in self.chunks], dtype=np.int64)
+        self.k1 = k1
+        self.b = b
+
+        self.vocab = {}
+        term_ids = []
+        doc_ids = []
+        for doc, chunk in enumerate(self.chunks):
+            for term in tokenize(chunk):
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                doc_ids.append(doc)
+
+        n_docs = max(1, len(self.chunks))
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int64)
+        # Collapse (term, doc) occurrences into term-major postings with their frequencies
+        pairs, counts = np.unique(term_ids * n_docs + doc_ids, return_counts=True)
+        self.postings_docs = pairs % n_docs
+        self.postings_tf = counts.astype(np.float64)
+        self.postings_ptr = np.searchsorted(pairs // n_docs, np.arange(len(self.vocab) + 1))
+
+        doc_freq = np.diff(self.postings_ptr)
+        self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        self.doc_len = np.bincount(doc_ids, minlength=n_docs).astype(np.float64)
+        self.avg_doc_len = max(self.doc_len.mean(), 1.0)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def scores(self, query):
+        """Return the BM25 score of every chunk for the query"""
+        scores = np.zeros(len(self.chunks))
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avg_doc_len)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.postings_ptr[term_id], self.postings_ptr[term_id + 1]
+            docs = self.postings_docs[start:stop]
+            tf = self.postings_tf[start:stop]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def select(self, query, top_k=8, token_budget=1500):
+        """Pick the best-matching chunks that fit the token budget, returned in report order"""
+        if not self.chunks:
+            return []
+        scores = self.scores(query)
+        ranked = np.argsort(-scores, kind='stable')
+        if scores[ranked[0]] <= 0:
+            # Nothing matched (e.g. "summarize this"), so fall back to the start of the report
+            ranked = np.arange(len(self.chunks))
+        else:
+            ranked = ranked[scores[ranked] > 0]
+
+        chosen = []
+        used = 0
+        for doc in ranked:
+            if len(chosen) == top_k:
+                break
+            cost = int(self.chunk_tokens[doc])
+            if used + cost > token_budget:
+                continue
+            chosen.append(int(doc))
+            used += cost
+        return [self.chunks[doc] for doc in sorted(chosen)]
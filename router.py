@@ -0,0 +1,282 @@
+"""Latency-aware routing of chat requests across interchangeable model backends
+
+A Backend wraps one provider deployment (Azure OpenAI, Groq, or an in-process fake) behind the
+same chat.completions.create call. The Router keeps rolling latency and error statistics for
+each backend, sends every request to the fastest healthy one, fails over to the next if a
+backend errors before producing output, and can hedge: when the first token has not arrived
+after hedge_after seconds, a duplicate goes to the runner-up and whichever answers first wins.
+
+`router.client_for(session)` returns an object with the SDK's `chat.completions.create(...)`
+surface, so the llm helpers and metrics work unchanged on top of it. Its base_url, which the
+response cache keys on, names every configured backend with its model and endpoint, so changing
+a deployment or model invalidates cached replies.
+"""
+import json
+import queue
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+_DONE = object()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def wants_vision(request):
+    """Return True when any message carries an image part"""
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+            return True
+    return False
+
+
+class Backend:
+    """One model endpoint the router can choose
+
+    `client` is any object with chat.completions.create (an SDK client or a fake), or a
+    gateway.Gateway, in which case requests are queued under the caller's session. `params`
+    override request parameters for this backend; `vision` marks models that accept images.
+    """
+
+    def __init__(self, name, client, model, params=None, vision=False):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.params = params or {}
+        self.vision = vision
+
+    @property
+    def endpoint(self):
+        """Name, model, URL and parameter overrides of this backend, for response-cache keys"""
+        # A gateway.Gateway wraps the SDK client that knows the URL
+        client = getattr(self.client, "client", self.client)
+        params = json.dumps(self.params, sort_keys=True, default=str) if self.params else ""
+        return f"{self.name}={self.model}@{getattr(client, 'base_url', '')}{params}"
+
+    def create(self, session, stream=False, **request):
+        client = self.client.client_for(session) if hasattr(self.client, "client_for") else self.client
+        return client.chat.completions.create(stream=stream, **dict(request, **self.params, model=self.model))
+
+
+class BackendStats:
+    """Rolling latency and error window for one backend, plus a cooldown after repeated failures"""
+
+    def __init__(self, window=100, failure_threshold=3, cooldown=30.0):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.unhealthy_until = time.monotonic() + self.cooldown
+                # Start from a clean window after the cooldown, so the first request probes the backend
+                self.consecutive_failures = 0
+                self.latencies.clear()
+                self.outcomes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            latencies = list(self.latencies)
+            outcomes = list(self.outcomes)
+            cooling = self.unhealthy_until > time.monotonic()
+        return {
+            "requests": len(outcomes),
+            "error_rate": outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+            "p50": _percentile(latencies, 0.5) if latencies else None,
+            "p95": _percentile(latencies, 0.95) if latencies else None,
+            "cooling_down": cooling,
+        }
+
+
+class _Attempt(threading.Thread):
+    """Runs one request against one backend on its own thread, feeding items into a shared queue"""
+
+    def __init__(self, router, backend, session, request, stream, results):
+        super().__init__(name=f"route-{backend.name}", daemon=True)
+        self.router = router
+        self.backend = backend
+        self.session = session
+        self.request = request
+        self.stream = stream
+        self.results = results
+        self.hedge = False
+        self.cancelled = False
+        self.finished = False
+
+    def run(self):
+        start = time.perf_counter()
+        first = None
+        response = None
+        try:
+            response = self.backend.create(self.session, stream=self.stream, **self.request)
+            for item in (response if self.stream else [response]):
+                if self.cancelled:
+                    break
+                if first is None:
+                    first = time.perf_counter() - start
+                self.results.put((self, item))
+            if not self.cancelled:
+                self.router.stats[self.backend.name].record(first or time.perf_counter() - start, True)
+            self.finished = True
+            self.results.put((self, _DONE))
+        except Exception as e:
+            # A hedge that lost the race is not the backend's fault
+            if not self.cancelled:
+                self.router.stats[self.backend.name].record(time.perf_counter() - start, False)
+            self.finished = True
+            self.results.put((self, e))
+        finally:
+            if self.stream and hasattr(response, "close"):
+                response.close()
+
+
+class Router:
+    """Picks the fastest healthy backend per request, with failover and optional hedging
+
+    Backends with fewer than min_samples successful requests are tried first so that every
+    backend gets measured. A backend is unhealthy while its error rate over the window exceeds
+    max_error_rate or while it cools down after failure_threshold consecutive failures.
+    """
+
+    def __init__(self, backends, hedge_after=None, max_error_rate=0.5, min_samples=3, window=100,
+                 failure_threshold=3, cooldown=30.0):
+        if not backends:
+            raise ValueError("Router needs at least one backend")
+        self.backends = list(backends)
+        # Any backend may serve a request, so cached replies are keyed on the whole set
+        self.endpoint = "router:" + ";".join(sorted(backend.endpoint for backend in self.backends))
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.stats = {
+            backend.name: BackendStats(window, failure_threshold, cooldown) for backend in self.backends
+        }
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def rank(self, request):
+        """Order the backends able to serve a request: healthy by p50 latency, then unhealthy ones"""
+        vision = wants_vision(request)
+        healthy, unhealthy = [], []
+        for backend in self.backends:
+            if vision and not backend.vision:
+                continue
+            stats = self.stats[backend.name].snapshot()
+            if stats["cooling_down"] or (
+                stats["requests"] >= self.min_samples and stats["error_rate"] > self.max_error_rate
+            ):
+                unhealthy.append((stats["error_rate"], backend))
+            elif stats["p50"] is None or len(self.stats[backend.name].latencies) < self.min_samples:
+                healthy.append((0.0, backend))
+            else:
+                healthy.append((stats["p50"], backend))
+        if not healthy and not unhealthy:
+            raise ValueError("No configured backend accepts image inputs")
+        # Still try unhealthy backends last rather than failing outright
+        return [backend for _, backend in sorted(healthy, key=lambda entry: entry[0])] + \
+               [backend for _, backend in sorted(unhealthy, key=lambda entry: entry[0])]
+
+    def client_for(self, session):
+        """Return a synchronous client stand-in whose requests are routed for the given session"""
+        return RouterClient(self, session)
+
+    def run(self, session, request, stream):
+        """Yield the reply items (stream chunks, or one completion) from whichever backend answers first"""
+        candidates = self.rank(request)
+        results = queue.Queue()
+        attempts = []
+
+        def launch(hedge=False):
+            attempt = _Attempt(self, candidates.pop(0), session, request, stream, results)
+            attempt.hedge = hedge
+            attempts.append(attempt)
+            attempt.start()
+
+        launch()
+        hedge_at = time.perf_counter() + self.hedge_after if self.hedge_after is not None else None
+        winner = None
+        try:
+            while True:
+                timeout = None
+                if winner is None and hedge_at is not None and candidates and len(attempts) == 1:
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                try:
+                    attempt, item = results.get(timeout=timeout)
+                except queue.Empty:
+                    self.hedges += 1
+                    launch(hedge=True)
+                    continue
+                if winner is not None and attempt is not winner:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    if attempt is winner:
+                        # Output already reached the caller, so switching backends would garble it
+                        raise item
+                    if any(not other.finished for other in attempts):
+                        continue
+                    if candidates:
+                        self.failovers += 1
+                        launch()
+                        continue
+                    raise item
+                if winner is None:
+                    winner = attempt
+                    if attempt.hedge:
+                        self.hedge_wins += 1
+                    for other in attempts:
+                        if other is not attempt:
+                            other.cancelled = True
+                yield item
+        finally:
+            for attempt in attempts:
+                attempt.cancelled = True
+
+    def snapshot(self):
+        """Per-backend latency and health, plus hedge and failover counts"""
+        return {
+            "backends": {name: stats.snapshot() for name, stats in self.stats.items()},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+        }
+
+
+class RouterClient:
+    """Synchronous stand-in for an SDK client that sends requests through a Router for one session"""
+
+    def __init__(self, router, session):
+        self.router = router
+        self.session = session
+        # llm's response cache keys on base_url
+        self.base_url = router.endpoint
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream=False, **request):
+        # Each backend supplies its own model name
+        request.pop("model", None)
+        items = self.router.run(self.session, request, stream)
+        if stream:
+            return items
+        try:
+            return next(items)
+        finally:
+            items.close()
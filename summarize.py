@@ -0,0 +1,114 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chunking import chunk_text, estimate_tokens
+
+MAP_PROMPT = """You are summarizing one section of a longer medical report so that a doctor can later analyze the whole report from your notes.
+Keep every diagnosis, abnormal or critical value (with units and reference ranges), medication, procedure, and recommended follow-up.
+Drop boilerplate, repeated headers and personal identifiers. Write concise bullet points and do not add interpretation that is not in the text."""
+
+
+def section_messages(number, total, section):
+    """Build the map-stage request for one section of a long report"""
+    return [
+        {"role": "system", "content": MAP_PROMPT},
+        {"role": "user", "content": f"Section {number} of {total}:\n{section}"},
+    ]
+
+
+def _summarize_all(sections, complete, max_workers, summary_tokens):
+    """Summarize sections concurrently with at most max_workers requests in flight, keeping order"""
+    total = len(sections)
+
+    def summarize(numbered):
+        number, section = numbered
+        return complete(section_messages(number, total, section), summary_tokens)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as pool:
+        return list(pool.map(summarize, enumerate(sections, start=1)))
+
+
+def needs_condensing(text, budget_tokens):
+    """Return True when a report is too long to analyze in a single request"""
+    return estimate_tokens(text) > budget_tokens
+
+
+def _condense_rounds(text, section_tokens, budget_tokens, stats):
+    """Generator behind both condense_report variants, independent of how requests are sent
+
+    Yields each list of sections to summarize, is sent back their summaries in order, and returns
+    the final notes. The first list is the map stage; later ones are collapse rounds over the notes.
+    """
+    start = time.perf_counter()
+    sections = chunk_text(text, section_tokens)
+    stats["sections"] = len(sections)
+    partials = yield sections
+    stats["map_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    notes = '\n\n'.join(partials)
+    while len(partials) > 1 and estimate_tokens(notes) > budget_tokens:
+        # Pack neighbouring summaries into section-sized groups and summarize those
+        groups = chunk_text('\n'.join(partials), section_tokens)
+        if len(groups) >= len(partials):
+            break
+        partials = yield groups
+        notes = '\n\n'.join(partials)
+        stats["collapse_rounds"] += 1
+    stats["collapse_seconds"] = time.perf_counter() - start
+    return notes
+
+
+def _new_stats():
+    return {"sections": 0, "collapse_rounds": 0, "map_seconds": 0.0, "collapse_seconds": 0.0}
+
+
+def condense_report(text, complete, section_tokens=3000, budget_tokens=6000, max_workers=4, summary_tokens=400):
+    """Map stage of long-document analysis: shrink a report into section notes that fit budget_tokens
+
+    `complete(messages, max_tokens)` sends one chat request and returns the reply text. Sections are
+    summarized concurrently; if the joined notes are still over budget they are grouped and summarized
+    again. The caller runs its usual analysis prompt over the returned notes as the reduce step.
+    Returns (notes, stats) where stats records section counts and per-stage latency in seconds.
+    """
+    stats = _new_stats()
+    rounds = _condense_rounds(text, section_tokens, budget_tokens, stats)
+    try:
+        sections = next(rounds)
+        while True:
+            sections = rounds.send(_summarize_all(sections, complete, max_workers, summary_tokens))
+    except StopIteration as done:
+        return done.value, stats
+
+
+async def condense_report_async(text, complete, section_tokens=3000, budget_tokens=6000, max_workers=4,
+                                summary_tokens=400):
+    """condense_report for an async `complete(messages, max_tokens)` coroutine, as used by batch.py"""
+    stats = _new_stats()
+    rounds = _condense_rounds(text, section_tokens, budget_tokens, stats)
+    slots = asyncio.Semaphore(max(1, max_workers))
+
+    async def summarize(number, total, section):
+        async with slots:
+            return await complete(section_messages(number, total, section), summary_tokens)
+
+    try:
+        sections = next(rounds)
+        while True:
+            partials = await asyncio.gather(*(
+                summarize(number, len(sections), section) for number, section in enumerate(sections, start=1)
+            ))
+            sections = rounds.send(partials)
+    except StopIteration as done:
+        return done.value, stats
+
+
+def format_stats(stats, reduce_seconds=None):
+    """Render condense_report stats as a one-line caption for the chat"""
+    parts = [f"{stats['sections']} sections", f"map {stats['map_seconds']:.1f}s"]
+    if stats["collapse_rounds"]:
+        parts.append(f"collapse {stats['collapse_seconds']:.1f}s ({stats['collapse_rounds']} rounds)")
+    if reduce_seconds is not None:
+        parts.append(f"reduce {reduce_seconds:.1f}s")
+    return "Long report mode: " + " · ".join(parts)
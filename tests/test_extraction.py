@@ -0,0 +1,28 @@
+import pytest
+
+from extraction import detect_kind, read_bytes
+
+
+def test_text_starting_with_a_less_than_sign_is_text():
+    assert detect_kind(b'<5 mg daily dose') == 'txt'
+    assert read_bytes(b'<5 mg daily dose') == '<5 mg daily dose'
+    assert detect_kind(b'\n  < 100 mg/dL target') == 'txt'
+
+
+def test_xml_needs_a_declaration_or_tag():
+    assert detect_kind(b'<?xml version="1.0"?><report/>') == 'xml'
+    assert detect_kind(b'\xef\xbb\xbf<!-- export --><report/>') == 'xml'
+    assert detect_kind(b'<report>\n<p>Glucose 250</p></report>') == 'xml'
+    assert read_bytes(b'<report><p>Glucose 250</p></report>') == 'Glucose 250'
+
+
+def test_sniffed_text_that_is_not_well_formed_xml_falls_back_to_text():
+    data = b'<b>Glucose</b> 250 mg/dL, target < 100'
+
+    assert detect_kind(data) == 'xml'
+    assert read_bytes(data) == data.decode('utf-8')
+
+
+def test_declared_xml_still_reports_parse_errors():
+    with pytest.raises(ValueError, match="Invalid XML"):
+        read_bytes(b'<b>Glucose</b> 250', kind='xml')
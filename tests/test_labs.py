@@ -0,0 +1,34 @@
+from labs import collection_date, extract_labs
+
+
+def rows(text):
+    return [(row["Analyte"], row["Value"], row["Range"], row["Flag"]) for row in extract_labs(text).records()]
+
+
+def test_common_row_shapes_are_parsed():
+    text = "\n".join([
+        "25-OH Vitamin D 18 ng/mL (30-100) L",
+        "Vitamin D, 25-Hydroxy 18 ng/mL (30-100)",
+        "Glucose 250 mg/dL [70-99]",
+        "Potassium | 5.9 | mmol/L | 3.5-5.1",
+    ])
+
+    assert rows(text) == [
+        ("25-OH Vitamin D", "18", "30-100", "low"),
+        ("Vitamin D, 25-Hydroxy", "18", "30-100", "low"),
+        ("Glucose", "250", "70-99", "high"),
+        ("Potassium", "5.9", "3.5-5.1", "high"),
+    ]
+
+
+def test_dates_and_identifiers_are_not_lab_rows():
+    assert rows("DOB: 1980-01-02\nCollected: 2024-05-06\nMRN 12345678\nFollow up in 2 weeks") == []
+
+
+def test_comparator_is_kept_and_not_flagged_as_exact():
+    assert rows("LDL <150 mg/dL (<100)") == [("LDL", "<150", "<100", "")]
+
+
+def test_collection_date_ignores_birth_and_admission_dates():
+    text = "Birth Date: 01/02/1980\nAdmission Date: 02/03/2019\nCollected: 03/04/2020"
+    assert str(collection_date(text)) == "2020-03-04"
@@ -0,0 +1,107 @@
+import threading
+
+from memory import ConversationMemory
+
+
+class FakeComplete:
+    """Records each summary request and answers with a numbered summary, optionally after a gate opens"""
+
+    def __init__(self, gate=None):
+        self.calls = []
+        self.gate = gate
+
+    def __call__(self, messages, max_tokens):
+        self.calls.append((messages, max_tokens))
+        if self.gate is not None:
+            self.gate.wait(5)
+        return f"summary {len(self.calls)}"
+
+
+def turn_text(number):
+    # 16 characters, which estimate_tokens counts as 4 tokens
+    return f"turn {number:02d} padding."
+
+
+def fill(memory, count, start=0):
+    for number in range(start, start + count):
+        memory.append("user" if number % 2 == 0 else "assistant", f"shown {number}", turn_text(number))
+
+
+def test_recent_window_stays_within_budget():
+    memory = ConversationMemory(recent_tokens=10)
+    fill(memory, 5)
+
+    messages = memory.messages()
+
+    # Two 4-token turns fit in 10 tokens, a third would not
+    assert [message["content"] for message in messages] == [turn_text(3), turn_text(4)]
+    assert sum(len(message["content"]) // 4 for message in messages) <= memory.recent_tokens
+
+
+def test_window_sends_model_text_not_displayed_content():
+    memory = ConversationMemory()
+    memory.append("user", "Is John's glucose high?", "Is [NAME_1]'s glucose high?")
+
+    assert memory.messages() == [{"role": "user", "content": "Is [NAME_1]'s glucose high?"}]
+    assert memory.window(1)[0]["content"] == "Is John's glucose high?"
+
+
+def test_refresh_is_single_flight():
+    gate = threading.Event()
+    complete = FakeComplete(gate)
+    memory = ConversationMemory(recent_tokens=8)
+    fill(memory, 6)
+
+    future = memory.refresh(complete)
+    assert future is not None
+    assert memory.refresh(complete) is None
+
+    gate.set()
+    future.result(5)
+    assert len(complete.calls) == 1
+    # Everything outside the window is folded, so there is nothing left to refresh
+    assert memory.refresh(complete) is None
+
+
+def test_refresh_folds_only_new_turns_into_the_summary():
+    complete = FakeComplete()
+    memory = ConversationMemory(recent_tokens=8, summary_tokens=120)
+    fill(memory, 4)
+
+    memory.refresh(complete).result(5)
+    assert memory.summary == "summary 1"
+    assert memory.summarized == 2
+    assert memory.messages()[0]["content"].endswith("summary 1")
+
+    fill(memory, 2, start=4)
+    memory.refresh(complete).result(5)
+
+    messages, max_tokens = complete.calls[1]
+    prompt = messages[-1]["content"]
+    assert max_tokens == 120
+    assert "Existing summary:\nsummary 1" in prompt
+    assert turn_text(2) in prompt and turn_text(3) in prompt
+    assert turn_text(1) not in prompt and turn_text(4) not in prompt
+    assert memory.summary == "summary 2"
+    assert memory.summarized == 4
+    assert memory.refreshes == 2
+
+
+def test_clear_discards_a_refresh_in_flight():
+    gate = threading.Event()
+    complete = FakeComplete(gate)
+    memory = ConversationMemory(recent_tokens=8)
+    fill(memory, 6)
+
+    future = memory.refresh(complete)
+    memory.clear()
+    gate.set()
+    future.result(5)
+
+    assert memory.summary == ""
+    assert memory.summarized == 0
+    assert memory.refreshes == 0
+    assert memory.messages() == []
+    # The discarded refresh does not block the next one
+    fill(memory, 6)
+    assert memory.refresh(complete) is not None
@@ -0,0 +1,124 @@
+import asyncio
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pipeline
+from chunking import chunk_text, estimate_tokens
+from summarize import condense_report, condense_report_async
+
+SECTION = re.compile(r"Section (\d+) of (\d+):\n")
+
+
+class RecordingComplete:
+    """Fake complete(messages, max_tokens) that records every call and how many ran at once"""
+
+    def __init__(self, reply=None, delay=0.0):
+        self.reply = reply or (lambda number, section: f"note {number}")
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, max_tokens):
+        number, total = map(int, SECTION.match(messages[-1]["content"]).groups())
+        section = SECTION.sub("", messages[-1]["content"], count=1)
+        with self._lock:
+            self.calls.append({"number": number, "total": total, "section": section, "max_tokens": max_tokens})
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            # Later sections answer first, so completion order differs from section order
+            time.sleep(self.delay * (total - number + 1))
+            return self.reply(number, section)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def report(sentences):
+    return " ".join(f"Finding {number:03d} is unchanged from the prior study." for number in range(sentences))
+
+
+def test_one_request_per_section():
+    text = report(40)
+    complete = RecordingComplete()
+
+    notes, stats = condense_report(text, complete, section_tokens=100, budget_tokens=10_000, summary_tokens=64)
+
+    sections = chunk_text(text, 100)
+    assert stats["sections"] == len(sections) == len(complete.calls) > 1
+    assert sorted(call["number"] for call in complete.calls) == list(range(1, len(sections) + 1))
+    assert {call["total"] for call in complete.calls} == {len(sections)}
+    assert {call["max_tokens"] for call in complete.calls} == {64}
+    assert stats["collapse_rounds"] == 0
+
+
+def test_concurrency_is_bounded_by_max_workers():
+    complete = RecordingComplete(delay=0.01)
+
+    condense_report(report(60), complete, section_tokens=60, budget_tokens=10_000, max_workers=3)
+
+    assert len(complete.calls) > 3
+    assert 1 < complete.peak <= 3
+
+
+def test_collapse_rounds_bring_notes_within_budget():
+    # Every summary is long, so the joined notes overflow the budget until they are collapsed
+    complete = RecordingComplete(reply=lambda number, section: f"Note {number}: " + "detail kept. " * 20)
+
+    notes, stats = condense_report(report(200), complete, section_tokens=200, budget_tokens=300, summary_tokens=100)
+
+    assert stats["collapse_rounds"] >= 1
+    assert estimate_tokens(notes) <= 300
+    assert all(estimate_tokens(call["section"]) <= 200 for call in complete.calls)
+
+
+def test_async_variant_matches_condense_report():
+    reply = lambda number, section: f"Note {number}: " + "detail kept. " * 20
+    sync_complete = RecordingComplete(reply=reply)
+    calls = []
+
+    async def complete(messages, max_tokens):
+        calls.append(messages)
+        number, total = map(int, SECTION.match(messages[-1]["content"]).groups())
+        # Later sections answer first, so completion order differs from section order
+        await asyncio.sleep(0.001 * (total - number + 1))
+        return reply(number, None)
+
+    expected, expected_stats = condense_report(report(200), sync_complete, section_tokens=200, budget_tokens=300)
+    notes, stats = asyncio.run(condense_report_async(report(200), complete, section_tokens=200, budget_tokens=300))
+
+    assert notes == expected
+    assert stats["sections"] == expected_stats["sections"]
+    assert stats["collapse_rounds"] == expected_stats["collapse_rounds"] >= 1
+    assert len(calls) == len(sync_complete.calls)
+
+
+def test_reduce_input_keeps_section_order():
+    requests = []
+
+    def create(stream=False, **request):
+        requests.append(request)
+        if not stream:
+            # Map stage: answer with the section number, later sections first
+            number, total = map(int, SECTION.search(request["messages"][-1]["content"]).groups())
+            time.sleep(0.005 * (total - number + 1))
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"note {number}"))])
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="analysis"))])])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    text = report(80)
+
+    reply = "".join(pipeline.analyze_report(
+        client, text, "system prompt", instruction="Analyze: ", long_report_tokens=200, section_tokens=100,
+        max_workers=4,
+    ))
+
+    sections = len(chunk_text(text, 100))
+    reduce_input = requests[-1]["messages"][-1]["content"]
+    assert reply.startswith("analysis")
+    assert reduce_input.startswith("Analyze: (section notes from a long report)\n")
+    assert re.findall(r"note (\d+)", reduce_input) == [str(number) for number in range(1, sections + 1)]